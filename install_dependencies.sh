@@ -9,6 +9,11 @@ sudo apt-get install python-pip
 # Install python graph library "Networkx"
 sudo pip install networkx
 
+# Install NumPy (graph edge storage)
+sudo pip install numpy
+
+
+# The libraries below are only needed for drawing graphs (GraphDraw)
 
 # Install MathPlot lib
 sudo apt-get install python-dev 
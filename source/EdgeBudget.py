@@ -0,0 +1,162 @@
+#!/usr/bin/python
+import numpy as np
+from documentModel import *
+
+"""
+ An edge budget for representative graphs, bounding their memory.
+
+ A graph under a budget keeps at most iMaxEdges edges: when it grows past
+ them, the lightest edges (sEvict='weight') or the least recently reinforced
+ ones (sEvict='recency', ties broken by weight) are evicted, until it is
+ fSlack (a fraction of the budget) below it, so that evictions are batched.
+ The edges to evict are selected with a partial sort of the weights
+ (or recency) of all edges, rather than by keeping a heap up to date on
+ every edge update. Reinforced edges lighter than fMinWeight are dropped too.
+
+ The number and the weight mass of the dropped edges are kept, to relate
+ the budget to the accuracy of the representative graph.
+
+ The budget keeps the degrees of the nodes of the graph it manages, so that
+ the nodes left without edges are deleted with the dropped edges, without
+ going over the whole graph. They are recounted from all the edges when the
+ new edges of an update are not known (or the graph was changed otherwise).
+
+ @author ggianna
+"""
+class EdgeBudget(object):
+
+    """
+        Creates a budget of iMaxEdges edges (unbounded if None) and a minimum edge weight.
+    """
+    def __init__(self, iMaxEdges=None, fMinWeight=0.0, sEvict='weight', fSlack=0.1):
+        if (iMaxEdges is not None and iMaxEdges < 1):
+            raise ValueError('The edge budget must be positive!')
+        if (sEvict not in ('weight', 'recency')):
+            raise ValueError('Unknown eviction policy: ' + str(sEvict))
+        if (not 0.0 <= fSlack < 1.0):
+            raise ValueError('The slack must be in [0, 1)!')
+        self._iMaxEdges = iMaxEdges
+        self._fMinWeight = fMinWeight
+        self._sEvict = sEvict
+        self._fSlack = fSlack
+        # edge key -> index of the document that last reinforced it
+        # (for recency evictions)
+        self._lastSeen = EdgeStore()
+        # node id -> degree in the graph under the budget (and it's size)
+        self._degrees = EdgeStore()
+        self._gGraph = None
+        self._iEdges = 0
+        self._iDropped = 0
+        self._fDroppedWeight = 0.0
+
+    """
+        Applies the budget to gGraph after the edges with the given keys were
+        reinforced by the iDoc-th document (all edges are checked if keys is None).
+        The weights of the edges in gGraph and a mask of the ones it did not
+        have before may be given too (see Union.mergeKeys).
+    """
+    def apply(self, gGraph, keys=None, iDoc=0, weights=None, new=None):
+        if (keys is None):
+            keys = gGraph.getEdgeStore().keys()
+        keys = np.array(keys, dtype=np.int64)
+        self._countNodes(gGraph, keys, new)
+        if (self._sEvict == 'recency' and len(keys)):
+            self._lastSeen.setMany(keys, np.full(len(keys), float(iDoc)))
+        if (self._fMinWeight > 0 and len(keys)):
+            if (weights is None):
+                W = gGraph.getEdgeWeightsByKeys(keys)
+            else:
+                W = np.asarray(weights, dtype=np.float64)
+            light = W < self._fMinWeight
+            if (np.any(light)):
+                self._drop(gGraph, keys[light], W[light])
+        if (self._iMaxEdges is not None and gGraph.size() > self._iMaxEdges):
+            self._evict(gGraph, gGraph.size() - int(self._iMaxEdges * (1.0 - self._fSlack)))
+        self._iEdges = gGraph.size()
+        return gGraph
+
+    # updates the node degrees with the new edges of gGraph among keys
+    # (recounted from all it's edges if they are not known)
+    def _countNodes(self, gGraph, keys, new):
+        if (new is not None and gGraph is self._gGraph
+                and gGraph.size() == self._iEdges + int(np.sum(new))):
+            self._addDegrees(keys[np.asarray(new, dtype=bool)], 1)
+        else:
+            a, b = unpackEdges(gGraph.getEdgeStore().keys())
+            ids, counts = np.unique(np.concatenate((a, b)), return_counts=True)
+            self._degrees = EdgeStore.fromArrays(ids, counts)
+        self._gGraph = gGraph
+
+    # adds sign to the degrees of the nodes of the edges of keys,
+    # returning the ids of the nodes left without edges
+    def _addDegrees(self, keys, sign):
+        a, b = unpackEdges(keys)
+        ids, counts = np.unique(np.concatenate((a, b)), return_counts=True)
+        slots, old = self._degrees.lookupMany(ids)
+        degrees = np.where(np.isnan(old), 0.0, old) + sign * counts
+        self._degrees.setLookedUp(ids, degrees, slots)
+        return ids[degrees <= 0]
+
+    # evicts k edges of gGraph by the eviction policy
+    def _evict(self, gGraph, k):
+        keys, W = gGraph.edgeArrays()
+        # (copied: the arrays are views valid until the graph is modified)
+        keys = keys.copy()
+        W = W.copy()
+        if (k >= len(keys)):
+            victims = np.arange(len(keys))
+        elif (self._sEvict == 'weight'):
+            victims = np.argpartition(W, k - 1)[:k]
+        else:
+            seen = self._lastSeen.getMany(keys, -1.0)
+            victims = np.lexsort((W, seen))[:k]
+        self._drop(gGraph, keys[victims], W[victims])
+
+    # drops the edges of keys (with weights W) from gGraph
+    def _drop(self, gGraph, keys, W):
+        gGraph.delEdgesByKeys(keys)
+        unreached = self._addDegrees(keys, -1)
+        self._degrees.removeMany(unreached)
+        gGraph.delNodesByIds(unreached)
+        if (self._sEvict == 'recency'):
+            self._lastSeen.removeMany(keys[self._lastSeen.slots(keys) >= 0])
+        self._iDropped += len(keys)
+        self._fDroppedWeight += float(np.sum(W))
+
+    def getMaxEdges(self):
+        return self._iMaxEdges
+
+    def getMinWeight(self):
+        return self._fMinWeight
+
+    """
+        Returns the number of edges dropped so far.
+    """
+    def getDroppedEdges(self):
+        return self._iDropped
+
+    """
+        Returns the weight mass of the edges dropped so far (their weights when dropped).
+    """
+    def getDroppedWeight(self):
+        return self._fDroppedWeight
+
+    """
+        Returns the fraction of the weight mass dropped so far, given the graph under the budget.
+    """
+    def getDroppedFraction(self, gGraph):
+        fKept = 0.0
+        if (gGraph is not None):
+            fKept = float(np.sum(gGraph.getEdgeStore().weights()))
+        if (fKept + self._fDroppedWeight == 0):
+            return 0.0
+        return self._fDroppedWeight / (fKept + self._fDroppedWeight)
+
+    """
+        Returns the budget, the dropped edges and weight mass and the dropped fraction on a dictionary.
+    """
+    def getStats(self, gGraph):
+        return {"maxEdges" : self._iMaxEdges, "minWeight" : self._fMinWeight,
+                "edges" : 0 if gGraph is None else gGraph.size(),
+                "droppedEdges" : self._iDropped, "droppedWeight" : self._fDroppedWeight,
+                "droppedFraction" : self.getDroppedFraction(gGraph)}
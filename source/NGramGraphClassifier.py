@@ -0,0 +1,129 @@
+#!/usr/bin/python
+from documentModel import *
+from documentModel.representations.Instrumentation import measured
+from NGramGraphCollector import NGramGraphCollector
+
+"""
+ A multi-class classifier over n-gram graph collectors: one representative graph per label.
+
+ The appropriateness of a text to every class is computed at once: the graph of the text
+ is built once and scored against an index of the edges of all representative graphs
+ (an EdgeIndex), visiting only the classes sharing an edge with it. The scores are the
+ ones of NGramGraphCollector.getAppropriateness (the NVS of the text to the class).
+
+ @author ggianna
+"""
+class NGramGraphClassifier:
+    """
+        All classes use n-grams of rank n and windows of Dwin. The collectors of new labels
+        are created in bIncremental mode, with cBuildCache (a GraphBuildCache) if given.
+    """
+    def __init__(self, n = 3, Dwin = 3, bIncremental=True, cBuildCache=None):
+        self._n = n
+        self._Dwin = Dwin
+        self._bIncremental = bIncremental
+        self._cBuildCache = cBuildCache
+        self._lLabels = []
+        self._dCollectors = {}
+        # the index of the representative graphs and the document count of every
+        # collector when it's class was indexed (a class is re-indexed when it changes)
+        self._iIndex = EdgeIndex()
+        self._dIndexed = {}
+
+    """
+        Returns the collector of a label, creating it for new labels.
+    """
+    def getCollector(self, label):
+        if (label not in self._dCollectors):
+            self.addCollector(label, NGramGraphCollector(self._bIncremental, self._cBuildCache))
+        return self._dCollectors[label]
+
+    """
+        Sets the collector (the model) of a label, e.g. one trained elsewhere.
+    """
+    def addCollector(self, label, cCollector):
+        if (label not in self._dCollectors):
+            self._lLabels.append(label)
+        self._dCollectors[label] = cCollector
+        self._dIndexed.pop(label, None)
+
+    """
+        Adds a text to the class of a label.
+    """
+    def addText(self, label, sText):
+        self.getCollector(label).addText(sText, False, self._n, self._Dwin)
+
+    """
+        Adds many texts to the class of a label (see NGramGraphCollector.addTexts).
+    """
+    def addTexts(self, label, lTexts, nWorkers = None):
+        self.getCollector(label).addTexts(lTexts, self._n, self._Dwin, nWorkers)
+
+    """
+        Adds a graph to the class of a label.
+    """
+    def addGraph(self, label, gGraph):
+        self.getCollector(label).addGraph(gGraph)
+
+    def getLabels(self):
+        return list(self._lLabels)
+
+    # returns the index of the representative graphs, re-indexing (only)
+    # the classes whose collector's document count changed since they were
+    # indexed, or whose collector was set by addCollector. Changes made to a
+    # representative graph directly are not seen until then.
+    def _index(self):
+        for label in self._lLabels:
+            cCollector = self._dCollectors[label]
+            iDocs = cCollector.getDocumentCount()
+            if (self._dIndexed.get(label) != iDocs):
+                self._iIndex.replace(label, cCollector.getRepresentativeGraph())
+                self._dIndexed[label] = iDocs
+        return self._iIndex
+
+    """
+        Returns the appropriateness of a text to every class as a dictionary of labels to scores.
+    """
+    def getScores(self, sText):
+        return self.getGraphScores(self._queryGraph(sText))
+
+    """
+        Returns the appropriateness of a graph to every class as a dictionary of labels to scores.
+    """
+    @measured('classifier.getGraphScores')
+    def getGraphScores(self, gGraph):
+        dScores = dict((label, 0.0) for label in self._lLabels)
+        for (label, dComponents) in self._index().getSimilarityComponents(gGraph).items():
+            dScores[label] = dComponents["NVS"]
+        return dScores
+
+    """
+        Returns the (label, score) of the k classes (all if None) a text is most appropriate to,
+        most appropriate first (ties in the order the labels were added).
+    """
+    def rank(self, sText, k = None):
+        return self.rankGraph(self._queryGraph(sText), k)
+
+    """
+        Returns the (label, score) of the k classes (all if None) a graph is most appropriate to,
+        most appropriate first (ties in the order the labels were added).
+    """
+    def rankGraph(self, gGraph, k = None):
+        dScores = self.getGraphScores(gGraph)
+        lRanked = sorted(enumerate(self._lLabels), key=lambda item: (-dScores[item[1]], item[0]))
+        if (k is not None):
+            lRanked = lRanked[:k]
+        return [(label, dScores[label]) for (i, label) in lRanked]
+
+    """
+        Returns the label of the class a text is most appropriate to (None if there are no classes).
+    """
+    def classify(self, sText):
+        lRanked = self.rank(sText, 1)
+        if (len(lRanked) == 0):
+            return None
+        return lRanked[0][0]
+
+    # the graph of a query text
+    def _queryGraph(self, sText):
+        return DocumentNGramGraph(self._n, self._Dwin, sText, cache=self._cBuildCache)
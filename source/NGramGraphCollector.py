@@ -1,6 +1,13 @@
 #!/usr/bin/python
 import pdb
+import copy
+import multiprocessing
 from documentModel import *
+from documentModel.representations.Instrumentation import measured
+from RepresentativeGraphPartial import RepresentativeGraphPartial, buildRepresentativeGraphPartial
+from EdgeBudget import EdgeBudget
+from documentModel.comparators.NGramGraphSimilarity import getSortedEdgeArrays, getSimilarityComponentsFromArrays
+from documentModel.comparators.Operator import packGraph, unpackGraph
 
 """
  An n-gram graph collector, which can create representative graphs of text/graph sets
@@ -10,26 +17,112 @@ from documentModel import *
  @author ggianna
 """
 class NGramGraphCollector:
-    def __init__(self):
+    """
+        In incremental mode (the default) every added graph is merged in place into a
+        representative graph owned by the collector, visiting only the edges of the added
+        graph. The added graphs are never aliased or modified.
+        The graphs of texts are taken from cBuildCache (a GraphBuildCache) if given.
+        If an eBudget (an EdgeBudget) is given, the representative graph is kept within it
+        after every added graph or partial (only in incremental mode).
+    """
+    def __init__(self, bIncremental=True, cBuildCache=None, eBudget=None):
+        if (eBudget is not None and not bIncremental):
+            raise ValueError('Edge budgets need the incremental mode!')
         self._iDocs = 0.0
         self._gOverallGraph = None
+        self._bIncremental = bIncremental
+        self._cBuildCache = cBuildCache
+        self._eBudget = eBudget
+        # (see freeze)
+        self._bFrozen = False
     
     """
         Adds the graph of the input text to the representative graph.
     """
+    @measured('collector.addText')
     def addText(self, sText, bDeepCopy=False, n = 3, Dwin = 3):
-        ngg1 = DocumentNGramGraph(n,Dwin,sText)
+        ngg1 = DocumentNGramGraph(n,Dwin,sText,cache=self._cBuildCache)
         self.addGraph(ngg1, bDeepCopy)
 
         
+    """
+        Adds the graphs of many texts to the representative graph, building partial
+        representative graphs of consecutive runs of texts on nWorkers processes (one per cpu
+        if None) and combining them. The result is the same as adding the texts one by one.
+    """
+    @measured('collector.addTexts')
+    def addTexts(self, lTexts, n = 3, Dwin = 3, nWorkers = None, iRunSize = None):
+        self._checkNotFrozen()
+        lTexts = list(lTexts)
+        if (nWorkers is None):
+            nWorkers = multiprocessing.cpu_count()
+        if (nWorkers <= 1 or len(lTexts) < 2):
+            for sText in lTexts:
+                self.addText(sText, False, n, Dwin)
+            return
+        # (with a budget, the partials are not bounded by it: the
+        # representative graph is brought within it once they are applied)
+        if (iRunSize is None):
+            iRunSize = max(1, -(-len(lTexts) // nWorkers))
+
+        iStart = int(self._iDocs)
+        lRuns = [(iStart + i, lTexts[i:i + iRunSize], n, Dwin) for i in range(0, len(lTexts), iRunSize)]
+        pool = multiprocessing.Pool(min(nWorkers, len(lRuns)))
+        try:
+            lPartials = pool.map(buildRepresentativeGraphPartial, lRuns)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        # combine neighbouring partials pairwise
+        while (len(lPartials) > 1):
+            lNext = [lPartials[i].combine(lPartials[i + 1]) for i in range(0, len(lPartials) - 1, 2)]
+            if (len(lPartials) % 2 == 1):
+                lNext.append(lPartials[-1])
+            lPartials = lNext
+        self.addPartial(lPartials[0], n, Dwin)
+
+    """
+        Applies a partial representative graph of the documents following the ones already added.
+    """
+    @measured('collector.addPartial')
+    def addPartial(self, pPartial, n = 3, Dwin = 3):
+        self._checkNotFrozen()
+        if (pPartial.getStart() != int(self._iDocs)):
+            raise ValueError('The partial does not start after the added documents!')
+        if (self._gOverallGraph is None):
+            self._gOverallGraph = DocumentNGramGraph(n, Dwin)
+        elif (not self._bIncremental):
+            # never modify a graph that may have been given by the caller
+            self._gOverallGraph = copy.deepcopy(self._gOverallGraph)
+        pPartial.applyTo(self._gOverallGraph)
+        self._iDocs += pPartial.getDocumentCount()
+        if (self._eBudget is not None):
+            self._eBudget.apply(self._gOverallGraph, pPartial.getKeys(self._gOverallGraph.getVocabulary()),
+                                int(self._iDocs) - 1)
+
     """
         Adds the graph input to the representative graph.
     """
+    @measured('collector.addGraph')
     def addGraph(self, gNewGraph, bDeepCopy=False):  # Do NOT use deep copy by default
-        if (self._iDocs == 0):
+        self._checkNotFrozen()
+        bop = Union(lf=1.0 / (self._iDocs + 1.0), commutative=True,distributional=True)
+        if (self._bIncremental):
+            # bDeepCopy is not needed: gNewGraph is only read
+            if (self._gOverallGraph is None):
+                self._gOverallGraph = gNewGraph.emptyCopy()
+            if (self._eBudget is None):
+                bop.applyInPlace(self._gOverallGraph, gNewGraph)
+            else:
+                keys, W, new = bop.mergeKeys(self._gOverallGraph, gNewGraph)
+                self._eBudget.apply(self._gOverallGraph, keys, int(self._iDocs), W, new)
+        elif (self._iDocs == 0):
             self._gOverallGraph = gNewGraph
         else:
-            bop = Union(lf=1.0 / (self._iDocs + 1.0), commutative=True,distributional=True)
             self._gOverallGraph = bop.apply(self._gOverallGraph, gNewGraph, dc=bDeepCopy)
         # Added a doc
         self._iDocs += 1
@@ -38,18 +131,84 @@ class NGramGraphCollector:
         Returns a degree of ''appropriateness'' of a text, given the representative graph.
         Essentially it calculates the Normalized Value Similarity of the text to the representative graph.
     """
+    @measured('collector.getAppropriateness')
     def getAppropriateness(self, sText, n = 3, Dwin = 3):
-        nggNew = DocumentNGramGraph(n,Dwin,sText)
-        gs = SimilarityNVS()
-        return gs.getSimilarityDouble(nggNew, self._gOverallGraph)
+        nggNew = DocumentNGramGraph(n,Dwin,sText,cache=self._cBuildCache)
+        return self._appropriateness(nggNew)
 
     """
         Returns a degree of ''appropriateness'' of a graph, given the representative graph.
         Essentially it calculates the Normalized Value Similarity of the graph to the representative graph.
     """
+    @measured('collector.getGraphAppropriateness')
     def getGraphAppropriateness(self, gGraph):
-        gs = SimilarityNVS()
-        return gs.getSimilarityDouble(gGraph, self._gOverallGraph)
+        return self._appropriateness(gGraph)
+
+    # the NVS of a graph to the representative graph, searched in it's
+    # sorted edge arrays (kept by it's compacted store) if frozen
+    def _appropriateness(self, gGraph):
+        if (not self._bFrozen):
+            return SimilarityNVS().getSimilarityDouble(gGraph, self._gOverallGraph)
+        keys, weights = self._gOverallGraph.getEdgeStore().sortedArrays()
+        k, w = getSortedEdgeArrays(gGraph, self._gOverallGraph.getVocabulary())
+        return getSimilarityComponentsFromArrays(gGraph.number_of_edges(), k, w,
+                                                 self._gOverallGraph.number_of_edges(), keys, weights)["NVS"]
+
+    """
+        Returns the appropriateness of many texts (see getAppropriateness) as a list.
+        Texts are scored in this process, unless nWorkers > 1 and there are at least
+        iMinPoolTexts of them: chunks of iChunkSize texts are then scored on a pool of
+        nWorkers processes, every worker getting a frozen copy of the representative graph
+        once. Workers only share the disk entries of the build cache (if it has a directory).
+    """
+    @measured('collector.getAppropriatenessBatch')
+    def getAppropriatenessBatch(self, lTexts, n = 3, Dwin = 3, nWorkers = 1, iChunkSize = None, iMinPoolTexts = 1000):
+        lTexts = list(lTexts)
+        if (nWorkers <= 1 or len(lTexts) < max(iMinPoolTexts, 2)):
+            return [self._appropriateness(DocumentNGramGraph(n, Dwin, sText, cache=self._cBuildCache))
+                    for sText in lTexts]
+        if (iChunkSize is None):
+            # a few chunks per worker, to balance texts of different lengths
+            iChunkSize = max(1, -(-len(lTexts) // (4 * nWorkers)))
+
+        tCache = None
+        if (self._cBuildCache is not None and self._cBuildCache.getDirectory() is not None):
+            tCache = (self._cBuildCache.getMaxSize(), self._cBuildCache.getDirectory())
+        lChunks = [(lTexts[i:i + iChunkSize], n, Dwin) for i in range(0, len(lTexts), iChunkSize)]
+        pool = multiprocessing.Pool(min(nWorkers, len(lChunks)), _initScoringWorker,
+                                    (packGraph(self._gOverallGraph), tCache))
+        try:
+            lScores = pool.map(_scoreTexts, lChunks, 1)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return [f for lChunk in lScores for f in lChunk]
+
+    """
+        Freezes the representative graph: it is replaced by a compacted copy (see
+        DocumentNGramGraph.compacted), keeping it's edges as sorted arrays only, so that
+        appropriateness is computed with a binary search of the edges of the scored graph.
+        Adding documents to a frozen collector raises a ValueError. getRepresentativeGraph
+        returns the compacted graph: it is not copied, so modifying it modifies the model
+        (and makes it's store build a key index again).
+    """
+    def freeze(self):
+        if (self._gOverallGraph is None):
+            raise ValueError('There is no representative graph to freeze!')
+        if (not self._bFrozen):
+            self._gOverallGraph = self._gOverallGraph.compacted()
+            self._bFrozen = True
+        return self
+
+    def isFrozen(self):
+        return self._bFrozen
+
+    def _checkNotFrozen(self):
+        if (self._bFrozen):
+            raise ValueError('Documents cannot be added to a frozen collector!')
 
     """
      Returns the representative graph of the collection input.
@@ -57,6 +216,47 @@ class NGramGraphCollector:
     def getRepresentativeGraph(self):
         return self._gOverallGraph
 
+    """
+     Returns the number of documents added.
+    """
+    def getDocumentCount(self):
+        return int(self._iDocs)
+
+    """
+     Returns the edge budget of the representative graph (None if unbounded).
+    """
+    def getBudget(self):
+        return self._eBudget
+
+    """
+     Returns the budget, the number and weight mass of the dropped edges and the dropped
+     fraction of the weight mass on a dictionary (None if the collector has no budget).
+    """
+    def getBudgetStats(self):
+        if (self._eBudget is None):
+            return None
+        return self._eBudget.getStats(self._gOverallGraph)
+
+
+# the collector of a scoring worker (see getAppropriatenessBatch)
+_cScoringCollector = None
+
+# sets the (frozen) representative graph of a scoring worker from a payload of packGraph,
+# with a build cache of (maximum size, directory) if given
+def _initScoringWorker(tPayload, tCache):
+    global _cScoringCollector
+    cBuildCache = None
+    if (tCache is not None):
+        cBuildCache = GraphBuildCache(*tCache)
+    _cScoringCollector = NGramGraphCollector(cBuildCache=cBuildCache)
+    _cScoringCollector._gOverallGraph = unpackGraph(tPayload)
+    _cScoringCollector.freeze()
+
+# scores a chunk of texts (lTexts, n, Dwin) in a scoring worker
+def _scoreTexts(tChunk):
+    lTexts, n, Dwin = tChunk
+    return _cScoringCollector.getAppropriatenessBatch(lTexts, n, Dwin, 1)
+
 
 
 
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+import numpy as np
+from documentModel import *
+
+"""
+ A partial representative graph, built from a contiguous run of documents
+ so that runs can be built in parallel and combined into the same graph
+ NGramGraphCollector builds one document at a time.
+
+ Adding the i-th document (i counted from 0 over the whole collection) sets
+ the weight of each of it's edges to lf*W + (1-lf)*w, with lf = 1/(i+1), if the
+ edge is already in the representative graph and to w otherwise. The effect of
+ a run on an edge is thus
+    W -> P*W + Q    if the edge was already in the representative graph
+    absent -> A     otherwise
+ and a partial stores (A, P, Q) for every edge the run touches, along with the
+ number of documents in the run. Partials of consecutive runs are combined
+ by composing these maps.
+
+ @author ggianna
+"""
+class RepresentativeGraphPartial(object):
+
+    """
+        Creates an empty partial for a run starting at the iStart-th document.
+    """
+    def __init__(self, iStart=0, vocabulary=None):
+        if vocabulary is None:
+            vocabulary = getSharedVocabulary()
+        self._vocab = vocabulary
+        self._iStart = iStart
+        self._iDocs = 0
+        self._directed = True
+        # edge key -> slot of the A, P, Q arrays
+        # (built when documents are added)
+        self._index = EdgeStore()
+        # sorted edge keys (for combined partials)
+        self._keys = None
+        self._A = np.empty(16)
+        self._P = np.empty(16)
+        self._Q = np.empty(16)
+
+    """
+        Adds the next document of the run, given it's graph.
+    """
+    def addGraph(self, gNewGraph):
+        lf = 1.0 / (self._iStart + self._iDocs + 1.0)
+        self._directed = gNewGraph.isDirected()
+        if self._keys is not None:
+            self._index = EdgeStore.fromArrays(self._keys, np.zeros(len(self._keys)))
+            self._keys = None
+        keys, weights = gNewGraph.edgeArrays(self._vocab, intern=True)
+        slots = self._index.slots(keys)
+        found = slots >= 0
+        s = slots[found]
+        w = weights[found]
+        self._A[s] = lf * self._A[s] + (1 - lf) * w
+        self._P[s] = lf * self._P[s]
+        self._Q[s] = lf * self._Q[s] + (1 - lf) * w
+
+        # edges first seen in this run
+        new = ~found
+        start = len(self._index)
+        self._index.setMany(keys[new], weights[new])
+        end = len(self._index)
+        if end > len(self._A):
+            cap = max(end, 2 * len(self._A))
+            for name in ('_A', '_P', '_Q'):
+                a = np.empty(cap)
+                a[:start] = getattr(self, name)[:start]
+                setattr(self, name, a)
+        w = weights[new]
+        self._A[start:end] = w
+        self._P[start:end] = lf
+        self._Q[start:end] = (1 - lf) * w
+        self._iDocs += 1
+
+    """
+        Returns the sorted edge keys and their (A, P, Q) arrays.
+    """
+    def getArrays(self):
+        if self._keys is not None:
+            return (self._keys, self._A, self._P, self._Q)
+        n = len(self._index)
+        keys = self._index.keys()
+        order = np.argsort(keys, kind='mergesort')
+        return (keys[order], self._A[:n][order], self._P[:n][order], self._Q[:n][order])
+
+    def getDocumentCount(self):
+        return self._iDocs
+
+    def getStart(self):
+        return self._iStart
+
+    """
+        Returns the partial combined with the partial of the run following it.
+    """
+    def combine(self, other):
+        if other._iStart != self._iStart + self._iDocs:
+            raise ValueError('Only partials of consecutive runs can be combined!')
+        k1, A1, P1, Q1 = self.getArrays()
+        k2, A2, P2, Q2 = other._arraysIn(self._vocab)
+        keys = np.union1d(k1, k2)
+        i1 = np.searchsorted(k1, keys)
+        i2 = np.searchsorted(k2, keys)
+        in1 = (i1 < len(k1)) & (k1[np.minimum(i1, len(k1) - 1)] == keys) if len(k1) else np.zeros(len(keys), bool)
+        in2 = (i2 < len(k2)) & (k2[np.minimum(i2, len(k2) - 1)] == keys) if len(k2) else np.zeros(len(keys), bool)
+        A = np.empty(len(keys))
+        P = np.empty(len(keys))
+        Q = np.empty(len(keys))
+        # edges of the first run only
+        m = in1 & ~in2
+        A[m], P[m], Q[m] = A1[i1[m]], P1[i1[m]], Q1[i1[m]]
+        # edges of the second run only
+        m = in2 & ~in1
+        A[m], P[m], Q[m] = A2[i2[m]], P2[i2[m]], Q2[i2[m]]
+        # edges of both: the second map applied after the first
+        m = in1 & in2
+        P2m = P2[i2[m]]
+        Q2m = Q2[i2[m]]
+        A[m] = P2m * A1[i1[m]] + Q2m
+        P[m] = P2m * P1[i1[m]]
+        Q[m] = P2m * Q1[i1[m]] + Q2m
+
+        res = RepresentativeGraphPartial(self._iStart, self._vocab)
+        res._iDocs = self._iDocs + other._iDocs
+        res._directed = self._directed
+        res._keys = keys
+        res._A, res._P, res._Q = A, P, Q
+        return res
+
+    """
+        Applies the partial to a representative graph in place and returns it.
+    """
+    def applyTo(self, gGraph):
+        keys, A, P, Q = self._arraysIn(gGraph.getVocabulary())
+        def combine(W, A):
+            present = ~np.isnan(W)
+            W[present] = P[present] * W[present] + Q[present]
+            W[~present] = A[~present]
+            return W
+        gGraph.mergeEdgesByKeys(keys, A, combine)
+        return gGraph
+
+    """
+        Returns the (sorted) keys of the edges of the partial, expressed in vocabulary if given.
+    """
+    def getKeys(self, vocabulary=None):
+        if vocabulary is None:
+            vocabulary = self._vocab
+        return self._arraysIn(vocabulary)[0]
+
+    # the sorted arrays with keys expressed in another vocabulary
+    def _arraysIn(self, vocabulary):
+        if vocabulary is self._vocab:
+            return self.getArrays()
+        keys, A, P, Q = self.getArrays()
+        a, b = unpackEdges(keys)
+        ids = dict((i, vocabulary.intern(self._vocab.gram(i))) for i in set(a.tolist()) | set(b.tolist()))
+        keys = packEdges([ids[i] for i in a.tolist()], [ids[i] for i in b.tolist()], self._directed)
+        order = np.argsort(keys, kind='mergesort')
+        return (keys[order], A[order], P[order], Q[order])
+
+    # partials travel between processes with their n-gram strings
+    def __getstate__(self):
+        keys, A, P, Q = self.getArrays()
+        a, b = unpackEdges(keys)
+        ids = np.union1d(a, b)
+        return {'start': self._iStart, 'docs': self._iDocs, 'directed': self._directed,
+                'grams': [self._vocab.gram(i) for i in ids.tolist()],
+                'src': np.searchsorted(ids, a).astype(np.int32),
+                'dst': np.searchsorted(ids, b).astype(np.int32),
+                'A': A, 'P': P, 'Q': Q}
+
+    def __setstate__(self, state):
+        self._vocab = getSharedVocabulary()
+        self._iStart = state['start']
+        self._iDocs = state['docs']
+        self._directed = state['directed']
+        ids = np.array(self._vocab.internAll(state['grams']), dtype=np.int64)
+        keys = packEdges(ids[state['src']], ids[state['dst']], self._directed)
+        order = np.argsort(keys, kind='mergesort')
+        self._index = EdgeStore()
+        self._keys = keys[order]
+        self._A = state['A'][order]
+        self._P = state['P'][order]
+        self._Q = state['Q'][order]
+
+
+# builds the partial of a run of texts (worker process entry point)
+# args = (iStart, lTexts, n, Dwin)
+def buildRepresentativeGraphPartial(args):
+    iStart, lTexts, n, Dwin = args
+    p = RepresentativeGraphPartial(iStart)
+    for sText in lTexts:
+        p.addGraph(DocumentNGramGraph(n, Dwin, sText))
+    return p
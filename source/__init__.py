@@ -1,2 +1,3 @@
 from documentModel import *
 from NGramGraphCollector import *
+from NGramGraphClassifier import *
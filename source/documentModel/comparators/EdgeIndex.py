@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+   EdgeIndex.py
+
+   Created on Oct 17, 2026, 2:00 PM
+"""
+
+"""
+ An inverted index from edge keys to posting lists of
+ (document, weight), for finding the stored graphs most
+ similar to a query graph.
+
+ A document sharing no edge with the query has VS = 0
+ (and NVS = 0), so only the documents on the posting lists
+ of the query edges are scored, in time proportional to
+ the length of these lists instead of the number of documents.
+ Scores are the ones of getSimilarityComponentsFromArrays.
+"""
+import numpy as np
+from NGramGraphSimilarity import getSortedEdgeArrays
+
+
+class EdgeIndex(object):
+
+    # graphs are keyed in the given vocabulary
+    # (the vocabulary of the first added graph if None)
+    def __init__(self, vocabulary=None):
+        self._vocab = vocabulary
+        self._docIds = []
+        # document id -> document number
+        self._docs = {}
+        self._nodeCounts = []
+        self._edgeCounts = []
+        # postings sorted by edge key
+        self._keys = np.empty(0, dtype=np.int64)
+        self._postDocs = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0, dtype=np.float64)
+        # postings added since the last query
+        self._pending = []
+
+    # adds the graph of a document
+    def add(self, docId, ngg):
+        if docId in self._docs:
+            raise ValueError('Document already indexed: ' + str(docId))
+        d = len(self._docIds)
+        self._docIds.append(docId)
+        self._docs[docId] = d
+        self._nodeCounts.append(0)
+        self._edgeCounts.append(0)
+        self._post(d, ngg)
+
+    # replaces the graph of a document (adding it if it is not indexed),
+    # dropping only it's postings: the document keeps it's place in the
+    # order of the documents. A document replaced by None has no edges.
+    def replace(self, docId, ngg):
+        d = self._docs.get(docId)
+        if d is None:
+            if ngg is not None:
+                self.add(docId, ngg)
+            return
+        self._merge()
+        keep = self._postDocs != d
+        self._keys = self._keys[keep]
+        self._postDocs = self._postDocs[keep]
+        self._weights = self._weights[keep]
+        self._nodeCounts[d] = 0
+        self._edgeCounts[d] = 0
+        if ngg is not None:
+            self._post(d, ngg)
+
+    # adds the postings of the graph of the d-th document
+    def _post(self, d, ngg):
+        if self._vocab is None:
+            self._vocab = ngg.getVocabulary()
+        if self._vocab is ngg.getVocabulary():
+            keys, weights = ngg.getEdgeStore().sortedArrays()
+        else:
+            keys, weights = ngg.edgeArrays(self._vocab, intern=True)
+        self._nodeCounts[d] = ngg.number_of_edges()
+        self._edgeCounts[d] = len(keys)
+        self._pending.append((np.array(keys, dtype=np.int64), np.full(len(keys), d, dtype=np.int64),
+                              np.array(weights, dtype=np.float64)))
+
+    # adds the graphs of many documents given as (document id, graph) tuples
+    # (e.g. the items of an NGramGraphCorpus)
+    def addAll(self, items):
+        for docId, ngg in items:
+            self.add(docId, ngg)
+
+    # merges the pending postings into the sorted ones
+    # (only the pending ones are sorted, then inserted in place)
+    def _merge(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([p[0] for p in self._pending])
+        docs = np.concatenate([p[1] for p in self._pending])
+        weights = np.concatenate([p[2] for p in self._pending])
+        order = np.argsort(keys, kind='mergesort')
+        keys = keys[order]
+        at = np.searchsorted(self._keys, keys, 'right')
+        self._keys = np.insert(self._keys, at, keys)
+        self._postDocs = np.insert(self._postDocs, at, docs[order])
+        self._weights = np.insert(self._weights, at, weights[order])
+        self._pending = []
+
+    def __len__(self):
+        return len(self._docIds)
+
+    def __contains__(self, docId):
+        return docId in self._docs
+
+    def ids(self):
+        return list(self._docIds)
+
+    def getVocabulary(self):
+        return self._vocab
+
+    # returns the document numbers sharing an edge with the
+    # query graph and their SS, VS and NVS to it as arrays
+    def _score(self, ngg):
+        self._merge()
+        if self._vocab is None or len(self._keys) == 0:
+            empty = np.empty(0)
+            return np.empty(0, dtype=np.int64), empty, empty, empty
+        qk, qw = getSortedEdgeArrays(ngg, self._vocab)
+
+        # the postings of every query edge
+        lo = np.searchsorted(self._keys, qk, 'left')
+        hi = np.searchsorted(self._keys, qk, 'right')
+        lengths = hi - lo
+        total = int(lengths.sum())
+        ends = np.cumsum(lengths)
+        idx = np.repeat(lo - (ends - lengths), lengths) + np.arange(total)
+        a = np.repeat(qw, lengths)
+        b = self._weights[idx]
+        docs = self._postDocs[idx]
+
+        # accumulate the VS contributions per document
+        high = np.maximum(a, b)
+        low = np.minimum(a, b)
+        # edges of zero weight on both graphs add nothing
+        nz = high != 0
+        cand, inv = np.unique(docs[nz], return_inverse=True)
+        sums = np.bincount(inv, weights=low[nz] / high[nz], minlength=len(cand))
+
+        nq = ngg.number_of_edges()
+        nodes = np.asarray(self._nodeCounts, dtype=np.float64)[cand]
+        edges = np.asarray(self._edgeCounts, dtype=np.float64)[cand]
+        VS = sums / np.maximum(edges, len(qk))
+        y = np.maximum(nodes, nq)
+        SS = np.where(y == 0, 0.0, np.minimum(nodes, nq) / np.where(y == 0, 1.0, y))
+        NVS = np.where(SS != 0, VS / np.where(SS != 0, SS, 1.0), 0.0)
+        return cand, SS, VS, NVS
+
+    # returns the SS, VS and NVS of the query graph to every document
+    # sharing an edge with it, as a dictionary of document ids to dictionaries
+    # (all other documents have VS and NVS 0)
+    def getSimilarityComponents(self, ngg):
+        cand, SS, VS, NVS = self._score(ngg)
+        return dict((self._docIds[d], {"SS": s, "VS": v, "NVS": n})
+                    for d, s, v, n in zip(cand.tolist(), SS.tolist(), VS.tolist(), NVS.tolist()))
+
+    # returns the (document id, NVS) of the k documents most similar
+    # to the query graph, most similar first (ties in the order
+    # the documents were added). Documents of NVS 0 are never returned.
+    def search(self, ngg, k=10):
+        cand, SS, VS, NVS = self._score(ngg)
+        keep = NVS > 0
+        cand = cand[keep]
+        NVS = NVS[keep]
+        order = np.lexsort((cand, -NVS))[:k]
+        return [(self._docIds[d], n) for d, n in zip(cand[order].tolist(), NVS[order].tolist())]
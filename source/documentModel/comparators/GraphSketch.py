@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+"""
+   GraphSketch.py
+
+   Created on Oct 17, 2026, 5:00 PM
+"""
+
+"""
+ MinHash sketches of the edge sets of ngram graphs and a
+ banded LSH index over them, for finding the similar pairs
+ of a large set of graphs without comparing every pair.
+
+ A sketch is a fixed-size array of hash values; the fraction
+ of equal values of two sketches estimates the Jaccard
+ similarity of the edge sets of their graphs (|E1 & E2| / |E1 | E2|)
+ or, for weighted sketches (consistent weighted sampling, after
+ Ioffe 2010), their weighted Jaccard similarity
+ (sum of min(w1, w2) / sum of max(w1, w2) over all edges),
+ the set counterparts of the containment of SS and the
+ weight ratios of VS.
+
+ Edges are hashed by their ngram strings, so sketches of
+ graphs of any vocabulary (and process) are comparable.
+"""
+import numpy as np
+from NGramGraphSimilarity import SimilarityNVS
+from ..representations.EdgeStore import mixHashes, hashEdgePairs, unpackEdges, GOLDEN
+
+# the hash value of empty sketches
+EMPTY = np.uint64(0xffffffffffffffff)
+
+_S32 = np.uint64(32)
+_LOW = np.uint64(0xffffffff)
+
+# two arrays of uniform numbers in (0, 1) from an array of uint64 hashes
+def _uniforms(z):
+    return (((z >> _S32).astype(np.float64) + 0.5) / float(1 << 32),
+            ((z & _LOW).astype(np.float64) + 0.5) / float(1 << 32))
+
+# returns a hash per edge of a graph (independent of it's vocabulary,
+# see NGramVocabulary.gramHashes) and the edge weights
+def getEdgeHashes(ngg):
+    keys = ngg.getEdgeStore().keys()
+    weights = ngg.getEdgeStore().weights()
+    a, b = unpackEdges(keys)
+    vocab = ngg.getVocabulary()
+    return (hashEdgePairs(vocab.gramHashes(a), vocab.gramHashes(b), ngg.isDirected()),
+            np.array(weights, dtype=np.float64))
+
+
+class MinHashSketcher(object):
+
+    # numHashes is the size of the sketches, weighted selects weighted
+    # sketches (edges of zero weight are then ignored); only sketches
+    # of sketchers with the same settings are comparable
+    def __init__(self, numHashes=128, weighted=False, seed=0, blockSize=4096):
+        if numHashes < 1:
+            raise ValueError('Sketch size must be positive!')
+        self._numHashes = int(numHashes)
+        self._weighted = weighted
+        self._blockSize = max(int(blockSize), 1)
+        seeds = mixHashes(np.arange(1, 3 * self._numHashes + 1, dtype=np.uint64) + np.full(1, seed, dtype=np.uint64) * GOLDEN)
+        self._seeds = seeds.reshape(3, self._numHashes, 1)
+
+    def getNumHashes(self):
+        return self._numHashes
+
+    def isWeighted(self):
+        return self._weighted
+
+    # returns the sketch of a graph as an array of numHashes uint64
+    def sketch(self, ngg):
+        h, w = getEdgeHashes(ngg)
+        if self._weighted:
+            keep = w > 0
+            return self._weightedSketch(h[keep], w[keep])
+        return self._sketch(h)
+
+    def _sketch(self, h):
+        res = np.full(self._numHashes, EMPTY, dtype=np.uint64)
+        seeds = self._seeds[0]
+        # edges are processed in blocks to bound the memory used
+        for s in range(0, len(h), self._blockSize):
+            block = mixHashes(h[s:s + self._blockSize][None, :] ^ seeds)
+            res = np.minimum(res, block.min(axis=1))
+        return res
+
+    def _weightedSketch(self, h, w):
+        res = np.full(self._numHashes, EMPTY, dtype=np.uint64)
+        best = np.full(self._numHashes, np.inf)
+        rows = np.arange(self._numHashes)
+        for s in range(0, len(h), self._blockSize):
+            hb = h[s:s + self._blockSize][None, :]
+            lw = np.log(w[s:s + self._blockSize])[None, :]
+            u1, u2 = _uniforms(mixHashes(hb ^ self._seeds[0]))
+            r = -np.log(u1 * u2)
+            u1, u2 = _uniforms(mixHashes(hb ^ self._seeds[1]))
+            c = -np.log(u1 * u2)
+            beta = _uniforms(mixHashes(hb ^ self._seeds[2]))[0]
+            t = np.floor(lw / r + beta)
+            a = c / np.exp(r * (t - beta) + r)
+            j = a.argmin(axis=1)
+            m = a[rows, j]
+            better = m < best
+            best[better] = m[better]
+            # the sample is the (edge, t) pair
+            sample = mixHashes(hb[0, j] ^ (t[rows, j].astype(np.int64).astype(np.uint64) * GOLDEN))
+            res[better] = sample[better]
+        return res
+
+    # returns the sketches of many graphs as a (graphs x numHashes) array
+    def sketchAll(self, graphs):
+        graphs = list(graphs)
+        res = np.empty((len(graphs), self._numHashes), dtype=np.uint64)
+        for i, g in enumerate(graphs):
+            res[i] = self.sketch(g)
+        return res
+
+
+def isEmptySketch(s):
+    return bool(np.all(s == EMPTY))
+
+# estimates the (weighted) Jaccard similarity of two sketches
+def estimateSimilarity(s1, s2):
+    if isEmptySketch(s1) or isEmptySketch(s2):
+        return 0.0
+    return float(np.mean(s1 == s2))
+
+# the probability that a pair of graphs of the given (sketch) similarity
+# becomes a candidate of an LSH index of bands bands of rows rows
+def getCandidateProbability(similarity, bands, rows):
+    return 1.0 - (1.0 - float(similarity) ** rows) ** bands
+
+# returns the (bands, rows) of numHashes hash values that best
+# separate pairs above and below a similarity threshold,
+# weighing false negatives by recallWeight and false positives by 1
+def getLSHParameters(numHashes, threshold, recallWeight=1.0, steps=100):
+    xs = (np.arange(steps) + 0.5) / steps
+    best = None
+    for rows in range(1, numHashes + 1):
+        bands = numHashes // rows
+        p = 1.0 - (1.0 - xs ** rows) ** bands
+        below = xs < threshold
+        cost = np.sum(p[below]) + recallWeight * np.sum(1.0 - p[~below])
+        if best is None or cost < best[0]:
+            best = (cost, bands, rows)
+    return best[1], best[2]
+
+
+class LSHIndex(object):
+
+    # an index of sketches of bands * rows hash values
+    # (bands, rows from getLSHParameters for a threshold
+    # if not given)
+    def __init__(self, bands=None, rows=None, numHashes=128, threshold=0.5):
+        if bands is None or rows is None:
+            bands, rows = getLSHParameters(numHashes, threshold)
+        if bands < 1 or rows < 1:
+            raise ValueError('Bands and rows must be positive!')
+        self._bands = int(bands)
+        self._rows = int(rows)
+        self._docIds = []
+        self._sketches = []
+        # band -> hash values of the band -> document numbers
+        self._buckets = [{} for b in range(self._bands)]
+
+    def getBands(self):
+        return self._bands
+
+    def getRows(self):
+        return self._rows
+
+    # the similarity at which pairs become candidates with probability 1/2
+    def getThreshold(self):
+        return (1.0 - 0.5 ** (1.0 / self._bands)) ** (1.0 / self._rows)
+
+    # the estimated recall of the index for pairs of the given similarity
+    # (or the mean recall over all similarities of at least minSimilarity)
+    def getRecall(self, similarity=None, minSimilarity=None, steps=100):
+        if minSimilarity is None:
+            return getCandidateProbability(similarity, self._bands, self._rows)
+        xs = minSimilarity + (1.0 - minSimilarity) * (np.arange(steps) + 0.5) / steps
+        return float(np.mean(1.0 - (1.0 - xs ** self._rows) ** self._bands))
+
+    def __len__(self):
+        return len(self._docIds)
+
+    # adds the sketch of a document
+    # (of at least bands * rows hash values)
+    def add(self, docId, sketch):
+        sketch = np.asarray(sketch, dtype=np.uint64)
+        if len(sketch) < self._bands * self._rows:
+            raise ValueError('Sketch is smaller than bands x rows!')
+        d = len(self._docIds)
+        self._docIds.append(docId)
+        self._sketches.append(sketch)
+        # empty graphs are similar to none
+        if isEmptySketch(sketch):
+            return
+        for b in range(self._bands):
+            key = sketch[b * self._rows:(b + 1) * self._rows].tobytes()
+            self._buckets[b].setdefault(key, []).append(d)
+
+    # returns the ids of the documents sharing a bucket with a sketch
+    def candidates(self, sketch):
+        sketch = np.asarray(sketch, dtype=np.uint64)
+        if isEmptySketch(sketch):
+            return []
+        found = set()
+        for b in range(self._bands):
+            key = sketch[b * self._rows:(b + 1) * self._rows].tobytes()
+            found.update(self._buckets[b].get(key, ()))
+        return [self._docIds[d] for d in sorted(found)]
+
+    # returns the pairs of document ids sharing a bucket
+    # (in the order the documents were added), only those
+    # of estimated similarity at least threshold if given
+    def candidatePairs(self, threshold=None):
+        pairs = set()
+        for buckets in self._buckets:
+            for docs in buckets.values():
+                for i in range(len(docs)):
+                    for j in range(i + 1, len(docs)):
+                        pairs.add((docs[i], docs[j]))
+        res = []
+        for (i, j) in sorted(pairs):
+            if threshold is None or estimateSimilarity(self._sketches[i], self._sketches[j]) >= threshold:
+                res.append((self._docIds[i], self._docIds[j]))
+        return res
+
+
+# returns the pairs (i, j, NVS) of graphs, i < j, that are candidates of an LSH
+# index of their sketches tuned to threshold (a Jaccard similarity, see
+# getLSHParameters) with their exact NVS, if it is at least minNVS.
+# NVS is computed only for the candidates, so pairs may be missed
+# (see LSHIndex.getRecall)
+def findSimilarPairs(graphs, threshold=0.5, numHashes=128, bands=None, rows=None, weighted=False, seed=0, minNVS=0.0):
+    graphs = list(graphs)
+    sketcher = MinHashSketcher(numHashes, weighted, seed)
+    index = LSHIndex(bands, rows, numHashes, threshold)
+    for i, s in enumerate(sketcher.sketchAll(graphs)):
+        index.add(i, s)
+    gs = SimilarityNVS()
+    res = []
+    for (i, j) in index.candidatePairs():
+        s = gs.getSimilarityDouble(graphs[i], graphs[j])
+        if s >= minNVS:
+            res.append((i, j, s))
+    return res
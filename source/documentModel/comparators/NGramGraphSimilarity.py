@@ -15,6 +15,80 @@
  @author ysig
 """
 from Operator import *
+import numpy as np
+from ..representations import Instrumentation
+from ..representations.Instrumentation import clock, measured
+
+
+# returns the edge keys and weights of an ngram graph
+# sorted by key, with keys expressed in the given vocabulary
+def getSortedEdgeArrays(ngg,vocabulary):
+    if vocabulary is ngg.getVocabulary():
+        # cached by the graph until it changes
+        return ngg.getEdgeStore().sortedArrays()
+    keys, weights = ngg.edgeArrays(vocabulary)
+    order = np.argsort(keys, kind='mergesort')
+    return keys[order], weights[order]
+
+# calculates the SS, VS and NVS similarities given the node
+# counts and the sorted edge keys and weights of two ngram graphs
+# (keys expressed in the same vocabulary)
+def getSimilarityComponentsFromArrays(n1,k1,w1,n2,k2,w2):
+    # SS
+    y = max(n1,n2)
+    if y == 0: # If both graphs are zero sized
+        SS = 0.0
+    else:
+        SS = (min(n1,n2)*1.0) / y
+
+    # VS: search the edges of the smaller graph
+    # in the sorted edges of the bigger one
+    ne1 = len(k1)
+    ne2 = len(k2)
+    if(ne1>ne2):
+        k1, w1, k2, w2 = k2, w2, k1, w1
+    VS = 0.0
+    if min(ne1,ne2) > 0:
+        idx = np.searchsorted(k2, k1)
+        idx[idx == len(k2)] = 0
+        hit = (k2[idx] == k1)
+        a = w1[hit]
+        b = w2[idx[hit]]
+        hi = np.maximum(a,b)
+        lo = np.minimum(a,b)
+        # edges of zero weight on both graphs add nothing
+        nz = hi != 0
+        VS = float(np.sum(lo[nz]/hi[nz]))/max(ne1,ne2)
+
+    # NVS
+    if SS != 0:
+        NVS = VS/SS
+    else:
+        NVS = 0.0
+    return {"SS" : SS, "VS" : VS, "NVS" : NVS}
+
+# given two ngram graphs
+# calculates the SS, VS and NVS similarities in a single
+# merge of their sorted edge key and weight arrays
+# and returns them on a dictionary
+def getAllSimilarityComponents(ngg1,ngg2):
+    # key the smaller graph in the vocabulary of the bigger
+    if ngg1.size() > ngg2.size():
+        vocabulary = ngg1.getVocabulary()
+    else:
+        vocabulary = ngg2.getVocabulary()
+    sink = Instrumentation._sink
+    if sink is not None:
+        start = clock()
+    k1, w1 = getSortedEdgeArrays(ngg1,vocabulary)
+    k2, w2 = getSortedEdgeArrays(ngg2,vocabulary)
+    if sink is None:
+        return getSimilarityComponentsFromArrays(ngg1.number_of_edges(),k1,w1,ngg2.number_of_edges(),k2,w2)
+    sink.record('similarity.arrays.seconds', clock() - start)
+    start = clock()
+    res = getSimilarityComponentsFromArrays(ngg1.number_of_edges(),k1,w1,ngg2.number_of_edges(),k2,w2)
+    sink.record('similarity.components.seconds', clock() - start)
+    return res
 
 
 # a general similarity class
@@ -50,6 +124,7 @@ class SimilaritySS(Similarity):
     
     # given two ngram graphs
     # returns the SS-similarity as double
+    @measured('comparator.SimilaritySS')
     def getSimilarityDouble(self,ngg1,ngg2):
         # WRONG
         # return (min(ngg1.minW(),ngg2.minW())*1.0)/max(ngg1.maxW(),ngg2.maxW())
@@ -80,22 +155,9 @@ class SimilarityVS(Similarity):
     
     # given two ngram graphs
     # returns the VS-similarity as double    
+    @measured('comparator.SimilarityVS')
     def getSimilarityDouble(self,ngg1,ngg2):
-        s = 0.0
-        g1 = ngg1.getGraph()
-        g2 = ngg2.getGraph()
-        ne1 = g1.number_of_edges()
-        ne2 = g2.number_of_edges()
-        if(ne1>ne2):
-            t = g2
-            g2 = g1
-            g1 = t
-        edges2 = set(g2.edges()) # Use set to speed up finding
-        for (u,v,d) in g1.edges(data=True):
-            if((u,v) in edges2):
-                dp = g2.get_edge_data(u, v)
-                s+= min(d['weight'],dp['weight'])/max(d['weight'],dp['weight'])
-        return s/max(g1.number_of_edges(),g2.number_of_edges())
+        return getAllSimilarityComponents(ngg1,ngg2)["VS"]
 
     # given two ngram graphs
     # returns the VS-similarity
@@ -116,19 +178,18 @@ class SimilarityNVS(Similarity):
      
     # given two ngram graphs
     # returns the NVS-similarity as double    
+    # (0.0 if SS is 0)
+    @measured('comparator.SimilarityNVS')
     def getSimilarityDouble(self,ngg1,ngg2):
-        SS = SimilaritySS()
-        VS = SimilarityVS()
-        return (VS.getSimilarityDouble(ngg1,ngg2)*1.0)/SS.getSimilarityDouble(ngg1,ngg2)
+        return getAllSimilarityComponents(ngg1,ngg2)["NVS"]
     
     # given two ngram graphs
     # returns the NVS-similarity
     # components e.g. SS and VS
+    # (along with NVS itself)
     # on a dictionary
     def getSimilarityComponents(self,ngg1,ngg2):
-        SS = SimilaritySS()
-        VS = SimilarityVS()
-        return {"SS" : SS.getSimilarityDouble(ngg1,ngg2), "VS" : VS.getSimilarityDouble(ngg1,ngg2)}
+        return getAllSimilarityComponents(ngg1,ngg2)
     
     # given a dictionary containing
     # SS similarity and VS similarity
@@ -1,6 +1,30 @@
-import threading
 import copy
+import multiprocessing
 import warnings
+import numpy as np
+from ..representations.Instrumentation import measured
+
+# the graph an operator modifies to produce it's result:
+# a copy-on-write copy of g (see DocumentNGramGraph.overlay)
+# if dc is set (the default), or g itself
+def copyResult(g,dc=True):
+    if (dc):
+        return g.overlay()
+    return g
+
+# the weights of the edges with keys query, given the (unsorted)
+# edge keys and weights of a graph (nan for missing edges)
+def lookupWeights(keys,weights,query):
+    res = np.full(len(query), np.nan)
+    if len(keys) == 0:
+        return res
+    order = np.argsort(keys)
+    sk = keys[order]
+    slots = np.searchsorted(sk, query)
+    slots[slots == len(sk)] = 0
+    found = sk[slots] == query
+    res[found] = weights[order][slots[found]]
+    return res
 
 # a general Operator class
 class Operator(object):
@@ -58,12 +82,13 @@ class Union(BinaryOperator):
         self._lf = lf
     
     # apply union to two ngram graphs
+    @measured('operator.Union')
     def apply(self,*args,**kwargs):
         # checks if operator is binary
         super(self.__class__, self).apply(*args)
         
         # a checks for a deepcopy argument
-        # default operation is deepcopy
+        # default operation is a (copy-on-write) copy
         # inorder to not corrupt the original 
         # mutable input arguments
         if(kwargs.has_key("dc")):
@@ -83,16 +108,35 @@ class Union(BinaryOperator):
                 a = g2
                 b = g1
                 indexer = [1,0]
-        # applies deepcopy only on argument a
-        if (dc):
-            r = copy.deepcopy(a)
-        else:
-            r = a
-            
-        
-        gg2 = b.getGraph()
-        rg = r.getGraph()
-        re = set(rg.edges()) # Convert edge-list to set to speed-up look-up
+        # copies only argument a (copy-on-write, see overlay)
+        r = copyResult(a,dc)
+        return self._merge(r,b,indexer)
+
+    # merges ngram graph b into ngram graph r in place
+    # (common edges get lf*w_r+(1-lf)*w_b)
+    # only the edges of b are visited and b is not modified,
+    # so the cost is proportional to the size of b
+    @measured('operator.Union.inPlace')
+    def applyInPlace(self,r,b):
+        return self._merge(r,b,[0,1])
+
+    # applyInPlace returning, rather than r, the keys of the edges of b
+    # (in the vocabulary of r), their weights in r after the merge
+    # and a mask of the edges that r did not have
+    @measured('operator.Union.inPlace')
+    def mergeKeys(self,r,b):
+        res = []
+        self._merge(r,b,[0,1],res)
+        if not res:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=bool)
+        return res[0]
+
+    # merges b into r where indexer tells which of
+    # the two weights [w_r, w_b] the learning factor applies to
+    # (appending (keys, weights, new edges mask) to res if given)
+    def _merge(self,r,b,indexer,res=None):
+        # edges of b keyed in the vocabulary of r
+        keys, weights = b.edgeArrays(r.getVocabulary(), intern=True)
         
         # pseudocode:
         # For graphs G1,G2 where smallGraph = min(G1,G2) & bigGraph = max(G1,G2)
@@ -103,14 +147,16 @@ class Union(BinaryOperator):
         #    else
         #       add edge to bigGraph' with the value it has on small graph
         # return bigGraph'
-        for (u,v,w) in gg2.edges(data=True):
-            if((u,v) in re):
-                ed = rg.get_edge_data(u, v)
-                indexed = [ed['weight'],w['weight']]
-                wp = (self._lf*indexed[indexer[0]]+(1-self._lf)*indexed[indexer[1]])
-            else:
-                wp = w['weight']
-            r.setEdge(u,v,wp)
+        # (the edges of r are looked up once, for both reading and writing)
+        def combine(ed, weights):
+            common = ~np.isnan(ed)
+            indexed = [ed[common],weights[common]]
+            wp = weights.copy()
+            wp[common] = (self._lf*indexed[indexer[0]]+(1-self._lf)*indexed[indexer[1]])
+            if res is not None:
+                res.append((keys, wp, ~common))
+            return wp
+        r.mergeEdgesByKeys(keys,weights,combine)
         return r
 
 # possibly not optimal
@@ -122,13 +168,14 @@ class Intersect(BinaryOperator):
         self._distributional = distributional
     
     # apply intersection between to two ngram graphs
+    @measured('operator.Intersect')
     def apply(self,*args,**kwargs):
         
         # checks if operator is binary
         super(self.__class__, self).apply(*args)
         
         # a checks for a deepcopy argument
-        # default operation is deepcopy
+        # default operation is a (copy-on-write) copy
         # inorder to not corrupt the original 
         # mutable input arguments
         if(kwargs.has_key("dc")):
@@ -147,47 +194,44 @@ class Intersect(BinaryOperator):
                 a = g2
                 b = g1
 
-        # applies deepcopy only on argument a            
-        if (dc):
-            r = copy.deepcopy(a)
-        else:
-            r = a
+        # copies only argument a (copy-on-write, see overlay)
+        r = copyResult(a,dc)
 
-        gg2 = b.getGraph()
-        
-        rg = r.getGraph()
-        re = rg.edges(data=True)
+        # edges of b keyed in the vocabulary of r
+        keys, weights = b.edgeArrays(r.getVocabulary())
         
         # pseudocode:
         # For graphs G1,G2 where smallGraph = min(G1,G2) & bigGraph = max(G1,G2)
         # bigGraph gets deepcopied to bigGraph'
-        # For all (A,B) belongs in smallGraph edges
-        #    if (A,B) belongs also to bigGraph edges (deep-copied graph)
+        # For all (A,B) belongs in bigGraph' edges
+        #    if (A,B) belongs also to smallGraph edges
         #       replace the weight with value ((w1+w2)/2) on bigGraph'
         #    else
-        #       remove edge from bigGraph' with the value it has on small graph
+        #       remove edge from bigGraph'
         # return bigGraph'
-        for (u,v,w) in gg2:
-            if((u,v) in re):
-                # upon common reassign weights
-                ed = re.get_edge_data(u, v)
-                r.setEdge(u,v,(ed['weight']+w['weight'])/2.0)
-            else:
-                # delte the non common
-                r.delEdge(u,v)
+        rk, rw = r.edgeArrays()
+        ed = lookupWeights(keys, weights, rk)
+        common = ~np.isnan(ed)
+        # (rk and rw are views valid until r is modified)
+        ck, cw = rk[common], (ed[common]+rw[common])/2.0
+        # delete the non common
+        r.delEdgesByKeys(rk[~common])
+        # upon common reassign weights
+        r.setEdgesByKeys(ck, cw)
         # deletes unreached nodes (trims graph)
-		r.deleteUnreachedNodes()
+        r.deleteUnreachedNodes()
         return r
 
 # applies a delta operator between two arguments
 class delta(BinaryOperator):
+    @measured('operator.delta')
     def apply(self,*args,**kwargs):
         
         # checks if operator is binary
         super(self.__class__, self).apply(*args)
         
         # a checks for a deepcopy argument
-		# default operation is deepcopy
+		# default operation is a (copy-on-write) copy
         # inorder to not corrupt the original 
         # mutable input arguments
         if(kwargs.has_key("dc")):
@@ -196,17 +240,11 @@ class delta(BinaryOperator):
             dc = True
 
         a,b = args
-        # applies deepcopy only on argument a
-        if (dc):
-            r = copy.deepcopy(a)
-        else:
-            r = a
+        # copies only argument a (copy-on-write, see overlay)
+        r = copyResult(a,dc)
             
-        gg2 = b.getGraph()
-        gg2ed = gg2.edges()
-        
-        rg = r.getGraph()
-        re = rg.edges()
+        # edges of b keyed in the vocabulary of r
+        keys, weights = b.edgeArrays(r.getVocabulary())
         
         # pseudocode:
         # For graphs G1,G2
@@ -215,9 +253,8 @@ class delta(BinaryOperator):
         #    if (A,B) belongs also to G2 edges (deep-copied graph)
         #       delete it from G1'
         # return G1'
-        for (u,v) in re:
-            if((u,v) in gg2ed):
-                r.delEdge(u,v)
+        rk = r.edgeArrays()[0]
+        r.delEdgesByKeys(rk[np.in1d(rk, keys)])
         # deletes unreached nodes (trims graph)
         r.deleteUnreachedNodes()
         return r
@@ -227,12 +264,13 @@ class delta(BinaryOperator):
 class inverse_intersection(BinaryOperator):
     # calculates apllication inverse_intersection 
     # between two n gram graphs
+    @measured('operator.inverse_intersection')
     def apply(self,*args,**kwargs):
         # checks if operator is binary
         super(self.__class__, self).apply(*args)
         
         # a checks for a deepcopy argument
-        # default operation is deepcopy
+        # default operation is a (copy-on-write) copy
         # inorder to not corrupt the original 
         # mutable input arguments
         if(kwargs.has_key("dc")):
@@ -241,17 +279,11 @@ class inverse_intersection(BinaryOperator):
             dc = True
         a,b = args
         
-        # applies deepcopy only on argument a
-        if (dc):
-            r = copy.deepcopy(a)
-        else:
-            r = a
+        # copies only argument a (copy-on-write, see overlay)
+        r = copyResult(a,dc)
             
-        gg2 = b.getGraph()
-        gg2ed = gg2.edges(data=True)
-        
-        rg = r.getGraph()
-        re = rg.edges()
+        # edges of b keyed in the vocabulary of r
+        keys, weights = b.edgeArrays(r.getVocabulary(), intern=True)
         
         # pseudocode:
         # For graphs G1,G2
@@ -262,11 +294,10 @@ class inverse_intersection(BinaryOperator):
         #    else
         #       add edges to G1'
         # return G1'
-        for (u,v,w) in gg2ed:
-            if((u,v) in re):
-                r.delEdge(u,v)
-            else:
-                r.setEdge(u,v,w['weight'])
+        common = ~np.isnan(r.getEdgeWeightsByKeys(keys))
+        r.delEdgesByKeys(keys[common])
+        if not np.all(common):
+            r.setEdgesByKeys(keys[~common],weights[~common])
         r.deleteUnreachedNodes()
         return r
 # implents "update", which is the correct way 
@@ -279,82 +310,104 @@ class Update(NaryOperator):
         # undex is used as an index for the current number of arguments
         # that have been updated
         self._undex = 0
-    
+        self._result = None
+
+    # starts a new update
+    def reset(self):
+        self._undex = 0
+        self._result = None
+
+    # adds a graph to the update: common edges get the mean
+    # of their weights in the graphs added so far, while
+    # the others keep the weight of the graph they come from.
+    # the first graph is copied (copy-on-write) if dc is set,
+    # later ones are only read
+    def add(self,g,dc=True):
+        if (self._result is None):
+            self._result = copyResult(g,dc)
+        else:
+            # from undex arguments unified this is the undex+1-th
+            # so the learning factor is assigned relatively
+            self._Op.setLF(float(self._undex)/(self._undex+1))
+            self._Op.applyInPlace(self._result,g)
+        self._undex += 1
+        return self._result
+
+    # the updated graph (None if no graph was added)
+    def getResult(self):
+        return self._result
+
+    # the number of graphs added
+    def getCount(self):
+        return self._undex
+
     def apply(self,*args,**kwargs):
         
         if(kwargs.has_key("dc")):
             dc = kwargs["dc"]
         else:
             dc = True
-        
-        nargs = len(args)
-        
-        # Start from left
-        # while I have more items to the right
-            # Get next item
-            # call UnionOp.apply.(leftItem, rightItem)
-        # apply recursively
+        return self.applyAll(args,dc)
 
-		# recursion sink: 0->problem, 1->return.
-        if (nargs==0):
-            return None
-        elif (nargs==1):
-            if(dc):
-                return copy.deepcopy(args[0])
-            else:
-                res = args[0]
-                return res
-        else:
-            # Apply on the first two
-            self._undex += 1
-            # from undex-1 arguments unified this is the 1
-            # so the learning factor is assigned relatively
-            lF = (self._undex/(self._undex+1))
-            # replace the learning factor with the new one
-            self._Op.setLF(lF)
-            # apply arguments one by one
-            z = self._Op.apply(args[0],args[1],dc=dc)
-            q = list(args[2:])
-            # with the same method on the rest of the elements
-            return self.apply(*([z] + q),dc=False)
+    # applies update to an iterable (or generator) of graphs,
+    # consuming them one at a time (None if there are none)
+    def applyAll(self,graphs,dc=True):
+        self.reset()
+        for g in graphs:
+            self.add(g,dc)
+        return self._result
 
-# Implements a way parallel way for 
-# applying an Nary operator
+# Implements a parallel way for
+# applying an Nary operator:
+# the arguments are reduced as a balanced tree, pairing
+# neighbours level by level ((0,1),(2,3),... with an odd
+# last argument carried to the next level), so the result
+# does not depend on the number of workers.
+# Aligned blocks of 2^k arguments are subtrees of the reduction:
+# blocks are reduced on a fixed-size process pool, the graphs
+# shipped as compact payloads (see packGraph), and the few
+# block results are reduced locally.
 class ParallelNary(NaryOperator):
     
     # initializes a parallel Nary
     # operator for operator op
-    # and number of threads = 0
+    # on nthreads worker processes
+    # (0: one per cpu, 1: no pool).
+    # arguments with less than minPoolEdges edges
+    # in total are reduced locally.
     # parallel Nary can correctly
     # be applied when operator
     # is distributable
-    def __init__(self,op, nthreads = 0):
+    def __init__(self,op, nthreads = 0, minPoolEdges = 100000):
         self._Op = op
         q = int(nthreads)
-        self._nthreads = q
         if(q<0):
             raise ValueError('Nthreads must be positive!')
+        if(q==0):
+            q = multiprocessing.cpu_count()
+        self._nthreads = q
+        self._minPoolEdges = minPoolEdges
+        # blocks per worker (for balancing uneven blocks)
+        self._tasksPerWorker = 4
         try:
             if(not op._distributable):
                 warnings.warn("Given operator is not defined as distributable.\nResult may be false.", UserWarning)
         except AttributeError:
-				warnings.warn("Given operator is not defined as distributable.\nResult may be false.", UserWarning)        
+            warnings.warn("Given operator is not defined as distributable.\nResult may be false.", UserWarning)
 
     # applies an Nary Parallel operator
     def apply(self,*args,**kwargs):
-		
+        
         # a checks for a deepcopy argument
-        # default operation is deepcopy
+        # default operation is a (copy-on-write) copy
         # inorder to not corrupt the original 
-        # mutable input arguments		
+        # mutable input arguments
         if(kwargs.has_key("dc")):
             dc = kwargs["dc"]
         else:
             dc = True
         nargs = len(args)
-        print nargs
 
-		# recursion sink
         if (nargs==0):
             return None
         elif (nargs==1):
@@ -362,80 +415,65 @@ class ParallelNary(NaryOperator):
                 return copy.deepcopy(args[0])
             else:
                 return args[0]
-        else:
-            l = []
-            # arrange tuples
-            for count, thing in enumerate(args):
-                if((count%2)==1):
-                    l.append((prev,thing))
-                else:
-                    prev = thing
-            
-            # create a mutable object to pass to threads
-            fargs = {}
-
-            lock = threading.Lock()
-            threads = []
-            # threads on tuples of input
-
-            # positive thrads means a number
-
-            # positive threads mean's run at most n threads
-            i=0
-			# for positive threads
-            if(self._nthreads>0):
-                for (a,b) in l:
-                    thr = threading.Thread(target=self._executor, args=(self._Op.apply,a,b,dc,fargs,str(i),lock))
-                    threads.append(thr) 
-                    i+=1
-					#group - start - join every time we reach n threads
-                    if(i%nthreads==0):
-                        # start threads
-                        [t.start() for t in threads]
-            
-                        # wait for threads to finish
-                        [t.join() for t in threads]
-                        threads = [] 
-
-                # if some threads have not been executed
-                # run 'em!
-                if(i%nthreads!=0):
-                        [t.start() for t in threads]
-                        # wait for threads to finish
-                        [t.join() for t in threads]
-
-            # infinity threads means no boundary
-            elif(self._nthreads==0):
-                for (a,b) in l:
-                    thr = threading.Thread(target=self._single_executor, args=(self._Op.apply,a,b,dc,fargs,str(i),lock))
-                    threads.append(thr) 
-                    i+=1
-                [t.start() for t in threads]
-                # wait for threads to finish
-                [t.join() for t in threads]
-            
 
-            # if the argument length is odd append the last param
-            # not added in touples
-            # recursive call for the rest
-            #
-            if((nargs%2)!=0):
-                fargs[str(len(l))]=args[-1]
-                return self.apply(*(fargs.values()),dc = False)
-            else:
-                return self.apply(*(fargs.values()), dc = False)
-            
-            
-    # a single executor for parallel Nary
-    def _single_executor(self,f,a,b,dc,fargs,dst,lock):
-        ## calculate operators apply - given by f - on a,b
-        r = f(a,b,dc=dc)
-        ## lock
-        lock.acquire()
-        ## add to results
-        fargs[dst] = r
-        ## unlock
-        lock.release()
+        # the smallest block size with at most
+        # tasksPerWorker blocks per worker
+        block = 1
+        while (-(-nargs // block) > self._nthreads * self._tasksPerWorker):
+            block *= 2
+        if (self._nthreads <= 1 or block == 1 or nargs // block < 2
+                or sum(g.size() for g in args) < self._minPoolEdges):
+            return reduceTree(self._Op, list(args), dc)
+
+        tasks = [(self._Op, [packGraph(g) for g in args[i:i + block]]) for i in range(0, nargs, block)]
+        pool = multiprocessing.Pool(min(self._nthreads, len(tasks)))
+        try:
+            # map keeps the order of the blocks
+            res = pool.map(_reduceBlock, tasks, 1)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        vocabulary = args[0].getVocabulary()
+        # block results are new graphs: no copies needed
+        return reduceTree(self._Op, [unpackGraph(p, vocabulary) for p in res], False)
+
+# reduces graphs with a binary operator as a balanced tree,
+# level by level in argument order (see ParallelNary)
+# dc applies to the first level: later levels reduce results
+def reduceTree(op,graphs,dc=True):
+    while (len(graphs) > 1):
+        level = [op.apply(graphs[i], graphs[i + 1], dc=dc) for i in range(0, len(graphs) - 1, 2)]
+        if (len(graphs) % 2 == 1):
+            # an odd argument is carried to the next level
+            level.append(copyResult(graphs[-1], dc))
+        graphs = level
+        dc = False
+    return graphs[0]
+
+# a compact, vocabulary independent payload of a graph
+# (no data or n-gram list): the class, n, Dwin, min and
+# max weights and it's nodes and edges (see exportPayload)
+def packGraph(g):
+    return (g.__class__, g._n, g._Dwin, g._minW, g._maxW, g.exportPayload())
+
+# a graph from a payload of packGraph, with
+# n-grams interned in vocabulary (shared if None)
+def unpackGraph(p,vocabulary=None):
+    cls, n, Dwin, minW, maxW, payload = p
+    g = cls(n, Dwin, vocabulary=vocabulary)
+    g.importPayload(payload)
+    g._minW = minW
+    g._maxW = maxW
+    return g
+
+# reduces a block of graph payloads with an operator
+# (run by the pool of ParallelNary)
+def _reduceBlock(task):
+    op, payloads = task
+    return packGraph(reduceTree(op, [unpackGraph(p) for p in payloads], False))
         
 # Implements an N to R Nary 
 # operator (serial execution of
@@ -453,7 +491,7 @@ class LtoRNary(NaryOperator):
     def apply(self, *args,**kwargs):
         
         # a checks for a deepcopy argument
-        # default operation is deepcopy
+        # default operation is a (copy-on-write) copy
         # inorder to not corrupt the original 
         # mutable input arguments
         if(kwargs.has_key("dc")):
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""
+   SimilarityCache.py
+
+   Created on Oct 17, 2026, 10:00 AM
+"""
+
+"""
+ Memoization of similarity calculations.
+
+ Results are keyed by the measure and the content of the
+ compared graphs (their fingerprints, see
+ DocumentNGramGraph.fingerprint, and node counts), so a
+ pair compared again hits the cache even if the graphs were
+ rebuilt, copied or loaded, while a graph whose edges
+ changed misses it. Least recently used results are evicted
+ when the cache is full.
+"""
+import threading
+from collections import OrderedDict
+from NGramGraphSimilarity import Similarity
+
+
+class SimilarityCache(object):
+
+    # a cache of at most maxSize results
+    def __init__(self, maxSize=1024):
+        if maxSize < 1:
+            raise ValueError('Cache size must be positive!')
+        self._maxSize = int(maxSize)
+        self._items = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    # returns the result of key (marking it as recently used) or default
+    def get(self, key, default=None):
+        self._lock.acquire()
+        try:
+            value = self._items.pop(key, self)
+            if value is self:
+                self._misses += 1
+                return default
+            self._items[key] = value
+            self._hits += 1
+            return value
+        finally:
+            self._lock.release()
+
+    # stores the result of key, evicting the least recently used results
+    def put(self, key, value):
+        self._lock.acquire()
+        try:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self._maxSize:
+                self._items.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    # drops all results (the counters are kept)
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._items.clear()
+        finally:
+            self._lock.release()
+
+    def getHits(self):
+        return self._hits
+
+    def getMisses(self):
+        return self._misses
+
+    def getMaxSize(self):
+        return self._maxSize
+
+    # returns the hits, misses, size and maximum size on a dictionary
+    def getStats(self):
+        return {"hits" : self._hits, "misses" : self._misses,
+                "size" : len(self._items), "maxSize" : self._maxSize}
+
+
+# a similarity that memoizes the results of another one
+class CachedSimilarity(Similarity):
+
+    # caches the results of similarity on cache
+    # (a new cache of maxSize results if None)
+    def __init__(self, similarity, cache=None, maxSize=1024):
+        Similarity.__init__(self, similarity._commutative, similarity._distributional)
+        self._similarity = similarity
+        if cache is None:
+            cache = SimilarityCache(maxSize)
+        self._cache = cache
+
+    def getCache(self):
+        return self._cache
+
+    # the cache key of a pair of graphs for a kind of result
+    def _key(self, kind, ngg1, ngg2):
+        g1 = (ngg1.fingerprint(), ngg1.number_of_nodes())
+        g2 = (ngg2.fingerprint(), ngg2.number_of_nodes())
+        if self._commutative and g2 < g1:
+            g1, g2 = g2, g1
+        return (self._similarity.__class__.__name__, kind, g1, g2)
+
+    def getSimilarityDouble(self, ngg1, ngg2):
+        key = self._key("double", ngg1, ngg2)
+        res = self._cache.get(key)
+        if res is None:
+            res = self._similarity.getSimilarityDouble(ngg1, ngg2)
+            self._cache.put(key, res)
+        return res
+
+    def getSimilarityComponents(self, ngg1, ngg2):
+        key = self._key("components", ngg1, ngg2)
+        res = self._cache.get(key)
+        if res is None:
+            res = self._similarity.getSimilarityComponents(ngg1, ngg2)
+            self._cache.put(key, dict(res))
+        # callers may modify the returned dictionary
+        return dict(res)
+
+    def getSimilarityFromComponents(self, Dict):
+        return self._similarity.getSimilarityFromComponents(Dict)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+"""
+   SimilarityMatrix.py
+
+   Created on Oct 17, 2026, 2:00 PM
+"""
+
+"""
+ Batch similarity calculation between sets of
+ ngram graphs: all-pairs and one-against-many
+ matrices of SS, VS and NVS, computed in tiles
+ over a pool of worker processes.
+
+ Graphs are shipped to the workers once (as sorted
+ edge key and weight arrays) and every tile is
+ computed with getSimilarityComponentsFromArrays.
+"""
+import multiprocessing
+import numpy as np
+from NGramGraphSimilarity import getSimilarityComponentsFromArrays, getSortedEdgeArrays
+
+_MEASURES = ("SS", "VS", "NVS")
+
+# the (rows, columns) graph arrays of the running computation
+# set on every worker process by _initWorker
+_tileData = None
+
+def _initWorker(data):
+    global _tileData
+    _tileData = data
+
+# returns the (node count, sorted keys, sorted weights)
+# of each graph with keys in the given vocabulary
+def _graphArrays(graphs,vocabulary):
+    arrays = []
+    for g in graphs:
+        k, w = getSortedEdgeArrays(g,vocabulary)
+        arrays.append((g.number_of_edges(), k, w))
+    return arrays
+
+# computes a tile of the similarity matrix
+# tile = (i0, i1, j0, j1, measures)
+def _computeTile(tile):
+    i0, i1, j0, j1, measures = tile
+    rows, cols, symmetric = _tileData
+    if cols is None:
+        cols = rows
+    blocks = dict((m, np.zeros((i1 - i0, j1 - j0))) for m in measures)
+    for i in range(i0, i1):
+        n1, k1, w1 = rows[i]
+        for j in range(j0, j1):
+            # the lower triangle of a diagonal tile
+            # is mirrored from the upper one
+            if symmetric and j < i:
+                continue
+            n2, k2, w2 = cols[j]
+            c = getSimilarityComponentsFromArrays(n1, k1, w1, n2, k2, w2)
+            for m in measures:
+                blocks[m][i - i0, j - j0] = c[m]
+    return (i0, j0, blocks)
+
+# checks and normalizes the requested measures
+def _measureList(measures):
+    if isinstance(measures, str):
+        measures = [measures]
+    measures = tuple(measures)
+    for m in measures:
+        if m not in _MEASURES:
+            raise ValueError('Unknown similarity measure: ' + str(m))
+    return measures
+
+"""
+ Yields the similarity matrix of graphs against others
+ (or of graphs against themselves if others is None)
+ in blocks of at most tile x tile graphs, as tuples
+ (row offset, column offset, {measure: block}).
+
+ Against themselves only the blocks on and above the
+ diagonal are produced (similarities are symmetric)
+ and the diagonal blocks are filled above their diagonal.
+
+ nworkers is the number of worker processes (None for
+ one per cpu, 1 to compute in the calling process).
+ Blocks are yielded as they are completed.
+"""
+def iterSimilarityBlocks(graphs, others=None, measures=_MEASURES, tile=256, nworkers=None):
+    global _tileData
+    measures = _measureList(measures)
+    tile = int(tile)
+    if tile < 1:
+        raise ValueError('Tile size must be positive!')
+    graphs = list(graphs)
+    if not graphs:
+        return
+    vocabulary = graphs[0].getVocabulary()
+    rows = _graphArrays(graphs, vocabulary)
+    symmetric = others is None
+    if symmetric:
+        cols = None
+        ncols = len(rows)
+    else:
+        cols = _graphArrays(others, vocabulary)
+        ncols = len(cols)
+
+    tiles = []
+    for i0 in range(0, len(rows), tile):
+        for j0 in range(0, ncols, tile):
+            if symmetric and j0 < i0:
+                continue
+            tiles.append((i0, min(i0 + tile, len(rows)), j0, min(j0 + tile, ncols), measures))
+
+    if nworkers is None:
+        nworkers = multiprocessing.cpu_count()
+    nworkers = min(int(nworkers), len(tiles))
+    if nworkers < 0:
+        raise ValueError('Number of workers must be positive!')
+
+    data = (rows, cols, symmetric)
+    if nworkers <= 1:
+        previous = _tileData
+        _initWorker(data)
+        try:
+            for t in tiles:
+                yield _computeTile(t)
+        finally:
+            _tileData = previous
+    else:
+        pool = multiprocessing.Pool(nworkers, _initWorker, (data,))
+        try:
+            for r in pool.imap_unordered(_computeTile, tiles):
+                yield r
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+# returns the dense similarity matrix of graphs against others
+# (or against themselves if others is None) as a numpy array,
+# or as a dictionary of arrays if more than one measure is given
+def getSimilarityMatrix(graphs, others=None, measures="NVS", tile=256, nworkers=None):
+    single = isinstance(measures, str)
+    measures = _measureList(measures)
+    graphs = list(graphs)
+    if others is not None:
+        others = list(others)
+        shape = (len(graphs), len(others))
+    else:
+        shape = (len(graphs), len(graphs))
+    res = dict((m, np.zeros(shape)) for m in measures)
+    for (i0, j0, blocks) in iterSimilarityBlocks(graphs, others, measures, tile, nworkers):
+        for m in measures:
+            b = blocks[m]
+            res[m][i0:i0 + b.shape[0], j0:j0 + b.shape[1]] = b
+    if others is None:
+        # mirror the upper triangle
+        for m in measures:
+            M = res[m]
+            lower = np.tril_indices(shape[0], -1)
+            M[lower] = M.T[lower]
+    if single:
+        return res[measures[0]]
+    return res
+
+# returns the similarities of a query graph against
+# many graphs as a numpy array (or a dictionary
+# of arrays if more than one measure is given)
+def getSimilarityToMany(query, graphs, measures="NVS", tile=256, nworkers=None):
+    res = getSimilarityMatrix([query], graphs, measures, tile, nworkers)
+    if isinstance(res, dict):
+        return dict((m, v[0]) for (m, v) in res.items())
+    return res[0]
@@ -1,2 +1,6 @@
 from NGramGraphSimilarity import *
 from Operator import *
+from SimilarityMatrix import *
+from EdgeIndex import *
+from GraphSketch import *
+from SimilarityCache import *
\ No newline at end of file
@@ -7,10 +7,14 @@
  *
 """
 
-import networkx as nx
-import pygraphviz as pgv
-import matplotlib.pyplot as plt
-from networkx.drawing.nx_agraph import graphviz_layout
+import numpy as np
+import copy
+from NGramVocabulary import getSharedVocabulary
+from WindowKernel import UniformKernel
+from RollingHash import gramIndex, rollingHashes
+import Instrumentation
+from Instrumentation import clock
+from EdgeStore import EdgeStore, OverlayEdgeStore, packEdge, unpackEdge, packEdges, unpackEdges, hashEdges, sumHashes, mixHashes
 
 """
  *  Represents the graph of a document, with vertices n-grams of the document and edges the number
@@ -19,7 +23,7 @@ from networkx.drawing.nx_agraph import graphviz_layout
  * @author ysig
 """
 
-class DocumentNGramGraph:
+class DocumentNGramGraph(object):
     #n for the n-graph
     _n = 3 
     #consider not having characters but lists of objects
@@ -28,30 +32,53 @@ class DocumentNGramGraph:
     _dSize = 0
     #stores the ngram
     _ngram = []
-    #store the ngram graph
-    _Graph = None
     #window for graph construction
     _Dwin = 2
     # a printing flag determining if the printing result will be stored on document or
     # be displayed on string
     _GPrintVerbose = True
-    # cache of edges (set vs. list)
-    _edges = set()
+    # edges are directed from an n-gram to the n-grams
+    # preceding it in the window
+    _directed = True
+    # build graphs with array operations by default
+    _batched = True
+    # the weighting of the window (see WindowKernel)
+    _kernel = UniformKernel()
+
+    # node ids (array) of a graph loaded from a file
+    # until it's node set is created (see _nodeSet)
+    _nodeIds = None
+
+    # the content fingerprint of the graph or None
+    # until it is needed (see fingerprint)
+    _fingerprint = None
 
     # the graph stores it's maximum and minimum weigh
     _maxW = 0
     _minW = float("inf")
     # initialization
-    def __init__(self, n=3, Dwin=2, Data = [], GPrintVerbose = True):
+    # graphs of data already built are taken from
+    # cache if given (see GraphBuildCache)
+    # kernel replaces the window weighting of the class
+    def __init__(self, n=3, Dwin=2, Data = [], GPrintVerbose = True, vocabulary = None, cache = None, kernel = None):
         # data must be "listable"
         self._Dwin = abs(int(Dwin))
         self._n = abs(int(n))
+        # n-grams are interned to integer ids
+        # graphs sharing a vocabulary compare edges as integers
+        if vocabulary is None:
+            vocabulary = getSharedVocabulary()
+        self._vocab = vocabulary
+        if kernel is not None:
+            self._kernel = kernel
+        self.clear()
         self.setData(Data)
         self._GPrintVerbose = GPrintVerbose
         if(not (self._Data == [])):
-            _maxW = 0
-            _minW = float("inf")
-            self.buildGraph()
+            if cache is None:
+                self.buildGraph()
+            else:
+                cache.buildGraph(self)
             
     # we will now define @method buildGraph
     # which takes a data input
@@ -59,106 +86,491 @@ class DocumentNGramGraph:
     # and creates ngrams based on a given window
     # !notice: at this developmental stage the weighting method
     # may not be correct
-    def buildGraph(self,verbose = False, d=[]):
+    # batched builds (the default) derive the graph with numpy
+    # array operations and produce the same graph as the
+    # n-gram by n-gram build
+    # returns the graph itself (the networkx graph it returned
+    # before the array-backed edges is now given by getGraph)
+    def buildGraph(self,verbose = False, d=[], batched = None):
         # set Data @class_var
         self.setData(d)
-        Data = self._Data
-        
-        # build ngram
-        ng = self.build_ngram()
+        if batched is None:
+            batched = self._batched
+        sink = Instrumentation._sink
+        if sink is not None:
+            start = clock()
+        if batched:
+            self.buildGraphBatched()
+        else:
+            self.buildGraphIncremental()
+        if sink is not None:
+            self._recordBuild(sink, clock() - start)
+        # print graph (optional)
+        if verbose:
+            self.GraphDraw(self._GPrintVerbose)
+        return self
+
+    # reports a build taking seconds to an instrumentation sink
+    # (see Instrumentation): every (n-gram, neighbour) pair of the
+    # windows either adds an edge or updates the weight of one
+    def _recordBuild(self, sink, seconds):
+        s = max(self._dSize - self._n + 1, 0)
+        kernel = self.windowKernel(s)
+        pairs = 0
+        if kernel is not None:
+            pairs = int(np.maximum(s - kernel[0], 0).sum())
+        edges = self.size()
+        sink.count('build.graphs')
+        sink.count('build.ngrams', s)
+        sink.count('build.edgesAdded', edges)
+        sink.count('build.edgesUpdated', pairs - edges)
+        sink.record('build.seconds', seconds)
+        sink.record('build.edges', edges)
+
+    # builds the graph n-gram by n-gram
+    def buildGraphIncremental(self):
+        sink = Instrumentation._sink
+        if sink is not None:
+            start = clock()
+        # the interned ids of the n-grams, in order
+        # (the n-gram list is built lazily, see getngram)
+        self._ngram = None
+        ng = self.gramIds().tolist()
         s = len(ng)
-    
-        win = self._Dwin
-        
+
         #init graph
-        # TODO: add clear function
-        self._Graph = nx.DiGraph()
-        self._edges = set()
-        
-        o = min(self._Dwin,s)
-        if(o>=1):
-            window = [ng[0]]
-            # append the first full window
-            # while adding the needed edges
-            for gram in ng[1:o + 1]:
-                for w in window:
-                    self.addEdgeInc(gram,w)
-                window.append(gram)
-                
-            # with full window span till
-            # the end.
-            for gram in ng[o + 1:]:
-                for w in window:
-                    self.addEdgeInc(gram,w)
-                window.pop(0)
-                window.append(gram)
-                
-            # print graph (optional)
-            if verbose:
-                self.GraphDraw(self._GPrintVerbose)
-        return self._Graph
-       
-    
+        self.clear()
+        if sink is not None:
+            sink.record('build.ngrams.seconds', clock() - start)
+            start = clock()
+
+        kernel = self.windowKernel(s)
+        if kernel is None:
+            return self
+        pairs = zip(kernel[0].tolist(), kernel[1].tolist())
+        # in the order of windowPairs
+        for p in range(s):
+            for (d, w) in pairs:
+                if p + d < s:
+                    # edges point from the later n-gram to the earlier
+                    self.addEdgeIdsInc(ng[p + d], ng[p], w)
+        if sink is not None:
+            sink.record('build.edges.seconds', clock() - start)
+        return self
+
+    # the distances (in n-grams) at which an n-gram is connected
+    # to the n-grams following it, with the weight added per distance
+    # (given the number of n-grams s), or None for no edges.
+    # they come from the graph's kernel (see WindowKernel)
+    def windowKernel(self, s):
+        if s < 2:
+            return None
+        return self._kernel.table(self._Dwin)
+
+    # builds the graph from an integer encoding of the data:
+    # n-gram ids come from a strided view over the encoded
+    # symbols and the (n-gram, neighbour, distance) pairs of
+    # every window are emitted and summed at once
+    def buildGraphBatched(self):
+        self.clear()
+        # the n-gram list is built lazily (see getngram)
+        self._ngram = None
+        sink = Instrumentation._sink
+        if sink is not None:
+            start = clock()
+        gid = self.gramIds()
+        s = len(gid)
+        if sink is not None:
+            sink.record('build.ngrams.seconds', clock() - start)
+            start = clock()
+        kernel = self.windowKernel(s)
+        if s < 2 or kernel is None:
+            return self
+        allKeys, pw = self.windowPairs(gid, kernel)
+        if len(allKeys) == 0:
+            return self
+
+        keys, weights, firstW = self._sumPairs(allKeys, pw)
+        # the keys are sorted: the key index and the node
+        # set are only built if the graph is modified
+        self._store = EdgeStore.fromSortedArrays(keys, weights)
+        a, b = unpackEdges(keys)
+        self._nodes = None
+        self._nodeIds = np.union1d(a, b)
+        # as if the edges were set one occurrence at a time
+        self._maxW = max(self._maxW, float(np.max(weights)))
+        self._minW = min(self._minW, float(np.min(firstW)))
+        if sink is not None:
+            sink.record('build.edges.seconds', clock() - start)
+        return self
+
+    # returns the distinct keys of (repeated) edge keys, their summed
+    # weights (summed in order) and the weights of their first occurrences
+    def _sumPairs(self, allKeys, pw):
+        # np.unique with return_index needs a (slower) stable sort:
+        # the first occurrences are the least positions of every key instead
+        perm = allKeys.argsort()
+        sortedKeys = allKeys[perm]
+        starts = np.empty(len(sortedKeys), dtype=bool)
+        starts[0] = True
+        np.not_equal(sortedKeys[1:], sortedKeys[:-1], out=starts[1:])
+        keys = sortedKeys[starts]
+        inverse = np.empty(len(perm), dtype=np.int64)
+        inverse[perm] = np.cumsum(starts) - 1
+        firstSeen = np.minimum.reduceat(perm, np.flatnonzero(starts))
+        return keys, np.bincount(inverse, weights=pw, minlength=len(keys)), pw[firstSeen]
+
+    # the edge keys and weights of the (n-gram, neighbour) pairs of the
+    # windows over the n-gram ids gid, given the window kernel, for the
+    # pairs whose later n-gram is at position start or after.
+    # pairs are in n-gram order, so that duplicate edges are summed
+    # in the same order as the incremental build
+    def windowPairs(self, gid, kernel, start=0):
+        distances, dweights = kernel
+        distances = np.asarray(distances, dtype=np.int64)
+        dweights = np.asarray(dweights, dtype=np.float64)
+        s = len(gid)
+        first = np.arange(max(start - int(distances.max()), 0), s, dtype=np.int64)[:, None]
+        second = first + distances[None, :]
+        valid = (second < s) & (second >= start)
+        pw = np.broadcast_to(dweights[None, :], valid.shape)[valid]
+        first = np.broadcast_to(first, valid.shape)[valid]
+        second = second[valid]
+        # directed edges point from the later n-gram to the earlier
+        return packEdges(gid[second], gid[first], self._directed), pw
+
+    # builds the graph from a file object or an iterable of text chunks,
+    # reading chunkSize symbols at a time from files. Only the last n-1
+    # symbols and the n-grams of the last window are kept between chunks,
+    # so memory does not grow with the input. The data (and so the n-gram
+    # list, see getngram) is only kept if keepData is True.
+    # the graph is the one buildGraph builds from the whole input
+    # (up to the order weights of the same edge are summed in)
+    # if a sketch (a HeavyHitterSketch, see EdgeSketch) is given, edge
+    # weights are summed in it instead and the graph only gets the
+    # edges it keeps, with their estimated weights, in fixed memory:
+    # n-grams are identified by their hashes (see gramHashIds) and only
+    # the n-grams of the kept edges are held and, at the end, interned
+    def buildGraphStream(self, source, chunkSize=1 << 20, keepData=False, sketch=None):
+        self.clear()
+        self._Data = []
+        self._dSize = 0
+        self._ngram = None
+        kernel = self.windowKernel(2)
+        n = self._n
+        if hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunkSize), '')
+        elif isinstance(source, basestring):
+            chunks = [source]
+        else:
+            chunks = source
+
+        sink = Instrumentation._sink
+        if sink is not None:
+            start = clock()
+        carry = None
+        # hash id -> n-gram string, for the n-grams of the edges a sketch keeps
+        grams = {}
+        for chunk in chunks:
+            # text is kept as strings (see encodeData)
+            if not isinstance(chunk, basestring):
+                chunk = list(chunk)
+            self._dSize += len(chunk)
+            if keepData:
+                self._Data.extend(chunk)
+            if kernel is None or n == 0:
+                continue
+            if carry is None:
+                data = chunk
+            else:
+                if isinstance(carry, basestring) != isinstance(chunk, basestring):
+                    carry = list(carry)
+                    chunk = list(chunk)
+                data = carry + chunk
+            if len(data) >= n:
+                # the n-grams of the carry were added with earlier chunks
+                first = max(len(data) - len(chunk) - n + 1, 0)
+                if sketch is None:
+                    gid = self.gramIds(data)
+                else:
+                    gid = self.gramHashIds(data)
+                allKeys, pw = self.windowPairs(gid, kernel, first)
+                if sink is not None:
+                    sink.count('build.ngrams', len(gid) - first)
+                    sink.count('build.edgesUpdated', len(allKeys))
+                if sketch is None:
+                    self._addPairs(allKeys, pw)
+                elif len(allKeys):
+                    sketch.add(*self._sumPairs(allKeys, pw)[:2])
+                    grams = self._sketchGrams(sketch, grams, data, gid)
+            # the n-1 symbols of the next n-gram and the n-grams
+            # of the widest window before it
+            carry = data[-(n - 1 + int(np.max(kernel[0]))):]
+        if sketch is not None:
+            self._setSketchEdges(sketch, grams)
+        if sink is not None:
+            # pairs adding edges were counted as updates
+            sink.count('build.edgesUpdated', -self.size())
+            sink.count('build.edgesAdded', self.size())
+            sink.count('build.graphs')
+            sink.record('build.seconds', clock() - start)
+            sink.record('build.edges', self.size())
+        return self
+
+    # the 31 bit hashes of the n-grams of data (in order, see RollingHash),
+    # which identify n-grams across chunks without interning them.
+    # n-grams of equal hashes are taken as one
+    def gramHashIds(self, Data):
+        n = self._n
+        if len(Data) < n or n == 0:
+            return np.zeros(0, dtype=np.int64)
+        if isinstance(Data, basestring):
+            codes = self.encodeData(Data)
+        else:
+            # symbols are coded as in strings or by their hashes
+            codes = np.array([ord(c) if isinstance(c, basestring) and len(c) == 1 else hash(c) & 0x3fffffffffffffff
+                              for c in Data], dtype=np.int64)
+        # (mixed, so that every bit depends on every symbol)
+        return (mixHashes(rollingHashes(codes, n)) >> np.uint64(33)).astype(np.int64)
+
+    # the n-gram strings of the edges a sketch keeps, given the ones of the
+    # edges it kept before and the data and hash ids of the n-grams added
+    # to it (the n-grams of newly kept edges are n-grams of that data)
+    def _sketchGrams(self, sketch, grams, data, gid):
+        a, b = unpackEdges(sketch.heavyHitters()[0])
+        ids = np.union1d(a, b)
+        missing = np.array([i not in grams for i in ids.tolist()], dtype=bool)
+        kept = dict((i, grams[i]) for i in ids[~missing].tolist())
+        if np.any(missing):
+            distinct, pos = np.unique(gid, return_index=True)
+            n = self._n
+            for (i, p) in zip(ids[missing].tolist(), pos[np.searchsorted(distinct, ids[missing])].tolist()):
+                kept[i] = ''.join(data[p:p + n])
+        return kept
+
+    # sets the edges kept by a sketch as the graph's edges,
+    # interning their n-grams (grams maps their hash ids to them)
+    def _setSketchEdges(self, sketch, grams):
+        keys, weights = sketch.heavyHitters()
+        if len(keys) == 0:
+            return
+        a, b = unpackEdges(keys)
+        hashIds = np.union1d(a, b)
+        vids = np.array(self._vocab.internAll([grams[i] for i in hashIds.tolist()]), dtype=np.int64)
+        keys = packEdges(vids[np.searchsorted(hashIds, a)], vids[np.searchsorted(hashIds, b)], self._directed)
+        order = np.argsort(keys)
+        keys = keys[order]
+        weights = weights[order]
+        self._store = EdgeStore.fromSortedArrays(keys, weights)
+        a, b = unpackEdges(keys)
+        self._nodes = None
+        self._nodeIds = np.union1d(a, b)
+        self._maxW = max(self._maxW, float(np.max(weights)))
+        self._minW = min(self._minW, float(np.min(weights)))
+
+    # adds the weights of (possibly repeated) edge keys to the graph
+    def _addPairs(self, allKeys, pw):
+        if len(allKeys) == 0:
+            return
+        keys, weights, firstW = self._sumPairs(allKeys, pw)
+        slots = self._store.slots(keys)
+        found = slots >= 0
+        weights[found] += self._store.weights()[slots[found]]
+        newKeys = self._store.setMany(keys, weights)
+        self._addNodes(*unpackEdges(newKeys))
+        self._maxW = max(self._maxW, float(np.max(weights)))
+        if len(newKeys):
+            # as if the edges were set one occurrence at a time
+            self._minW = min(self._minW, float(np.min(firstW[~found])))
+
+    # encodes the data (the graph's data if None)
+    # as an array of integer symbol codes
+    def encodeData(self, Data=None):
+        if Data is None:
+            Data = self._Data
+        # strings are encoded by their (unicode) code points
+        if isinstance(Data, bytes):
+            return np.frombuffer(Data, dtype=np.uint8).astype(np.int64)
+        if isinstance(Data, unicode):
+            return np.frombuffer(Data.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        try:
+            arr = np.array(Data)
+            if arr.ndim != 1 or arr.dtype.kind not in 'SU':
+                raise ValueError
+            return np.unique(arr, return_inverse=True)[1].astype(np.int64)
+        except ValueError:
+            symbols = {}
+            return np.array([symbols.setdefault(c, len(symbols)) for c in Data], dtype=np.int64)
+
+    # returns the vocabulary ids of the data's n-grams (in order)
+    # without building the n-gram list (of the graph's data if None)
+    def gramIds(self, Data=None):
+        if Data is None:
+            Data = self._Data
+            size = self._dSize
+        else:
+            size = len(Data)
+        n = min(self._n, size)
+        if size == 0 or n == 0:
+            return np.zeros(0, dtype=np.int64)
+        codes = self.encodeData(Data)
+        s = size - n + 1
+        # a (s, n) view of the n-grams over the encoded data
+        st = codes.strides[0]
+        rows = np.lib.stride_tricks.as_strided(codes, shape=(s, n), strides=(st, st))
+        base = int(codes.max()) + 1
+        index = None
+        if base ** n >= 2 ** 62:
+            # n-grams are identified by their (collision checked)
+            # rolling hashes (see RollingHash)
+            index = gramIndex(codes, n)
+        if index is None:
+            if base ** n < 2 ** 62:
+                # n-grams fit in a single integer
+                ids = rows.dot(base ** np.arange(n - 1, -1, -1, dtype=np.int64))
+            else:
+                rows = np.ascontiguousarray(rows)
+                ids = rows.view(np.dtype((np.void, rows.dtype.itemsize * n))).ravel()
+            _, inverse = np.unique(ids, return_inverse=True)
+            # a position of every distinct n-gram
+            # (any occurrence will do, so return_index, which needs a slower
+            # stable sort, is not used: positions are scattered by the inverse)
+            pos = np.empty(int(inverse.max()) + 1, dtype=np.int64)
+            pos[inverse] = np.arange(len(inverse))
+        else:
+            inverse, pos = index
+        # intern only the distinct n-grams
+        vids = self._vocab.internAll([''.join(Data[i:i + n]) for i in pos.tolist()])
+        return np.array(vids, dtype=np.int64)[inverse]
+
     # add's an edge if it's non existent
     # if it is increments it's weight
     # !notice: reiweighting technique may be false 
     # at this developmental stage
     def addEdgeInc(self,a,b,w=1):
-        #A = repr(a)#str(a)
-        #B = repr(b)#str(b)
         #merging can also be done in other ways
-        #add an extra class variable
-        A = ''.join(a)
-        B = ''.join(b)
-        if (A,B) in self._edges:
-            edata = self._Graph.get_edge_data(A, B)
-            # DEBUG LINES
-            # print "updating edge between (",A,B,")"
-            # print "to weight",(edata['weight']+1)
-
-            r = edata['weight']+w
-        else:
-            # DEBUG LINES
-            # print "adding edge between (",A,B,")"
+        A = self._vocab.intern(''.join(a))
+        B = self._vocab.intern(''.join(b))
+        self.addEdgeIdsInc(A, B, w)
 
-            r = w
-        # update/add edge weight
-        self.setEdge(A, B, r)
+    # addEdgeInc on interned n-gram ids
+    def addEdgeIdsInc(self,a,b,w=1):
+        key = self.edgeKey(a, b)
+        self.setEdgeByKey(key, self._store.get(key, 0.0) + w)
 
+    # returns the interned ids of a list of n-grams
+    def internGrams(self, ng):
+        return self._vocab.internAll([''.join(g) for g in ng])
 
     # creates ngram's of window based on @param n
     def build_ngram(self,d = []):
         self.setData(d)
         Data = self._Data
-        l = Data[0:min(self._n,self._dSize)]
-        q = []
-        q.append(l[:])
-        if(self._n<self._dSize):
-            for d in Data[min(self._n,self._dSize):]:
-                l.pop(0)
-                l.append(d)
-                q.append(l[:])
+        n = min(self._n,self._dSize)
+        q = [Data[i:i + n] for i in range(max(self._dSize - n + 1, 1))]
         self._ngram = q
         return q
      
     # draws a graph using math plot lib
+    # (the plotting modules are only imported here, so
+    # building and comparing graphs never loads them)
     def GraphDraw(self, verbose = True, print_name = 'graph', lf = True, ns = 1000, wf= True):
-        pos = graphviz_layout(self._Graph)
-        # pos = sring_layout(self._Graph, scale=1)
-        # nx.draw(self._Graph,pos = pos,node_size=ns,with_labels = lf, node_color = 'm')
-        nx.draw(self._Graph, pos=graphviz_layout(self._Graph), node_size=ns, cmap=plt.cm.Blues, node_color=range(len(self._Graph)), prog='dot', with_labels = lf)
+        import networkx as nx
+        import matplotlib.pyplot as plt
+        from networkx.drawing.nx_agraph import graphviz_layout
+        G = self.to_networkx()
+        pos = graphviz_layout(G)
+        # pos = sring_layout(G, scale=1)
+        # nx.draw(G,pos = pos,node_size=ns,with_labels = lf, node_color = 'm')
+        nx.draw(G, pos=pos, node_size=ns, cmap=plt.cm.Blues, node_color=range(len(G)), prog='dot', with_labels = lf)
         if wf:
-            weight_labels = nx.get_edge_attributes(self._Graph,'weight')
-            nx.draw_networkx_edge_labels(self._Graph,pos = pos,edge_labels = weight_labels)
+            weight_labels = nx.get_edge_attributes(G,'weight')
+            nx.draw_networkx_edge_labels(G,pos = pos,edge_labels = weight_labels)
         if verbose:
             plt.show()
         else:
             # plt.savefig('g.png')
             # or to dot
-            nx.drawing.nx_pydot.write_dot(self._Graph,print_name+'.dot')
+            nx.drawing.nx_pydot.write_dot(G,print_name+'.dot')
             # !!Uknown error: the produced dot file is
             # not readable by dot/xdot.
-    
+
+    # a networkx view of the graph
+    # with n-gram strings as nodes
+    # (a new object: changes are not reflected back)
+    def to_networkx(self):
+        import networkx as nx
+        if self._directed:
+            G = nx.DiGraph()
+        else:
+            G = nx.Graph()
+        gram = self._vocab.gram
+        G.add_nodes_from(gram(i) for i in self._nodeSet())
+        G.add_weighted_edges_from((u, v, w) for (u, v, w) in self.edges(data=True))
+        return G
+
+    # a graph with the same parameters and vocabulary
+    # but without data or edges
+    def emptyCopy(self):
+        c = self.__class__.__new__(self.__class__)
+        c.__dict__.update(self.__dict__)
+        c._Data = []
+        c._dSize = 0
+        c._ngram = []
+        c.clear()
+        return c
+
+    # a copy-on-write copy of the graph: it shares the (sorted) edge
+    # arrays of the graph and stores only the edges it sets or deletes
+    # (see OverlayEdgeStore), so it is made without copying the edges.
+    # Later changes to either graph are not seen by the other.
+    def overlay(self):
+        c = self.__class__.__new__(self.__class__)
+        c.__dict__.update(self.__dict__)
+        c._store = OverlayEdgeStore.over(self._store)
+        if self._nodes is not None:
+            c._nodes = None
+            c._nodeIds = np.fromiter(self._nodes, dtype=np.int64, count=len(self._nodes))
+        sink = Instrumentation._sink
+        if sink is not None:
+            sink.count('graph.overlays')
+        return c
+
+    # True if the graph is a copy-on-write copy (see overlay)
+    def isOverlay(self):
+        return isinstance(self._store, OverlayEdgeStore)
+
+    # replaces a copy-on-write store (see overlay) with a plain one
+    # holding the merged edges, so the base arrays may be freed
+    def materialize(self):
+        if self.isOverlay():
+            self._store = self._store.materialize()
+        return self
+
+    # a copy of the graph keeping it's edges as sorted arrays only
+    # (see EdgeStore.fromSortedArrays) and it's nodes as an array:
+    # lookups are binary searches and no key index is kept,
+    # until the copy is modified. The graph is not changed.
+    def compacted(self):
+        c = self.__class__.__new__(self.__class__)
+        c.__dict__.update(self.__dict__)
+        keys, weights = self._store.sortedArrays()
+        c._store = EdgeStore.fromSortedArrays(keys.copy(), weights.copy())
+        c._nodes = None
+        if self._nodes is None:
+            c._nodeIds = self._nodeIds.copy()
+        else:
+            c._nodeIds = np.array(sorted(self._nodes), dtype=np.int64)
+        return c
+
+    # drops all nodes and edges of the graph
+    def clear(self):
+        self._store = EdgeStore()
+        self._nodes = set()
+        self._fingerprint = None
+        self._maxW = 0
+        self._minW = float("inf")
+
     ## set functions for structure's protected fields
 
     def setData(self,Data):
@@ -168,21 +580,106 @@ class DocumentNGramGraph:
     
     # sets an edges weight
     def setEdge(self,a,b,w=1):
-        self._edges.add((a, b))  # Update cache
-        self._Graph.add_edge(a, b, key='edge', weight=w)
+        self.setEdgeByKey(self.edgeKey(self._vocab.intern(a), self._vocab.intern(b)), w)
+
+    # sets an edges weight given it's key
+    def setEdgeByKey(self,key,w=1):
+        if self._fingerprint is not None:
+            old = self._store.get(key)
+            if old is not None:
+                self._updateFingerprint([key], [old], -1)
+            self._updateFingerprint([key], [w], 1)
+        if self._store.set(key, w):
+            a, b = unpackEdge(key)
+            nodes = self._nodeSet()
+            nodes.add(a)
+            nodes.add(b)
 
         self._maxW = max(self._maxW,w)
         self._minW = min(self._minW,w)
+
+    # sets the weights of an array of unique edge keys
+    def setEdgesByKeys(self,keys,weights):
+        self.mergeEdgesByKeys(keys, weights, lambda old, w: w)
+
+    # sets the weights of an array of unique edge keys to combine(old, weights),
+    # where old are their current weights (nan for new edges), looking every
+    # key up once. returns the weights set
+    def mergeEdgesByKeys(self,keys,weights,combine):
+        if len(keys) == 0:
+            return weights
+        found, old = self._store.lookupMany(keys)
+        weights = combine(old, weights)
+        if self._fingerprint is not None:
+            present = ~np.isnan(old)
+            self._updateFingerprint(np.asarray(keys)[present], old[present], -1)
+            self._updateFingerprint(keys, weights, 1)
+        newKeys = self._store.setLookedUp(keys, weights, found)
+        self._addNodes(*unpackEdges(newKeys))
+
+        self._maxW = max(self._maxW,float(np.max(weights)))
+        self._minW = min(self._minW,float(np.min(weights)))
+        return weights
 	
 	# deletes
     def delEdge(self,u,v):
-        self._edges.remove((u,v))
-        self._Graph.remove_edge(u,v)
-    
+        key = self.getEdgeKey(u, v)
+        if key is None:
+            raise KeyError((u, v))
+        self.delEdgeByKey(key)
+
+    # deletes an edge given it's key
+    def delEdgeByKey(self,key):
+        if self._fingerprint is not None and key in self._store:
+            self._updateFingerprint([key], [self._store.get(key)], -1)
+        self._store.remove(key)
+
+    # deletes the edges of an array of unique edge keys
+    # (raising a KeyError if any does not exist)
+    def delEdgesByKeys(self,keys):
+        if len(keys) == 0:
+            return
+        if self._fingerprint is not None:
+            old = self._store.getMany(keys)
+            found = ~np.isnan(old)
+            self._updateFingerprint(np.asarray(keys)[found], old[found], -1)
+        self._store.removeMany(keys)
+
+    # a content fingerprint of the graph's weighted edges: graphs with
+    # the same n-gram edges and weights (of any vocabulary) have the same
+    # fingerprint. It is computed on the first call and then kept up to
+    # date by the edge set and delete functions.
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = sumHashes(self._edgeHashes(self._store.keys(), self._store.weights()))
+        return self._fingerprint
+
+    # the content hashes of weighted edges
+    def _edgeHashes(self,keys,weights):
+        a, b = unpackEdges(keys)
+        h = hashEdges(self._vocab.gramHashes(a), self._vocab.gramHashes(b), weights, self._directed)
+        if not self._directed:
+            h = h ^ np.uint64(1)
+        return h
+
+    # adds (sign 1) or removes (sign -1) weighted edges from the fingerprint
+    def _updateFingerprint(self,keys,weights,sign):
+        h = sumHashes(self._edgeHashes(keys, weights))
+        self._fingerprint = (self._fingerprint + sign * h) % (1 << 64)
+
+    # deletes the nodes of an array of ids
+    # (which the caller knows to have no edges left)
+    def delNodesByIds(self,ids):
+        if self._nodes is None:
+            self._nodeIds = np.setdiff1d(self._nodeIds, ids)
+        else:
+            self._nodes.difference_update(np.asarray(ids).tolist())
 
 	# trims the graph by removing unreached nodes
     def deleteUnreachedNodes(self):
-        self._Graph.remove_nodes_from(nx.isolates(self._Graph))
+        a, b = unpackEdges(self._store.keys())
+        self._nodes = None
+        self._nodeIds = np.union1d(a, b)
         
     def setN(self,n):
         self._n=n
@@ -191,17 +688,183 @@ class DocumentNGramGraph:
         self._Dwin = win
     
     def size(self):
-        return self._Graph.size()
+        return len(self._store)
+
+    ## edge keys
+
+    # the key of the edge between two n-gram ids
+    def edgeKey(self,a,b):
+        if (not self._directed) and a > b:
+            return packEdge(b, a)
+        return packEdge(a, b)
+
+    # the key of the edge between two n-gram strings
+    # or None if any of them is unknown
+    def getEdgeKey(self,u,v):
+        a = self._vocab.lookup(u)
+        b = self._vocab.lookup(v)
+        if a is None or b is None:
+            return None
+        return self.edgeKey(a, b)
+
+    def hasEdgeKey(self,key):
+        return key in self._store
+
+    def hasEdge(self,u,v):
+        key = self.getEdgeKey(u, v)
+        return key is not None and key in self._store
+
+    # the weight of an edge or default if it does not exist
+    def getEdgeWeight(self,u,v,default=None):
+        key = self.getEdgeKey(u, v)
+        if key is None:
+            return default
+        return self._store.get(key, default)
+
+    def getEdgeWeightByKey(self,key,default=None):
+        return self._store.get(key, default)
+
+    # the weights of an array of edge keys (nan for missing edges)
+    def getEdgeWeightsByKeys(self,keys):
+        return self._store.getMany(keys)
+
+    # iterates over the (key, weight) pairs of the graph
+    def edgeItems(self):
+        return self._store.items()
+
+    # iterates over the edges as n-gram string tuples
+    def edges(self,data=False):
+        gram = self._vocab.gram
+        for (key, w) in self._store.items():
+            a, b = unpackEdge(key)
+            if data:
+                yield (gram(a), gram(b), w)
+            else:
+                yield (gram(a), gram(b))
+
+    # returns the edge keys and weights as arrays
+    # with keys expressed in the given vocabulary
+    # (edges with n-grams unknown to it get key -1,
+    # unless intern is set)
+    def edgeArrays(self,vocabulary=None,intern=False):
+        keys = self._store.keys()
+        weights = self._store.weights()
+        if vocabulary is None or vocabulary is self._vocab:
+            return keys, weights
+        a, b = unpackEdges(keys)
+        ids = {}
+        for i in set(a.tolist()) | set(b.tolist()):
+            if intern:
+                j = vocabulary.intern(self._vocab.gram(i))
+            else:
+                j = vocabulary.lookup(self._vocab.gram(i))
+            ids[i] = -1 if j is None else j
+        a = np.array([ids[i] for i in a.tolist()], dtype=np.int64)
+        b = np.array([ids[i] for i in b.tolist()], dtype=np.int64)
+        keys = packEdges(a, b, self._directed)
+        keys[(a < 0) | (b < 0)] = -1
+        return keys, weights
+
+    ## binary files (see NGramGraphFile)
+
+    # saves the graph to a binary file
+    def save(self, path):
+        from NGramGraphFile import saveGraph
+        saveGraph(self, path)
+
+    # loads a graph saved with save, memory-mapping
+    # it's arrays unless mmap is False
+    @classmethod
+    def load(cls, path, mmap=True):
+        from NGramGraphFile import loadGraph
+        g = loadGraph(path, mmap)
+        if not isinstance(g, cls):
+            raise TypeError('%s is not a %s file' % (path, cls.__name__))
+        return g
+
+    ## pickling
+    # the vocabulary is shared and not copied
+    # between copies of a graph, while pickled graphs
+    # carry their n-gram strings and are interned
+    # again on load
+
+    def __deepcopy__(self, memo):
+        sink = Instrumentation._sink
+        if sink is not None:
+            start = clock()
+        c = self.__class__.__new__(self.__class__)
+        memo[id(self)] = c
+        for (k, v) in self.__dict__.items():
+            c.__dict__[k] = copy.deepcopy(v, memo)
+        if sink is not None:
+            sink.count('graph.deepcopies')
+            sink.record('graph.deepcopy.seconds', clock() - start)
+            sink.record('graph.deepcopy.edges', self.size())
+        return c
+
+    # a vocabulary independent payload of the graph's
+    # nodes and edges: (grams, source index, target index, weights)
+    def exportPayload(self):
+        ids = np.array(sorted(self._nodeSet()), dtype=np.int64)
+        a, b = unpackEdges(self._store.keys())
+        grams = [self._vocab.gram(i) for i in ids.tolist()]
+        return (grams,
+                np.searchsorted(ids, a).astype(np.int32),
+                np.searchsorted(ids, b).astype(np.int32),
+                self._store.weights().copy())
+
+    # replaces the graph's nodes and edges with a payload
+    # created by exportPayload
+    def importPayload(self, payload):
+        grams, src, dst, weights = payload
+        ids = np.array(self._vocab.internAll(grams), dtype=np.int64)
+        self.clear()
+        keys = packEdges(ids[np.asarray(src, dtype=np.int64)], ids[np.asarray(dst, dtype=np.int64)], self._directed)
+        self._store = EdgeStore.fromArrays(keys, weights)
+        self._nodes = set(ids.tolist())
+        if len(weights):
+            self._maxW = float(np.max(weights))
+            self._minW = float(np.min(weights))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_vocab']
+        del state['_store']
+        del state['_nodes']
+        state.pop('_nodeIds', None)
+        state['_payload'] = self.exportPayload()
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        payload = state.pop('_payload')
+        maxW, minW = state['_maxW'], state['_minW']
+        self.__dict__.update(state)
+        self._vocab = getSharedVocabulary()
+        self.importPayload(payload)
+        self._maxW, self._minW = maxW, minW
     
     ## get functions for structures protected fields
     def getMin(self):
         return self._MinSize
     
     def getngram(self):
+        if self._ngram is None:
+            self.build_ngram()
         return self._ngram
     
+    # returns a networkx view of the graph
     def getGraph(self):
-        return self._Graph
+        return self.to_networkx()
+
+    def getVocabulary(self):
+        return self._vocab
+
+    def getEdgeStore(self):
+        return self._store
+
+    def isDirected(self):
+        return self._directed
     
     def maxW(self):
         return self._maxW
@@ -209,8 +872,30 @@ class DocumentNGramGraph:
     def minW(self):
         return self._minW
 
+    # adds the node ids of arrays (kept as an array
+    # if the set of nodes was not created yet)
+    def _addNodes(self,*ids):
+        if self._nodes is None:
+            self._nodeIds = np.union1d(self._nodeIds, np.concatenate(ids))
+            return
+        for a in ids:
+            self._nodes.update(a.tolist())
+
+    # the set of node ids
+    # (created on demand for graphs loaded from files)
+    def _nodeSet(self):
+        if self._nodes is None:
+            self._nodes = set(self._nodeIds.tolist())
+            self._nodeIds = None
+        return self._nodes
+
+    def number_of_nodes(self):
+        if self._nodes is None:
+            return len(self._nodeIds)
+        return len(self._nodes)
+
     def number_of_edges(self):
-        return self._Graph.number_of_nodes();
+        return self.number_of_nodes()
 #test script
 
 #1. construct a 2-gram graph of window_size = 2
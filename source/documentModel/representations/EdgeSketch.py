@@ -0,0 +1,142 @@
+"""
+  EdgeSketch.py
+
+  Created on Oct 17, 2026, 10:00 AM
+
+"""
+
+import math
+import numpy as np
+
+"""
+ Approximate edge weights in fixed memory, for graphs of huge texts.
+
+ A CountMinSketch sums weights of (int64) edge keys in depth rows of
+ width counters, each row hashing keys with it's own multiplicative
+ hash. The estimate of a key (the least of it's counters) never
+ underestimates it's weight and, with probability 1 - e^-depth,
+ overestimates it by at most e / width of the total weight added.
+
+ A HeavyHitterSketch keeps the topK edges of greatest estimated weight
+ over a Count-Min sketch: after every batch of weights, the kept edges
+ and the edges of the batch are ranked by their (refreshed) estimates
+ and the topK are kept. An edge dropped earlier keeps it's weight in
+ the sketch, so it is ranked by it's whole weight when it comes back.
+ Memory is topK edges and width * depth counters, whatever the input.
+
+ DocumentNGramGraph.buildGraphStream builds a graph of the heavy hitters
+ of it's input when given a HeavyHitterSketch. Edges are keyed there by
+ 31 bit hashes of their n-grams, so only the n-grams of the kept edges
+ are held (and interned in the graph's vocabulary), whatever the number
+ of distinct n-grams; n-grams of equal hashes are summed as one.
+"""
+
+# the multiplier and increment of the hashes of the rows of a sketch
+def _rowHashes(depth, seed):
+    rnd = np.random.RandomState(seed)
+    a = rnd.randint(0, 1 << 62, size=depth).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rnd.randint(0, 1 << 62, size=depth).astype(np.uint64)
+    return a, b
+
+
+class CountMinSketch(object):
+
+    # width is rounded up to a power of 2
+    def __init__(self, width=1 << 16, depth=4, seed=0):
+        if width < 1 or depth < 1:
+            raise ValueError('The width and depth of a sketch must be positive!')
+        self._bits = max(int(math.ceil(math.log(width, 2))), 1)
+        self._width = 1 << self._bits
+        self._depth = depth
+        self._a, self._b = _rowHashes(depth, seed)
+        self._table = np.zeros((depth, self._width))
+        self._total = 0.0
+
+    # the counter of every key in every row (a depth x len(keys) array)
+    def _columns(self, keys):
+        k = np.asarray(keys, dtype=np.int64).view(np.uint64)
+        shift = np.uint64(64 - self._bits)
+        return np.array([(k * self._a[r] + self._b[r]) >> shift for r in range(self._depth)], dtype=np.int64)
+
+    # adds the weights of an array of keys (possibly repeated)
+    def add(self, keys, weights):
+        if len(keys) == 0:
+            return
+        weights = np.asarray(weights, dtype=np.float64)
+        for (r, cols) in enumerate(self._columns(keys)):
+            self._table[r] += np.bincount(cols, weights=weights, minlength=self._width)
+        self._total += float(weights.sum())
+
+    # the estimated weights of an array of keys
+    def query(self, keys):
+        if len(keys) == 0:
+            return np.zeros(0)
+        cols = self._columns(keys)
+        return self._table[np.arange(self._depth)[:, None], cols].min(axis=0)
+
+    # the total weight added
+    def getTotal(self):
+        return self._total
+
+    def getWidth(self):
+        return self._width
+
+    def getDepth(self):
+        return self._depth
+
+    # the most any estimate exceeds the weight of it's key by,
+    # with probability getConfidence()
+    def getErrorBound(self):
+        return math.e / self._width * self._total
+
+    def getConfidence(self):
+        return 1.0 - math.exp(-self._depth)
+
+
+class HeavyHitterSketch(object):
+
+    # the sketch width defaults to 16 counters per kept edge (at least 1024)
+    def __init__(self, topK, width=None, depth=4, seed=0):
+        if topK < 1:
+            raise ValueError('At least one edge must be kept!')
+        if width is None:
+            width = max(1024, 16 * topK)
+        self._k = topK
+        self._cms = CountMinSketch(width, depth, seed)
+        # the kept (sorted) keys and their estimated weights
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._weights = np.zeros(0)
+
+    # adds the weights of an array of distinct keys
+    def add(self, keys, weights):
+        if len(keys) == 0:
+            return
+        self._cms.add(keys, weights)
+        keys = np.union1d(self._keys, keys)
+        weights = self._cms.query(keys)
+        if len(keys) > self._k:
+            top = np.argpartition(-weights, self._k - 1)[:self._k]
+            top.sort()
+            keys = keys[top]
+            weights = weights[top]
+        self._keys = keys
+        self._weights = weights
+
+    # the kept keys (sorted) and their estimated weights
+    def heavyHitters(self):
+        return self._keys, self._weights
+
+    def getTopK(self):
+        return self._k
+
+    def getSketch(self):
+        return self._cms
+
+    # the most the weight of a kept edge is overestimated by (see CountMinSketch)
+    def getErrorBound(self):
+        return self._cms.getErrorBound()
+
+    # the estimated weight mass of the edges not kept
+    # (the total weight less the estimated weight of the kept edges, at least 0)
+    def getDroppedWeight(self):
+        return max(self._cms.getTotal() - float(self._weights.sum()), 0.0)
@@ -0,0 +1,559 @@
+"""
+  EdgeStore.py
+
+  Created on Oct 17, 2026, 10:30 AM
+
+"""
+
+import numpy as np
+import itertools
+
+"""
+ A compact edge container for n-gram graphs.
+ Edges are packed integer keys (source id on the high
+ 32 bits, target id on the low 32 bits) stored next
+ to a parallel array of weights. A dictionary maps
+ every key to it's slot in the arrays.
+
+ A store can also be opened read-only over arrays of
+ sorted keys (e.g. memory-mapped from a file): lookups
+ then use binary search and the dictionary and private
+ copies of the arrays are only made if it is modified.
+"""
+
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+# packs two n-gram ids to an edge key
+def packEdge(a, b):
+    return (a << _SHIFT) | b
+
+# unpacks an edge key to the two n-gram ids
+def unpackEdge(key):
+    return (key >> _SHIFT, key & _MASK)
+
+# packs arrays of n-gram ids to an array of edge keys
+# undirected keys are stored with the smaller id first
+def packEdges(a, b, directed=True):
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    if not directed:
+        a, b = np.minimum(a, b), np.maximum(a, b)
+    return (a << _SHIFT) | b
+
+# unpacks an array of edge keys to two arrays of n-gram ids
+def unpackEdges(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    return (keys >> _SHIFT, keys & _MASK)
+
+_M1 = np.uint64(0xbf58476d1ce4e5b9)
+_M2 = np.uint64(0x94d049bb133111eb)
+GOLDEN = np.uint64(0x9e3779b97f4a7c15)
+
+# the splitmix64 finalizer over an array of uint64
+# (the one mixer of all content hashes: fingerprints, sketches, ...)
+def mixHashes(z):
+    z = z ^ (z >> np.uint64(30))
+    z = z * _M1
+    z = z ^ (z >> np.uint64(27))
+    z = z * _M2
+    return z ^ (z >> np.uint64(31))
+
+# hashes edges given the 64 bit hashes of their n-grams
+# (see NGramVocabulary.gramHashes), so that the hashes do not
+# depend on the vocabulary of the edges
+def hashEdgePairs(ha, hb, directed=True):
+    ha = np.asarray(ha, dtype=np.uint64)
+    hb = np.asarray(hb, dtype=np.uint64)
+    if not directed:
+        ha, hb = np.minimum(ha, hb), np.maximum(ha, hb)
+    return mixHashes(mixHashes(ha) ^ (hb * GOLDEN))
+
+# hashes weighted edges given the 64 bit hashes of their n-grams
+def hashEdges(ha, hb, weights, directed=True):
+    w = np.ascontiguousarray(weights, dtype=np.float64).view(np.uint64)
+    return mixHashes(hashEdgePairs(ha, hb, directed) ^ w)
+
+# the sum (modulo 2^64) of edge hashes, which can be
+# updated edge by edge as edges are set and removed
+def sumHashes(h):
+    return int(np.sum(h, dtype=np.uint64))
+
+
+class EdgeStore(object):
+
+    def __init__(self, capacity=16):
+        self.clear(capacity)
+
+    # drops all edges
+    def clear(self, capacity=16):
+        capacity = max(int(capacity), 1)
+        self._index = {}
+        self._keys = np.empty(capacity, dtype=np.int64)
+        self._weights = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+        # cache of the (keys, weights) arrays sorted by key
+        self._sorted = None
+
+    # builds a store from arrays of unique keys and their weights
+    @classmethod
+    def fromArrays(cls, keys, weights):
+        keys = np.array(keys, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float64)
+        if keys.shape != weights.shape:
+            raise ValueError('Keys and weights must have the same length!')
+        s = cls(len(keys))
+        s._keys[:len(keys)] = keys
+        s._weights[:len(keys)] = weights
+        s._size = len(keys)
+        s._index = dict((k, i) for i, k in enumerate(keys.tolist()))
+        if len(s._index) != s._size:
+            raise ValueError('Edge keys must be unique!')
+        return s
+
+    # builds a store over arrays of unique keys sorted in ascending
+    # order and their weights, without copying them
+    @classmethod
+    def fromSortedArrays(cls, keys, weights):
+        if keys.shape != weights.shape:
+            raise ValueError('Keys and weights must have the same length!')
+        s = cls.__new__(cls)
+        s._index = None
+        s._keys = keys
+        s._weights = weights
+        s._size = len(keys)
+        s._sorted = (keys, weights)
+        return s
+
+    # builds the key index (and private copies of the arrays)
+    # of a store opened over sorted arrays
+    def _ensureIndex(self):
+        if self._index is not None:
+            return
+        n = self._size
+        keys = np.empty(max(n, 1), dtype=np.int64)
+        weights = np.empty(max(n, 1), dtype=np.float64)
+        keys[:n] = self._keys[:n]
+        weights[:n] = self._weights[:n]
+        self._keys = keys
+        self._weights = weights
+        self._index = dict(zip(keys[:n].tolist(), range(n)))
+
+    # the slot of key in a store opened over sorted arrays or -1
+    def _search(self, key):
+        i = int(np.searchsorted(self._keys, key))
+        if i < self._size and self._keys[i] == key:
+            return i
+        return -1
+
+    # enlarges the arrays to hold at least n edges
+    def _grow(self, n):
+        cap = len(self._keys)
+        if n <= cap:
+            return
+        cap = max(n, 2 * cap)
+        keys = np.empty(cap, dtype=np.int64)
+        weights = np.empty(cap, dtype=np.float64)
+        keys[:self._size] = self._keys[:self._size]
+        weights[:self._size] = self._weights[:self._size]
+        self._keys = keys
+        self._weights = weights
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        if self._index is None:
+            return self._search(key) >= 0
+        return key in self._index
+
+    # returns the weight of key or default
+    def get(self, key, default=None):
+        if self._index is None:
+            slot = self._search(key)
+            if slot < 0:
+                return default
+            return float(self._weights[slot])
+        slot = self._index.get(key)
+        if slot is None:
+            return default
+        return float(self._weights[slot])
+
+    # sets the weight of key
+    # returns True if the key was not already stored
+    def set(self, key, w):
+        self._ensureIndex()
+        slot = self._index.get(key)
+        new = slot is None
+        if new:
+            slot = self._size
+            if slot == len(self._keys):
+                self._grow(slot + 1)
+            self._keys[slot] = key
+            self._index[key] = slot
+            self._size += 1
+        self._weights[slot] = w
+        self._sorted = None
+        return new
+
+    # returns the slots of an array of keys (-1 for missing keys)
+    def slots(self, keys):
+        if self._index is None:
+            keys = np.asarray(keys, dtype=np.int64)
+            if self._size == 0:
+                return np.full(len(keys), -1, dtype=np.int64)
+            slots = np.searchsorted(self._keys, keys)
+            slots[slots == self._size] = 0
+            return np.where(self._keys[slots] == keys, slots, -1).astype(np.int64)
+        keys = np.asarray(keys).tolist()
+        return np.array(map(self._index.get, keys, itertools.repeat(-1, len(keys))), dtype=np.int64)
+
+    # returns the weights of an array of keys
+    # (default for missing keys)
+    def getMany(self, keys, default=np.nan):
+        slots = self.slots(keys)
+        res = np.full(len(slots), default, dtype=np.float64)
+        found = slots >= 0
+        res[found] = self._weights[slots[found]]
+        return res
+
+    # returns the slots of an array of keys (-1 for missing keys)
+    # and their weights (nan for missing keys), for setLookedUp
+    def lookupMany(self, keys):
+        slots = self.slots(keys)
+        res = np.full(len(slots), np.nan)
+        found = slots >= 0
+        res[found] = self._weights[slots[found]]
+        return slots, res
+
+    # sets the weights of an array of unique keys looked up by
+    # lookupMany (with no changes to the store since), without
+    # looking them up again. returns the keys that were not stored
+    def setLookedUp(self, keys, weights, slots):
+        # (the index keeps the slots of the sorted arrays)
+        self._ensureIndex()
+        return self._setSlots(np.asarray(keys, dtype=np.int64), weights, slots)
+
+    # sets the weights of an array of unique keys
+    # returns the keys that were not already stored
+    def setMany(self, keys, weights):
+        self._ensureIndex()
+        keys = np.asarray(keys, dtype=np.int64)
+        return self._setSlots(keys, weights, self.slots(keys))
+
+    # setMany given the slots of the keys in the (indexed) store
+    def _setSlots(self, keys, weights, slots):
+        weights = np.asarray(weights, dtype=np.float64)
+        found = slots >= 0
+        self._weights[slots[found]] = weights[found]
+        new = ~found
+        newKeys = keys[new]
+        n = len(newKeys)
+        if n:
+            start = self._size
+            self._grow(start + n)
+            self._keys[start:start + n] = newKeys
+            self._weights[start:start + n] = weights[new]
+            self._index.update(zip(newKeys.tolist(), range(start, start + n)))
+            self._size += n
+        self._sorted = None
+        return newKeys
+
+    # removes key, raising a KeyError if it's not stored
+    # the last slot is moved to the freed one
+    # so the arrays stay dense
+    def remove(self, key):
+        self._ensureIndex()
+        slot = self._index.pop(key)
+        last = self._size - 1
+        if slot != last:
+            k = int(self._keys[last])
+            self._keys[slot] = k
+            self._weights[slot] = self._weights[last]
+            self._index[k] = slot
+        self._size = last
+        self._sorted = None
+
+    # removes an array of unique stored keys at once
+    # (raising a KeyError if any is not stored)
+    def removeMany(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        slots = self.slots(keys)
+        if np.any(slots < 0):
+            raise KeyError(int(keys[np.argmin(slots)]))
+        keep = np.ones(self._size, dtype=bool)
+        keep[slots] = False
+        if self._index is None:
+            # stays sorted (the arrays are shared, so new ones are made)
+            s = self.fromSortedArrays(self._keys[:self._size][keep], self._weights[:self._size][keep])
+            self.__dict__.update(s.__dict__)
+            return
+        # the kept keys after the first n slots are moved to the freed
+        # slots before it, so only the moved and removed keys are reindexed
+        n = self._size - len(keys)
+        holes = np.sort(slots[slots < n])
+        movers = np.flatnonzero(keep[n:]) + n
+        self._keys[holes] = self._keys[movers]
+        self._weights[holes] = self._weights[movers]
+        index = self._index
+        for k in keys.tolist():
+            del index[k]
+        index.update(zip(self._keys[holes].tolist(), holes.tolist()))
+        self._size = n
+        self._sorted = None
+
+    # views over the stored keys and weights
+    # valid until the next modification
+    def keys(self):
+        return self._keys[:self._size]
+
+    def weights(self):
+        return self._weights[:self._size]
+
+    # iterates over (key, weight) tuples
+    def items(self):
+        return zip(self._keys[:self._size].tolist(), self._weights[:self._size].tolist())
+
+    # returns the keys and weights sorted by key
+    # the result is cached until the next modification
+    def sortedArrays(self):
+        if self._sorted is None:
+            keys = self.keys()
+            order = np.argsort(keys, kind='mergesort')
+            self._sorted = (keys[order], self.weights()[order])
+        return self._sorted
+
+    # a copy of the store
+    def copy(self):
+        if self._index is None:
+            # the sorted arrays are never modified
+            return self.fromSortedArrays(self._keys, self._weights)
+        c = self.__class__.__new__(self.__class__)
+        c._index = self._index.copy()
+        c._keys = self._keys[:max(self._size, 1)].copy()
+        c._weights = self._weights[:max(self._size, 1)].copy()
+        c._size = self._size
+        c._sorted = self._sorted
+        return c
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    # only the used part of the arrays is pickled
+    # the index is rebuilt on load
+    def __getstate__(self):
+        return {'keys': self.keys().copy(), 'weights': self.weights().copy()}
+
+    def __setstate__(self, state):
+        s = self.fromArrays(state['keys'], state['weights'])
+        self.__dict__.update(s.__dict__)
+
+
+# a copy-on-write store over the (never modified) sorted arrays of
+# another store: only the edges set or removed since are stored,
+# in a delta store where removed edges have a nan weight.
+# The arrays of the edges (see keys and sortedArrays) are merged
+# when first read after a modification.
+class OverlayEdgeStore(object):
+
+    def __init__(self, keys, weights):
+        self._baseKeys = keys
+        self._baseWeights = weights
+        self._delta = EdgeStore()
+        self._size = len(keys)
+        # cache of the merged (keys, weights) sorted by key
+        self._merged = (keys, weights)
+
+    # an overlay over a store (sharing the delta of overlays
+    # copy-on-write, rather than stacking them)
+    @classmethod
+    def over(cls, store):
+        if isinstance(store, cls):
+            return store.copy()
+        keys, weights = store.sortedArrays()
+        return cls(keys, weights)
+
+    # the slots of keys in the base arrays (-1 for missing keys)
+    def _baseSlots(self, keys):
+        if len(self._baseKeys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        slots = np.searchsorted(self._baseKeys, keys)
+        slots[slots == len(self._baseKeys)] = 0
+        return np.where(self._baseKeys[slots] == keys, slots, -1).astype(np.int64)
+
+    # the slots of keys in the delta store and a mask of
+    # the keys stored in the overlay
+    def _present(self, keys):
+        slots = self._delta.slots(keys)
+        inDelta = slots >= 0
+        present = self._baseSlots(keys) >= 0
+        present[inDelta] = ~np.isnan(self._delta.weights()[slots[inDelta]])
+        return slots, present
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    # returns the weight of key or default
+    def get(self, key, default=None):
+        w = self._delta.get(key)
+        if w is None:
+            slot = self._baseSlots(np.array([key], dtype=np.int64))[0]
+            if slot < 0:
+                return default
+            return float(self._baseWeights[slot])
+        if w != w:
+            return default
+        return w
+
+    # sets the weight of key
+    # returns True if the key was not already stored
+    def set(self, key, w):
+        new = key not in self
+        self._delta.set(key, w)
+        if new:
+            self._size += 1
+        self._merged = None
+        return new
+
+    # returns the weights of an array of keys
+    # (default for missing keys)
+    def getMany(self, keys, default=np.nan):
+        res = self.lookupMany(keys)[1]
+        res[np.isnan(res)] = default
+        return res
+
+    # returns the slots of an array of keys in the delta store and a mask
+    # of the stored keys, and their weights (nan for missing keys),
+    # for setLookedUp
+    def lookupMany(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        res = np.full(len(keys), np.nan)
+        slots = self._delta.slots(keys)
+        inDelta = slots >= 0
+        res[inDelta] = self._delta.weights()[slots[inDelta]]
+        base = self._baseSlots(keys)
+        fromBase = ~inDelta & (base >= 0)
+        res[fromBase] = self._baseWeights[base[fromBase]]
+        return (slots, ~np.isnan(res)), res
+
+    # sets the weights of an array of unique keys looked up by lookupMany
+    # (with no changes since). returns the keys that were not stored
+    def setLookedUp(self, keys, weights, found):
+        keys = np.asarray(keys, dtype=np.int64)
+        slots, present = found
+        self._delta._setSlots(keys, weights, slots)
+        self._size += int((~present).sum())
+        self._merged = None
+        return keys[~present]
+
+    # sets the weights of an array of unique keys
+    # returns the keys that were not already stored
+    def setMany(self, keys, weights):
+        keys = np.asarray(keys, dtype=np.int64)
+        slots, present = self._present(keys)
+        new = ~present
+        self._delta._setSlots(keys, weights, slots)
+        self._size += int(new.sum())
+        self._merged = None
+        return keys[new]
+
+    # removes key, raising a KeyError if it's not stored
+    def remove(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._delta.set(key, np.nan)
+        self._size -= 1
+        self._merged = None
+
+    # removes an array of unique stored keys at once
+    # (raising a KeyError if any is not stored)
+    def removeMany(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        slots, present = self._present(keys)
+        if not np.all(present):
+            raise KeyError(int(keys[np.argmin(present)]))
+        self._delta._setSlots(keys, np.full(len(keys), np.nan), slots)
+        self._size -= len(keys)
+        self._merged = None
+
+    # the number of edges set or removed over the base arrays
+    def deltaSize(self):
+        return len(self._delta)
+
+    # the stored keys and weights sorted by key
+    # the result is cached until the next modification
+    def sortedArrays(self):
+        if self._merged is None:
+            dk, dw = self._delta.sortedArrays()
+            bk, bw = self._baseKeys, self._baseWeights
+            # base edges set or removed in the delta are dropped
+            if len(dk) and len(bk):
+                slots = np.searchsorted(dk, bk)
+                slots[slots == len(dk)] = 0
+                keep = dk[slots] != bk
+                bk, bw = bk[keep], bw[keep]
+            live = ~np.isnan(dw)
+            dk, dw = dk[live], dw[live]
+            # both are sorted: the delta edges are inserted in place
+            at = np.searchsorted(bk, dk)
+            self._merged = (np.insert(bk, at, dk), np.insert(bw, at, dw))
+        return self._merged
+
+    # views over the stored keys and weights (sorted by key)
+    # valid until the next modification
+    def keys(self):
+        return self.sortedArrays()[0]
+
+    def weights(self):
+        return self.sortedArrays()[1]
+
+    # iterates over (key, weight) tuples
+    def items(self):
+        keys, weights = self.sortedArrays()
+        return zip(keys.tolist(), weights.tolist())
+
+    # returns the slots of an array of keys in keys() (-1 for missing keys)
+    def slots(self, keys):
+        mk = self.keys()
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(mk) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        slots = np.searchsorted(mk, keys)
+        slots[slots == len(mk)] = 0
+        return np.where(mk[slots] == keys, slots, -1).astype(np.int64)
+
+    # a plain store of the edges (over the merged sorted arrays)
+    def materialize(self):
+        keys, weights = self.sortedArrays()
+        return EdgeStore.fromSortedArrays(keys, weights)
+
+    # a copy of the overlay (sharing the base arrays)
+    def copy(self):
+        c = self.__class__.__new__(self.__class__)
+        c._baseKeys = self._baseKeys
+        c._baseWeights = self._baseWeights
+        c._delta = self._delta.copy()
+        c._size = self._size
+        c._merged = self._merged
+        return c
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    # overlays are pickled as plain stores
+    def __reduce__(self):
+        keys, weights = self.sortedArrays()
+        return (EdgeStore.fromArrays, (keys.copy(), weights.copy()))
@@ -0,0 +1,211 @@
+"""
+  GraphBuildCache.py
+
+  Created on Oct 17, 2026, 2:00 PM
+
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+from EdgeStore import EdgeStore, unpackEdges
+from NGramGraphFile import saveGraph, loadGraph
+
+"""
+ A cache of built n-gram graphs, keyed by the digest of their
+ data, their class, n, Dwin and window kernel table.
+
+ Built graphs are kept in memory (least recently used ones are
+ evicted when the cache is full) and, if a directory is given, on
+ disk as binary graph files (see NGramGraphFile), so that processes
+ sharing the directory build every text once.
+
+ Cached edges are stored as read-only sorted arrays, which the
+ graphs given out share: a graph copies them only if it is
+ modified (see EdgeStore.fromSortedArrays), so callers can not
+ corrupt the cached entries.
+"""
+
+# returns the cache key of a graph (with it's data set)
+def buildKey(ngg):
+    data = ngg._Data
+    if all(isinstance(x, str) and len(x) == 1 for x in data):
+        # byte text is hashed as is: non ascii bytes are marked by a
+        # byte that never occurs in utf-8, since their graph is not the
+        # one of the unicode text of the same utf-8 encoding
+        data = ''.join(data)
+        try:
+            data.decode('ascii')
+        except UnicodeDecodeError:
+            data = '\xff' + data
+    elif all(isinstance(x, unicode) and len(x) == 1 for x in data):
+        data = u''.join(data).encode('utf-8')
+    else:
+        data = repr(data)
+    return (hashlib.sha1(data).hexdigest(), ngg.__class__.__name__, ngg._n, ngg._Dwin, kernelKey(ngg))
+
+# the digest of the window weighting of a graph (see WindowKernel),
+# so that graphs of other kernels never share cache entries
+def kernelKey(ngg):
+    table = ngg.windowKernel(2)
+    if table is None:
+        return None
+    distances, weights = table
+    return hashlib.sha1(distances.tobytes() + weights.tobytes()).hexdigest()
+
+
+class GraphBuildCache(object):
+
+    # a cache of at most maxSize graphs in memory
+    # and (if directory is given) unbounded on disk
+    def __init__(self, maxSize=256, directory=None):
+        if maxSize < 1:
+            raise ValueError('Cache size must be positive!')
+        self._maxSize = int(maxSize)
+        self._directory = directory
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # key -> (keys, weights, node ids, maxW, minW) of the vocabulary
+        self._items = OrderedDict()
+        self._vocab = None
+        self._hits = 0
+        self._diskHits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    # builds the graph of ngg's data into ngg, or fills it from the cache
+    # (graphs of other vocabularies than the first one cached are
+    # built as usual)
+    def buildGraph(self, ngg):
+        if self._vocab is None:
+            self._vocab = ngg.getVocabulary()
+        if ngg.getVocabulary() is not self._vocab:
+            ngg.buildGraph()
+            return ngg
+        key = buildKey(ngg)
+        entry = self._get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is None:
+                self._misses += 1
+                ngg.buildGraph()
+                entry = self._entry(ngg)
+                self._save(key, ngg)
+            else:
+                self._diskHits += 1
+            self._put(key, entry)
+        else:
+            self._hits += 1
+        self._fill(ngg, entry)
+        return ngg
+
+    def _get(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._items.pop(key, None)
+            if entry is not None:
+                self._items[key] = entry
+            return entry
+        finally:
+            self._lock.release()
+
+    def _put(self, key, entry):
+        self._lock.acquire()
+        try:
+            self._items[key] = entry
+            while len(self._items) > self._maxSize:
+                self._items.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    # the cache entry of a built graph, in read-only arrays
+    def _entry(self, ngg):
+        keys, weights = ngg.getEdgeStore().sortedArrays()
+        a, b = unpackEdges(keys)
+        entry = (np.array(keys), np.array(weights), np.union1d(a, b), ngg._maxW, ngg._minW)
+        for arr in entry[:3]:
+            arr.setflags(write=False)
+        return entry
+
+    # sets the edges of a graph to the ones of an entry
+    def _fill(self, ngg, entry):
+        keys, weights, nodes, maxW, minW = entry
+        ngg._store = EdgeStore.fromSortedArrays(keys, weights)
+        ngg._nodes = None
+        ngg._nodeIds = nodes
+        ngg._fingerprint = None
+        ngg._maxW = maxW
+        ngg._minW = minW
+        # the n-gram list is built lazily (see getngram)
+        ngg._ngram = None
+
+    def _path(self, key):
+        return os.path.join(self._directory, hashlib.sha1(repr(key)).hexdigest() + '.ngg')
+
+    # the entry of a graph saved on disk or None
+    def _load(self, key):
+        if self._directory is None:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        g = loadGraph(path)
+        # key the edges in the cache vocabulary
+        keys, weights = g.edgeArrays(self._vocab, intern=True)
+        order = np.argsort(keys, kind='mergesort')
+        keys = keys[order]
+        weights = np.array(weights[order])
+        a, b = unpackEdges(keys)
+        entry = (keys, weights, np.union1d(a, b), g._maxW, g._minW)
+        for arr in entry[:3]:
+            arr.setflags(write=False)
+        return entry
+
+    # saves a built graph on disk (written to a temporary
+    # file first, so readers never see a partial file)
+    def _save(self, key, ngg):
+        if self._directory is None:
+            return
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self._directory)
+        os.close(fd)
+        try:
+            saveGraph(ngg, tmp)
+            os.rename(tmp, self._path(key))
+        except:
+            os.remove(tmp)
+            raise
+
+    def __len__(self):
+        return len(self._items)
+
+    # drops the graphs kept in memory
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._items.clear()
+        finally:
+            self._lock.release()
+
+    def getMaxSize(self):
+        return self._maxSize
+
+    # the directory of the disk entries (None if only kept in memory)
+    def getDirectory(self):
+        return self._directory
+
+    def getHits(self):
+        return self._hits
+
+    def getDiskHits(self):
+        return self._diskHits
+
+    def getMisses(self):
+        return self._misses
+
+    # returns the memory hits, disk hits, misses and size on a dictionary
+    def getStats(self):
+        return {"hits" : self._hits, "diskHits" : self._diskHits, "misses" : self._misses,
+                "size" : len(self._items), "maxSize" : self._maxSize}
@@ -0,0 +1,196 @@
+"""
+  Instrumentation.py
+
+  Created on Oct 17, 2026, 9:00 AM
+
+"""
+
+import threading
+from timeit import default_timer as clock
+
+"""
+ Optional instrumentation of graph builds, operators,
+ comparators and the collector.
+
+ Measurements are reported to a sink: any object with a
+ count(name, n) method, for counters, and a record(name, value)
+ method, for sampled values such as times (names ending in
+ '.seconds') and graph sizes (names ending in '.edges').
+ Stats is a sink that aggregates them and CallbackSink passes
+ them to a function.
+
+ Instrumentation is disabled (the sink is None) by default and
+ is checked once per build, operator or similarity call, never
+ per edge, so it costs nothing when disabled.
+
+ Reported names:
+   build.graphs, build.ngrams, build.edgesAdded, build.edgesUpdated (counters)
+   build.seconds, build.ngrams.seconds, build.edges.seconds, build.edges
+   graph.deepcopies, graph.overlays (counters), graph.deepcopy.seconds, graph.deepcopy.edges
+   similarity.arrays.seconds, similarity.components.seconds
+   <name>.calls (counter), <name>.seconds, <name>.inputEdges, <name>.outputEdges
+     for the operators (operator.Union, ...), comparators (comparator.SimilarityNVS, ...)
+     and collector and classifier methods (collector.addText, classifier.getGraphScores, ...)
+"""
+
+# the sink measurements are reported to (None if disabled)
+_sink = None
+
+# sets the sink measurements are reported to (None disables
+# instrumentation) and returns the previous one
+def setSink(sink):
+    global _sink
+    previous = _sink
+    _sink = sink
+    return previous
+
+def getSink():
+    return _sink
+
+def isEnabled():
+    return _sink is not None
+
+
+# reports to sink (a new Stats if None) within a with block:
+#   with instrumented() as stats:
+#       ...
+#   print stats.report()
+class instrumented(object):
+
+    def __init__(self, sink=None):
+        if sink is None:
+            sink = Stats()
+        self._sink = sink
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = setSink(self._sink)
+        return self._sink
+
+    def __exit__(self, *args):
+        setSink(self._previous)
+        return False
+
+
+# the number of edges of a graph argument (None for other arguments)
+def _edges(g):
+    try:
+        return g.size()
+    except (AttributeError, TypeError):
+        return None
+
+# decorates a method so that, when instrumentation is enabled, it's calls,
+# time and the sizes of it's graph arguments and result are reported as name
+def measured(name):
+    calls = name + '.calls'
+    seconds = name + '.seconds'
+    inputEdges = name + '.inputEdges'
+    outputEdges = name + '.outputEdges'
+    def decorate(method):
+        def wrapper(*args, **kwargs):
+            sink = _sink
+            if sink is None:
+                return method(*args, **kwargs)
+            # sizes are taken before in place operators modify their arguments
+            sizes = [e for e in map(_edges, args[1:]) if e is not None]
+            start = clock()
+            res = method(*args, **kwargs)
+            sink.record(seconds, clock() - start)
+            sink.count(calls)
+            if sizes:
+                sink.record(inputEdges, sum(sizes))
+            e = _edges(res)
+            if e is not None:
+                sink.record(outputEdges, e)
+            return res
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+    return decorate
+
+
+# a sink aggregating counters and sampled values (calls, total, min and max)
+class Stats(object):
+
+    def __init__(self):
+        self._counters = {}
+        # name -> [calls, total, min, max]
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        self._lock.acquire()
+        try:
+            self._counters[name] = self._counters.get(name, 0) + n
+        finally:
+            self._lock.release()
+
+    def record(self, name, value):
+        self._lock.acquire()
+        try:
+            s = self._samples.get(name)
+            if s is None:
+                self._samples[name] = [1, value, value, value]
+            else:
+                s[0] += 1
+                s[1] += value
+                s[2] = min(s[2], value)
+                s[3] = max(s[3], value)
+        finally:
+            self._lock.release()
+
+    # the value of a counter (0 if never counted)
+    def getCounter(self, name):
+        return self._counters.get(name, 0)
+
+    def getCounters(self):
+        return dict(self._counters)
+
+    # the sum of the values recorded as name (0 if none)
+    def getTotal(self, name):
+        s = self._samples.get(name)
+        if s is None:
+            return 0
+        return s[1]
+
+    # returns the samples as a dictionary of name to
+    # a dictionary of their calls, total, mean, min and max
+    def getSamples(self):
+        res = {}
+        for (name, (calls, total, low, high)) in self._samples.items():
+            res[name] = {"calls" : calls, "total" : total, "mean" : total * 1.0 / calls,
+                         "min" : low, "max" : high}
+        return res
+
+    # drops all measurements
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._counters.clear()
+            self._samples.clear()
+        finally:
+            self._lock.release()
+
+    # the measurements as text, one per line
+    def report(self):
+        lines = []
+        for name in sorted(self._counters):
+            lines.append("%-40s %d" % (name, self._counters[name]))
+        for (name, s) in sorted(self.getSamples().items()):
+            lines.append("%-40s calls %d total %g mean %g min %g max %g" %
+                         (name, s["calls"], s["total"], s["mean"], s["min"], s["max"]))
+        return "\n".join(lines)
+
+
+# a sink passing every measurement to callback(kind, name, value),
+# where kind is 'count' or 'record'
+class CallbackSink(object):
+
+    def __init__(self, callback):
+        self._callback = callback
+
+    def count(self, name, n=1):
+        self._callback('count', name, n)
+
+    def record(self, name, value):
+        self._callback('record', name, value)
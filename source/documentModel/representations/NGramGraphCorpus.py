@@ -0,0 +1,399 @@
+"""
+  NGramGraphCorpus.py
+
+  Created on Oct 17, 2026, 10:00 AM
+
+"""
+
+import bisect
+import mmap as _mmap
+import os
+import struct
+import numpy as np
+from NGramVocabulary import NGramVocabulary
+from EdgeStore import EdgeStore, packEdges, unpackEdges
+from NGramGraphFile import _pad, _encode, _section, _graphClass
+
+"""
+ An append-only container file of many n-gram graphs, indexed by document id.
+ Document ids are integers, byte strings or unicode strings, and are read back
+ as the type they were appended with.
+
+ The file is a sequence of records, each starting with
+    magic, record type, payload length
+ and followed by it's payload (aligned to 8 bytes):
+    'V' (vocabulary)  the n-grams first used by the graphs that follow:
+                      count, text flag, offsets int64[count + 1], n-grams (utf-8)
+                      n-gram ids continue from the previous vocabulary records
+    'G' (graph)       document id (length, type tag and value, see _encodeId),
+                      n, Dwin, direction, maxW, minW, node and edge counts,
+                      class name, node ids int64[nodes], sorted edge keys
+                      int64[edges] and weights float64[edges]
+
+ All graphs share the corpus vocabulary, so graphs loaded from the same corpus
+ compare and merge their edge keys directly. The file is memory-mapped: graphs are
+ loaded lazily as views over the mapped pages, which processes opening the same
+ corpus share. A document id appended again refers to it's latest graph.
+ Only one process may append to a corpus at a time; readers see the graphs appended
+ after they opened it by calling refresh.
+"""
+
+_MAGIC = b'NGCR'
+_RECORD = struct.Struct('<4sc3xq')
+_VOCABULARY = struct.Struct('<qB7x')
+_GRAPH = struct.Struct('<qqqB7xddqqq')
+
+
+# document ids are stored tagged by their type: 'i' integers (in decimal),
+# 'b' byte strings and 'u' unicode strings (utf-8)
+def _encodeId(docId):
+    if isinstance(docId, (int, long, np.integer)):
+        return b'i' + str(int(docId))
+    if isinstance(docId, bytes):
+        return b'b' + docId
+    if isinstance(docId, unicode):
+        return b'u' + docId.encode('utf-8')
+    raise TypeError('Document ids must be integers or strings, not ' + type(docId).__name__)
+
+def _decodeId(b):
+    tag = b[:1]
+    if tag == b'i':
+        return int(b[1:])
+    if tag == b'b':
+        return b[1:]
+    return b[1:].decode('utf-8')
+
+# the first id of the n-grams a reader interns that the file does not hold
+# (the ids of the file's n-grams stay below it)
+_LOCAL = 1 << 30
+
+
+class CorpusVocabulary(NGramVocabulary):
+    # the vocabulary of a corpus: n-grams of the vocabulary records
+    # (mapped) followed by n-grams not yet written to the file
+    #
+    # the n-grams a writer interns get the ids they are written with by
+    # it's next append. The ones a reader interns get ids from _LOCAL on,
+    # which the vocabulary records read by refresh never take: an n-gram
+    # a reader interned before it was written keeps it's reader id, and
+    # it's id in the file is mapped to it when graphs are loaded
+
+    def __init__(self, local=False):
+        NGramVocabulary.__init__(self)
+        # (first id, offsets, n-grams, text) of each vocabulary record
+        self._chunks = []
+        self._starts = []
+        self._base = 0
+        # n-gram -> id of the mapped n-grams (built on the first lookup)
+        self._mapped = None
+        # the first id of the n-grams not in the file
+        self._local = _LOCAL if local else None
+        # file id -> reader id of the n-grams interned before they were written
+        self._aliases = {}
+        self._aliasArrays = None
+
+    # adds the n-grams of a vocabulary record
+    def _addChunk(self, offsets, blob, text):
+        self._chunks.append((self._base, offsets, blob, text))
+        self._starts.append(self._base)
+        count = len(offsets) - 1
+        if self._local is not None and self._base + count > self._local:
+            raise ValueError('Too many n-grams in the corpus!')
+        c = len(self._chunks) - 1
+        if self._mapped is not None:
+            for i in range(count):
+                self._mapped[self._chunkGram(c, i)] = self._base + i
+        if self._local is not None:
+            if self._ids:
+                for i in range(count):
+                    j = self._ids.get(self._chunkGram(c, i))
+                    if j is not None:
+                        self._aliases[self._base + i] = self._local + j
+                        self._aliasArrays = None
+        elif self._grams:
+            # the n-grams written by append are no longer pending
+            # (a writer's records are the n-grams it interned, in order)
+            if self._grams[:count] != [self._chunkGram(c, i) for i in range(min(count, len(self._grams)))]:
+                raise ValueError('The corpus was appended to by another writer!')
+            del self._grams[:count]
+            self._ids = dict((g, i) for i, g in enumerate(self._grams))
+        self._base += count
+
+    def _chunkGram(self, c, i):
+        start, offsets, blob, text = self._chunks[c]
+        g = blob[offsets[i]:offsets[i + 1]].tobytes()
+        if text:
+            return g.decode('utf-8')
+        return g
+
+    # the first id of the n-grams not in the file
+    def _first(self):
+        if self._local is None:
+            return self._base
+        return self._local
+
+    # the n-grams not yet written to the corpus
+    def _pending(self):
+        return list(self._grams)
+
+    # the ids of an array of file ids, with the n-grams
+    # a reader interned before they were written mapped
+    # to their reader ids (ids is returned if none is)
+    def _canonical(self, ids):
+        if not self._aliases:
+            return ids
+        if self._aliasArrays is None:
+            src = np.array(sorted(self._aliases), dtype=np.int64)
+            dst = np.array([self._aliases[i] for i in src.tolist()], dtype=np.int64)
+            self._aliasArrays = (src, dst)
+        src, dst = self._aliasArrays
+        j = np.minimum(np.searchsorted(src, ids), len(src) - 1)
+        hit = src[j] == ids
+        if not np.any(hit):
+            return ids
+        res = np.array(ids, dtype=np.int64)
+        res[hit] = dst[j[hit]]
+        return res
+
+    def lookup(self, gram):
+        i = self._ids.get(gram)
+        if i is not None:
+            return i + self._first()
+        if self._mapped is None:
+            self._mapped = {}
+            for c in range(len(self._chunks)):
+                start = self._chunks[c][0]
+                for i in range(len(self._chunks[c][1]) - 1):
+                    self._mapped[self._chunkGram(c, i)] = start + i
+        return self._mapped.get(gram)
+
+    def intern(self, gram):
+        i = self.lookup(gram)
+        if i is None:
+            self._lock.acquire()
+            try:
+                i = self._ids.get(gram)
+                if i is None:
+                    i = len(self._grams)
+                    self._grams.append(gram)
+                    self._ids[gram] = i
+            finally:
+                self._lock.release()
+            i += self._first()
+        return i
+
+    def gram(self, i):
+        if i < self._base:
+            c = bisect.bisect_right(self._starts, i) - 1
+            return self._chunkGram(c, i - self._starts[c])
+        return self._grams[i - self._first()]
+
+    # the number of n-grams (those of the file and the ones not in it)
+    def __len__(self):
+        return self._base + len(self._grams)
+
+    def __contains__(self, gram):
+        return self.lookup(gram) is not None
+
+    # pickles with it's n-grams in memory (and the same ids)
+    def __reduce__(self):
+        grams = [self.gram(i) for i in range(self._base)]
+        return (_restoreVocabulary, (grams, list(self._grams), self._local is not None,
+                                     dict(self._aliases)))
+
+
+# a corpus vocabulary of the pickled n-grams of one
+def _restoreVocabulary(grams, pending, local, aliases):
+    v = CorpusVocabulary(local)
+    if grams:
+        encoded = [_encode(g) for g in grams]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(g) for g in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        v._addChunk(offsets, blob, not all(isinstance(g, bytes) for g in grams))
+    v._grams = list(pending)
+    v._ids = dict((g, i) for i, g in enumerate(v._grams))
+    v._aliases = aliases
+    return v
+
+
+class NGramGraphCorpus(object):
+
+    # opens the corpus at path for reading ('r')
+    # or for reading and appending ('a', created if missing)
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'a'):
+            raise ValueError('Mode must be \'r\' or \'a\'')
+        self._path = path
+        self._mode = mode
+        self._vocab = CorpusVocabulary(local=(mode == 'r'))
+        # document id -> offset of it's graph record
+        self._index = {}
+        self._order = []
+        self._buf = None
+        self._end = 0
+        self._f = None
+        if mode == 'a':
+            self._f = open(path, 'ab')
+        self.refresh()
+        if mode == 'a' and self._end < os.path.getsize(path):
+            # drop an incomplete record left by an interrupted append
+            self._f.truncate(self._end)
+
+    # maps the file again and indexes the records
+    # appended since the last refresh
+    def refresh(self):
+        size = os.path.getsize(self._path)
+        if size == 0 or size == self._end:
+            return
+        f = open(self._path, 'rb')
+        try:
+            self._buf = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+        finally:
+            f.close()
+        pos = self._end
+        while pos + _RECORD.size <= size:
+            magic, kind, length = _RECORD.unpack_from(self._buf, pos)
+            if magic != _MAGIC:
+                raise ValueError('Corrupted n-gram graph corpus at offset ' + str(pos))
+            payload = pos + _RECORD.size
+            if payload + length > size:
+                break
+            if kind == b'V':
+                count, text = _VOCABULARY.unpack_from(self._buf, payload)
+                p = payload + _VOCABULARY.size
+                offsets, p = _section(self._buf, p, '<i8', count + 1)
+                blob, p = _section(self._buf, p, np.uint8, int(offsets[-1]))
+                self._vocab._addChunk(offsets, blob, bool(text))
+            elif kind == b'G':
+                docId = self._readId(payload)[0]
+                if docId not in self._index:
+                    self._order.append(docId)
+                self._index[docId] = payload
+            else:
+                raise ValueError('Unknown record type at offset ' + str(pos))
+            pos = payload + length
+        self._end = pos
+
+    def _readId(self, pos):
+        n = struct.unpack_from('<q', self._buf, pos)[0]
+        b, pos = _section(self._buf, pos + 8, np.uint8, n)
+        return _decodeId(b.tobytes()), pos
+
+    def _writeRecord(self, kind, parts):
+        length = sum(len(p) + _pad(len(p)) for p in parts)
+        self._f.write(_RECORD.pack(_MAGIC, kind, length))
+        for p in parts:
+            self._f.write(p)
+            self._f.write(b'\0' * _pad(len(p)))
+
+    # appends the graph of a document
+    def append(self, docId, ngg):
+        if self._f is None:
+            raise IOError('Corpus is not open for appending')
+        docBytes = _encodeId(docId)
+        # node and edge ids in the corpus vocabulary
+        vocab = ngg.getVocabulary()
+        ids = np.array(sorted(ngg._nodeSet()), dtype=np.int64)
+        if vocab is self._vocab:
+            cids = ids
+        else:
+            cids = np.array([self._vocab.intern(vocab.gram(i)) for i in ids.tolist()], dtype=np.int64)
+        a, b = unpackEdges(ngg.getEdgeStore().keys())
+        keys = packEdges(cids[np.searchsorted(ids, a)], cids[np.searchsorted(ids, b)], ngg.isDirected())
+        o = np.argsort(keys, kind='mergesort')
+        keys = keys[o]
+        weights = ngg.getEdgeStore().weights()[o]
+
+        # n-grams new to the corpus
+        pending = self._vocab._pending()
+        if pending:
+            text = not all(isinstance(g, bytes) for g in pending)
+            encoded = [_encode(g) for g in pending]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(g) for g in encoded], out=offsets[1:])
+            self._writeRecord(b'V', [_VOCABULARY.pack(len(encoded), int(text)),
+                                     offsets.astype('<i8').tobytes(), b''.join(encoded)])
+
+        name = ngg.__class__.__name__.encode('utf-8')
+        self._writeRecord(b'G', [struct.pack('<q', len(docBytes)), docBytes,
+                                 _GRAPH.pack(ngg._n, ngg._Dwin, len(name), int(ngg.isDirected()),
+                                             float(ngg.maxW()), float(ngg.minW()), len(cids), len(keys), 0),
+                                 name,
+                                 np.sort(cids).astype('<i8').tobytes(),
+                                 keys.astype('<i8').tobytes(),
+                                 np.ascontiguousarray(weights).astype('<f8').tobytes()])
+        self._f.flush()
+        self.refresh()
+
+    # loads the graph of a document
+    def getGraph(self, docId):
+        pos = self._readId(self._index[docId])[1]
+        n, Dwin, nName, directed, maxW, minW, nNodes, nEdges, _ = _GRAPH.unpack_from(self._buf, pos)
+        pos += _GRAPH.size
+        name, pos = _section(self._buf, pos, np.uint8, nName)
+        nodes, pos = _section(self._buf, pos, '<i8', nNodes)
+        keys, pos = _section(self._buf, pos, '<i8', nEdges)
+        weights, pos = _section(self._buf, pos, '<f8', nEdges)
+
+        # n-grams interned here before they were written keep their ids
+        canonical = self._vocab._canonical(nodes)
+        if canonical is not nodes:
+            a, b = unpackEdges(keys)
+            keys = packEdges(self._vocab._canonical(a), self._vocab._canonical(b), bool(directed))
+            o = np.argsort(keys, kind='mergesort')
+            keys = keys[o]
+            weights = weights[o]
+            nodes = np.sort(canonical)
+
+        cls = _graphClass(name.tobytes().decode('utf-8'))
+        ngg = cls.__new__(cls)
+        ngg._n = n
+        ngg._Dwin = Dwin
+        ngg._Data = []
+        ngg._dSize = 0
+        ngg._ngram = []
+        ngg._GPrintVerbose = True
+        ngg._vocab = self._vocab
+        ngg._store = EdgeStore.fromSortedArrays(keys, weights)
+        ngg._nodes = None
+        ngg._nodeIds = nodes
+        ngg._maxW = maxW
+        ngg._minW = minW
+        return ngg
+
+    def __getitem__(self, docId):
+        return self.getGraph(docId)
+
+    def __contains__(self, docId):
+        return docId in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    # iterates over the document ids in the order they were first appended
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def ids(self):
+        return list(self._order)
+
+    # lazily loads the graphs of the given documents (all by default)
+    def graphs(self, ids=None):
+        if ids is None:
+            ids = self.ids()
+        for docId in ids:
+            yield self.getGraph(docId)
+
+    # lazily loads (document id, graph) tuples
+    def items(self):
+        for docId in self.ids():
+            yield (docId, self.getGraph(docId))
+
+    def getVocabulary(self):
+        return self._vocab
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
@@ -0,0 +1,217 @@
+"""
+  NGramGraphFile.py
+
+  Created on Oct 17, 2026, 5:00 PM
+
+"""
+
+import mmap as _mmap
+import struct
+import numpy as np
+from NGramVocabulary import NGramVocabulary
+from EdgeStore import EdgeStore, packEdges, unpackEdges
+from DocumentNGramGraph import DocumentNGramGraph
+
+"""
+ A binary, memory-mappable file format for n-gram graphs.
+
+ Layout (little endian, every section aligned to 8 bytes):
+    header      magic, version, n, Dwin, directed and text flags,
+                maxW, minW, node, edge, n-gram bytes and class name lengths
+    class name  the name of the graph class (utf-8)
+    offsets     int64[nodes + 1], offsets of the n-grams in the n-gram bytes
+    n-grams     the n-grams (utf-8), sorted, so a node id is the rank of it's n-gram
+    keys        int64[edges], sorted packed edge keys over the node ids
+    weights     float64[edges], the weights of the keys
+
+ Loading maps the file and wraps the sections as arrays, so no python
+ objects are created per n-gram or edge: n-grams are found by binary
+ search and edges through the sorted keys (see EdgeStore.fromSortedArrays).
+"""
+
+MAGIC = b'NGGB'
+VERSION = 1
+_HEADER = struct.Struct('<4sIqqBB6xddqqqq')
+
+def _pad(n):
+    return (-n) % 8
+
+# n-grams are stored as utf-8
+def _encode(gram):
+    if isinstance(gram, bytes):
+        return gram
+    return gram.encode('utf-8')
+
+
+class MappedNGramVocabulary(NGramVocabulary):
+    # a vocabulary over the sorted n-grams of a file
+    # n-grams interned later get ids after the mapped ones
+
+    def __init__(self, offsets, blob, text=True):
+        NGramVocabulary.__init__(self)
+        self._offsets = offsets
+        self._blob = blob
+        self._text = text
+        self._base = len(offsets) - 1
+
+    def _mappedBytes(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    # binary search for the id of a mapped n-gram
+    def _search(self, gram):
+        g = _encode(gram)
+        lo = 0
+        hi = self._base
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._mappedBytes(mid) < g:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._base and self._mappedBytes(lo) == g:
+            return lo
+        return None
+
+    def lookup(self, gram):
+        i = self._search(gram)
+        if i is None:
+            i = self._ids.get(gram)
+            if i is not None:
+                i += self._base
+        return i
+
+    def intern(self, gram):
+        i = self.lookup(gram)
+        if i is None:
+            i = NGramVocabulary.intern(self, gram) + self._base
+        return i
+
+    def gram(self, i):
+        if i < self._base:
+            g = self._mappedBytes(i)
+            if self._text:
+                return g.decode('utf-8')
+            return g
+        return self._grams[i - self._base]
+
+    def __len__(self):
+        return self._base + len(self._grams)
+
+    def __contains__(self, gram):
+        return self.lookup(gram) is not None
+
+    # pickles as a plain vocabulary
+    def __reduce__(self):
+        v = NGramVocabulary()
+        v.internAll([self.gram(i) for i in range(len(self))])
+        return (NGramVocabulary, (), v.__getstate__())
+
+
+# returns the graph class with the given name
+def _graphClass(name):
+    classes = [DocumentNGramGraph]
+    while classes:
+        c = classes.pop()
+        if c.__name__ == name:
+            return c
+        classes.extend(c.__subclasses__())
+    raise ValueError('Unknown graph class: ' + name)
+
+# the sections of a graph in file order:
+# (header values, class name, offsets, n-grams, keys, weights)
+def graphSections(ngg):
+    vocab = ngg.getVocabulary()
+    ids = np.array(sorted(ngg._nodeSet()), dtype=np.int64)
+    grams = [vocab.gram(i) for i in ids.tolist()]
+    text = not all(isinstance(g, bytes) for g in grams)
+    encoded = [_encode(g) for g in grams]
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    # rank of each node (by position in ids) in the sorted n-grams
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[order] = np.arange(len(ids))
+
+    lengths = np.array([len(encoded[i]) for i in order], dtype=np.int64)
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    blob = b''.join(encoded[i] for i in order)
+
+    a, b = unpackEdges(ngg.getEdgeStore().keys())
+    keys = packEdges(rank[np.searchsorted(ids, a)], rank[np.searchsorted(ids, b)], ngg.isDirected())
+    weights = ngg.getEdgeStore().weights()
+    o = np.argsort(keys, kind='mergesort')
+    keys = keys[o]
+    weights = np.ascontiguousarray(weights[o], dtype=np.float64)
+
+    name = ngg.__class__.__name__.encode('utf-8')
+    header = (ngg._n, ngg._Dwin, int(ngg.isDirected()), int(text),
+              float(ngg.maxW()), float(ngg.minW()), len(ids), len(keys), len(blob), len(name))
+    return header, name, offsets, blob, keys, weights
+
+# writes a graph to a file object
+def writeGraph(ngg, f):
+    header, name, offsets, blob, keys, weights = graphSections(ngg)
+    f.write(_HEADER.pack(MAGIC, VERSION, *header))
+    for data in (name, offsets.astype('<i8').tobytes(), blob, keys.astype('<i8').tobytes(), weights.astype('<f8').tobytes()):
+        f.write(data)
+        f.write(b'\0' * _pad(len(data)))
+
+# saves a graph to a binary file
+def saveGraph(ngg, path):
+    f = open(path, 'wb')
+    try:
+        writeGraph(ngg, f)
+    finally:
+        f.close()
+
+# wraps count items of a section starting at pos as an array
+# returns the array and the position of the next section
+def _section(buf, pos, dtype, count):
+    arr = np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+    size = arr.nbytes
+    return arr, pos + size + _pad(size)
+
+# reads a graph from a buffer (a mapped file or bytes) at offset
+def readGraph(buf, offset=0):
+    fields = _HEADER.unpack_from(buf, offset)
+    magic, version, n, Dwin, directed, text, maxW, minW, nNodes, nEdges, nBlob, nName = fields
+    if magic != MAGIC:
+        raise ValueError('Not an n-gram graph file')
+    if version != VERSION:
+        raise ValueError('Unsupported n-gram graph file version: ' + str(version))
+    pos = offset + _HEADER.size
+    name, pos = _section(buf, pos, np.uint8, nName)
+    offsets, pos = _section(buf, pos, '<i8', nNodes + 1)
+    blob, pos = _section(buf, pos, np.uint8, nBlob)
+    keys, pos = _section(buf, pos, '<i8', nEdges)
+    weights, pos = _section(buf, pos, '<f8', nEdges)
+
+    cls = _graphClass(name.tobytes().decode('utf-8'))
+    ngg = cls.__new__(cls)
+    ngg._n = n
+    ngg._Dwin = Dwin
+    ngg._Data = []
+    ngg._dSize = 0
+    ngg._ngram = []
+    ngg._GPrintVerbose = True
+    ngg._vocab = MappedNGramVocabulary(offsets, blob, bool(text))
+    ngg._store = EdgeStore.fromSortedArrays(keys, weights)
+    ngg._nodes = None
+    ngg._nodeIds = np.arange(nNodes)
+    ngg._maxW = maxW
+    ngg._minW = minW
+    if bool(directed) != ngg.isDirected():
+        raise ValueError('Graph direction does not match the graph class')
+    return ngg, pos
+
+# loads a graph from a binary file
+# memory-mapping it unless mmap is False
+def loadGraph(path, mmap=True):
+    f = open(path, 'rb')
+    try:
+        if mmap:
+            buf = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+    finally:
+        f.close()
+    return readGraph(buf)[0]
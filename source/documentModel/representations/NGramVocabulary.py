@@ -0,0 +1,109 @@
+"""
+  NGramVocabulary.py
+
+  Created on Oct 17, 2026, 10:00 AM
+
+"""
+
+import hashlib
+import threading
+import numpy as np
+
+"""
+ An interning table between n-gram strings and integer ids.
+ Every graph built against the same vocabulary can compare
+ and merge it's edges as plain integers.
+"""
+
+# a stable 64 bit hash of an n-gram (the same in any process)
+def gramHash(gram):
+    if not isinstance(gram, bytes):
+        gram = gram.encode('utf-8')
+    return int(hashlib.md5(gram).hexdigest()[:16], 16)
+
+class NGramVocabulary(object):
+
+    def __init__(self):
+        # n-gram string -> id
+        self._ids = {}
+        # id -> n-gram string
+        self._grams = []
+        # guards id assignment when graphs are built
+        # from several threads (e.g. ParallelNary)
+        self._lock = threading.Lock()
+        # id -> 64 bit hash of the n-gram (see gramHashes)
+        self._hashes = {}
+
+    # returns the id of an n-gram
+    # assigning a new one if it is unknown
+    def intern(self, gram):
+        i = self._ids.get(gram)
+        if i is None:
+            self._lock.acquire()
+            try:
+                i = self._ids.get(gram)
+                if i is None:
+                    i = len(self._grams)
+                    self._grams.append(gram)
+                    self._ids[gram] = i
+            finally:
+                self._lock.release()
+        return i
+
+    # interns a sequence of n-grams at once
+    def internAll(self, grams):
+        return [self.intern(g) for g in grams]
+
+    # returns the id of an n-gram or None
+    # if it has never been interned
+    def lookup(self, gram):
+        return self._ids.get(gram)
+
+    # returns the n-gram string of a given id
+    def gram(self, i):
+        return self._grams[i]
+
+    # returns stable 64 bit hashes of the n-grams of an array
+    # of ids, the same for equal n-grams of any vocabulary
+    def gramHashes(self, ids):
+        ids, inverse = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+        hashes = self._hashes
+        res = np.empty(len(ids), dtype=np.uint64)
+        for (j, i) in enumerate(ids.tolist()):
+            h = hashes.get(i)
+            if h is None:
+                h = hashes[i] = gramHash(self.gram(i))
+            res[j] = h
+        return res[inverse]
+
+    def __len__(self):
+        return len(self._grams)
+
+    def __contains__(self, gram):
+        return gram in self._ids
+
+    # ids are never reassigned, so a vocabulary
+    # is shared (not copied) by the copies of it's graphs
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # locks can not be pickled
+    def __getstate__(self):
+        return {'_grams': self._grams}
+
+    def __setstate__(self, state):
+        self._grams = list(state['_grams'])
+        self._ids = dict((g, i) for i, g in enumerate(self._grams))
+        self._lock = threading.Lock()
+        self._hashes = {}
+
+
+# the vocabulary all graphs use by default
+_sharedVocabulary = NGramVocabulary()
+
+# returns the process wide shared vocabulary
+def getSharedVocabulary():
+    return _sharedVocabulary
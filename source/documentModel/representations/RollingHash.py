@@ -0,0 +1,79 @@
+"""
+  RollingHash.py
+
+  Created on Oct 17, 2026, 10:00 AM
+
+"""
+
+import numpy as np
+
+"""
+ Rabin-Karp style rolling hashes of the n-grams of a text.
+
+ The hash of the n-gram at position i of the symbol codes c is
+ the polynomial sum(c[i+j] * B^(n-1-j)) modulo 2^64. With P the
+ prefix sums of c[j] * B^-j (B is odd, so it has an inverse
+ modulo 2^64), it is (P[i+n] - P[i]) * B^(i+n-1): every n-gram is
+ hashed in constant time whatever n is, with a few array passes
+ over the text and no n-gram strings.
+
+ Hashes may collide: gramIndex checks every n-gram against the
+ first n-gram of it's hash, so the n-gram strings looked up from
+ it (e.g. interned to a vocabulary, for display) are exact.
+"""
+
+_MOD = 1 << 64
+_BASE = 0x9E3779B97F4A7C15
+
+# the inverse of an odd number modulo 2^64 (by Newton's iteration)
+def _inverse(b):
+    x = b
+    for i in range(6):
+        x = (x * (2 - b * x)) % _MOD
+    return x
+
+_BASE_INV = _inverse(_BASE)
+
+# the powers b^0 .. b^(k-1) modulo 2^64
+def _powers(b, k):
+    p = np.full(k, b, dtype=np.uint64)
+    if k:
+        p[0] = 1
+    # unsigned arithmetic wraps modulo 2^64
+    return np.cumprod(p, dtype=np.uint64)
+
+# returns the 64-bit hashes (uint64) of the n-grams of an array of
+# (non negative integer) symbol codes, one per n-gram position
+def rollingHashes(codes, n):
+    size = len(codes)
+    if n < 1 or size < n:
+        return np.zeros(0, dtype=np.uint64)
+    # codes are shifted so no symbol hashes to 0
+    c = np.asarray(codes).astype(np.uint64) + np.uint64(1)
+    prefix = np.zeros(size + 1, dtype=np.uint64)
+    np.cumsum(c * _powers(_BASE_INV, size), dtype=np.uint64, out=prefix[1:])
+    return (prefix[n:] - prefix[:size - n + 1]) * _powers(_BASE, size)[n - 1:]
+
+# returns, for the n-grams of an array of symbol codes, the index of
+# every n-gram among the distinct ones and a position of every distinct
+# n-gram, computed from their rolling hashes. If check is set, every
+# n-gram is compared to the n-gram at the position of it's index and
+# None is returned on a hash collision.
+def gramIndex(codes, n, check=True):
+    codes = np.asarray(codes)
+    h = rollingHashes(codes, n)
+    if len(h) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    _, inverse = np.unique(h, return_inverse=True)
+    # a position of every distinct n-gram
+    # (any occurrence will do, so return_index, which needs a slower
+    # stable sort, is not used: positions are scattered by the inverse)
+    pos = np.empty(int(inverse.max()) + 1, dtype=np.int64)
+    pos[inverse] = np.arange(len(inverse))
+    if check:
+        s = len(h)
+        first = pos[inverse]
+        for j in range(n):
+            if not np.array_equal(codes[j:j + s], codes[first + j]):
+                return None
+    return inverse, pos
@@ -0,0 +1,116 @@
+"""
+  WindowKernel.py
+
+  Created on Oct 17, 2026, 10:00 AM
+
+"""
+
+import math
+import numpy as np
+
+"""
+ Weighting kernels of n-gram graph windows.
+
+ A kernel gives, for a window size Dwin, the distances (in n-grams)
+ at which an n-gram is connected to the n-grams following it and the
+ weight every such occurrence adds to the edge. The table of a Dwin
+ is computed once and reused by every build (see
+ DocumentNGramGraph.windowKernel), so weighting costs nothing per edge.
+"""
+
+class WindowKernel(object):
+
+    def __init__(self):
+        # Dwin -> (distances, weights) or None
+        self._tables = {}
+
+    # the (distances, weights) arrays of a window size,
+    # or None if the window has no edges
+    def table(self, Dwin):
+        try:
+            return self._tables[Dwin]
+        except KeyError:
+            t = self.computeTable(Dwin)
+            if t is not None:
+                distances, weights = t
+                t = (np.asarray(distances, dtype=np.int64), np.asarray(weights, dtype=np.float64))
+                if len(t[0]) == 0:
+                    t = None
+                else:
+                    for arr in t:
+                        arr.setflags(write=False)
+            self._tables[Dwin] = t
+            return t
+
+    # computes the table of a window size (see table)
+    def computeTable(self, Dwin):
+        return None
+
+    # kernels are stateless but for their tables
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_tables'] = {}
+        return state
+
+
+# connects every n-gram to the Dwin+1 n-grams following it with weight 1
+# (the DocumentNGramGraph window)
+class UniformKernel(WindowKernel):
+
+    def computeTable(self, Dwin):
+        if Dwin < 1:
+            return None
+        distances = np.arange(1, Dwin + 2)
+        return distances, np.ones(len(distances))
+
+
+# connects every n-gram to the Dwin/2 n-grams following it with weight 1
+# (the DocumentNGramSymWinGraph window)
+class SymmetricKernel(WindowKernel):
+
+    def computeTable(self, Dwin):
+        win = Dwin//2
+        if win < 1:
+            return None
+        distances = np.arange(1, win + 1)
+        return distances, np.ones(len(distances))
+
+
+# connects every n-gram to the 3*Dwin/2 n-grams following it, weighted by
+# a gaussian of their distance with sigma Dwin/2, rounded to 2 decimals
+# (the DocumentNGramGaussNormGraph window)
+class GaussianKernel(WindowKernel):
+
+    def computeTable(self, Dwin):
+        sigma = Dwin//2
+        if Dwin < 1 or sigma < 1:
+            return None
+        distances = np.arange(1, (3*Dwin)//2 + 1)
+        return distances, [float(format(gaussianPdf(j, sigma), '.2f')) for j in distances.tolist()]
+
+# the (unnormalized in x) gaussian weight of a distance
+# as used by DocumentNGramGaussNormGraph
+def gaussianPdf(x, sigma=1, mean=0):
+    a = 1.0/(sigma * math.sqrt(2*math.pi))
+    b = 2.0*(sigma**2)
+    return a*math.exp(-(x*1.0)/b)
+
+
+# a user supplied kernel: connects every n-gram to the n-grams following
+# it up to span(Dwin) (or span, if it is a number) with weight(distance)
+class FunctionKernel(WindowKernel):
+
+    def __init__(self, weight, span):
+        WindowKernel.__init__(self)
+        self._weight = weight
+        self._span = span
+
+    def computeTable(self, Dwin):
+        if callable(self._span):
+            span = int(self._span(Dwin))
+        else:
+            span = int(self._span)
+        if span < 1:
+            return None
+        distances = np.arange(1, span + 1)
+        return distances, [float(self._weight(j)) for j in distances.tolist()]
@@ -1,3 +1,12 @@
+from NGramVocabulary import *
+from Instrumentation import *
+from EdgeStore import *
+from WindowKernel import *
+from RollingHash import *
+from EdgeSketch import *
 from DocumentNGramGaussNormGraph import *
 from DocumentNGramSymWinGraph import *
-from DocumentNGramGraph import *
\ No newline at end of file
+from DocumentNGramGraph import *
+from NGramGraphFile import *
+from NGramGraphCorpus import *
+from GraphBuildCache import *
\ No newline at end of file
@@ -0,0 +1,283 @@
+import sys
+import copy
+import pickle
+sys.path.append('..')
+from source import representations as NGG
+from source import comparators as CMP
+
+# n-grams are interned in a shared vocabulary
+# and edges are stored as packed integer keys
+ngg1 = NGG.DocumentNGramGraph(3,2,"abcdef")
+ngg2 = NGG.DocumentNGramGraph(3,2,"abcdeff")
+assert ngg1.getVocabulary() is ngg2.getVocabulary()
+print sorted(ngg1.edges(data=True))
+assert ngg1.getEdgeWeight("cde","bcd") == 1.0
+assert ngg1.to_networkx().number_of_edges() == ngg1.size()
+
+# undirected graphs store each edge once
+ngswg = NGG.DocumentNGramSymWinGraph(1,4,"abab")
+print sorted(ngswg.edges(data=True))
+assert ngswg.size() == 3
+assert ngswg.getEdgeWeight("a","b") == ngswg.getEdgeWeight("b","a") == 3.0
+
+# copies share the vocabulary, pickles are interned on load
+ngg3 = copy.deepcopy(ngg1)
+assert ngg3.getVocabulary() is ngg1.getVocabulary()
+ngg4 = pickle.loads(pickle.dumps(ngg1))
+assert sorted(ngg4.edges(data=True)) == sorted(ngg1.edges(data=True))
+
+# graphs of different vocabularies can still be compared
+ngg5 = NGG.DocumentNGramGraph(3,2,"abcdeff",vocabulary=NGG.NGramVocabulary())
+gs = CMP.SimilarityNVS()
+assert gs.getSimilarityComponents(ngg1,ngg5) == gs.getSimilarityComponents(ngg1,ngg2)
+print gs.getSimilarityComponents(ngg1,ngg2)
+
+# batched and incremental builds give the same graphs
+for cls in (NGG.DocumentNGramGraph, NGG.DocumentNGramSymWinGraph, NGG.DocumentNGramGaussNormGraph):
+    gb = cls(3,4,"GATTACATTAGATTACA")
+    gi = cls(3,4)
+    gi.buildGraph(d="GATTACATTAGATTACA", batched=False)
+    assert sorted(gb.edges(data=True)) == sorted(gi.edges(data=True))
+    assert gb.getngram() == gi.getngram()
+
+# binary files are memory-mapped on load
+import os
+import tempfile
+fd, path = tempfile.mkstemp(suffix='.ngg')
+os.close(fd)
+try:
+    ngg1.save(path)
+    ngg6 = NGG.DocumentNGramGraph.load(path)
+    assert sorted(ngg6.edges(data=True)) == sorted(ngg1.edges(data=True))
+    assert gs.getSimilarityComponents(ngg6,ngg2) == gs.getSimilarityComponents(ngg1,ngg2)
+    ngswg.save(path)
+    assert isinstance(NGG.loadGraph(path), NGG.DocumentNGramSymWinGraph)
+finally:
+    os.remove(path)
+
+
+# corpora are append-only and load their graphs lazily
+fd, path = tempfile.mkstemp(suffix='.ngc')
+os.close(fd)
+try:
+    corpus = NGG.NGramGraphCorpus(path, 'a')
+    corpus.append('one', ngg1)
+    corpus.append('two', ngswg)
+    corpus.append('one', ngg2)
+    corpus.close()
+    corpus = NGG.NGramGraphCorpus(path)
+    assert corpus.ids() == ['one', 'two'] and len(corpus) == 2
+    assert sorted(corpus['one'].edges(data=True)) == sorted(ngg2.edges(data=True))
+    assert sorted(corpus['two'].edges(data=True)) == sorted(ngswg.edges(data=True))
+    assert corpus['one'].getVocabulary() is corpus.getVocabulary()
+    # n-grams a reader interns keep their ids when refresh reads new ones
+    writer = NGG.NGramGraphCorpus(path, 'a')
+    gq = NGG.DocumentNGramGraph(3,2,"qrstuv",vocabulary=corpus.getVocabulary())
+    gqEdges = sorted(gq.edges(data=True))
+    writer.append('three', NGG.DocumentNGramGraph(3,2,"xyzwvk"))
+    writer.append('four', NGG.DocumentNGramGraph(3,2,"stuvxyz"))
+    writer.close()
+    corpus.refresh()
+    assert sorted(gq.edges(data=True)) == gqEdges
+    assert sorted(corpus['three'].edges(data=True)) == sorted(NGG.DocumentNGramGraph(3,2,"xyzwvk").edges(data=True))
+    assert gs.getSimilarityComponents(corpus['four'], gq) == gs.getSimilarityComponents(NGG.DocumentNGramGraph(3,2,"stuvxyz"), NGG.DocumentNGramGraph(3,2,"qrstuv"))
+    # document ids are read back as the type they were appended with
+    writer = NGG.NGramGraphCorpus(path, 'a')
+    writer.append(5, ngg1)
+    writer.append(u'caf\xe9', ngg1)
+    try:
+        writer.append(1.5, ngg1)
+        assert False
+    except TypeError:
+        pass
+    writer.close()
+    corpus.refresh()
+    assert corpus.ids() == ['one', 'two', 'three', 'four', 5, u'caf\xe9']
+    assert [type(i) for i in corpus.ids()] == [str, str, str, str, int, unicode]
+    assert sorted(corpus[5].edges(data=True)) == sorted(ngg1.edges(data=True))
+    import pickle
+    vq = pickle.loads(pickle.dumps(corpus.getVocabulary()))
+    assert [vq.lookup(g) for g in ("stu", "xyz", "qrs")] == [corpus.getVocabulary().lookup(g) for g in ("stu", "xyz", "qrs")]
+finally:
+    os.remove(path)
+
+# fingerprints follow the content of the graph
+ngg7 = NGG.DocumentNGramGraph(3,2,"abcdef",vocabulary=NGG.NGramVocabulary())
+assert ngg7.fingerprint() == ngg1.fingerprint() != ngg2.fingerprint()
+ngg7.setEdge("abc","xyz",2)
+assert ngg7.fingerprint() != ngg1.fingerprint()
+ngg7.delEdge("abc","xyz")
+assert ngg7.fingerprint() == ngg1.fingerprint()
+
+# built graphs are cached and shared copy-on-write
+cache = NGG.GraphBuildCache(4)
+ngg8 = NGG.DocumentNGramGraph(3,2,"abcdef",cache=cache)
+ngg9 = NGG.DocumentNGramGraph(3,2,"abcdef",cache=cache)
+assert cache.getHits() == 1 and cache.getMisses() == 1
+ngg9.setEdge("abc","xyz",2)
+assert sorted(NGG.DocumentNGramGraph(3,2,"abcdef",cache=cache).edges(data=True)) == sorted(ngg1.edges(data=True))
+assert sorted(ngg8.edges(data=True)) == sorted(ngg1.edges(data=True))
+# (of byte text that is not ascii too)
+gc = NGG.DocumentNGramGraph(3,3,'caf\xc3\xa9 caf\xc3\xa9',cache=cache)
+assert sorted(gc.edges(data=True)) == sorted(NGG.DocumentNGramGraph(3,3,'caf\xc3\xa9 caf\xc3\xa9').edges(data=True))
+gu = NGG.DocumentNGramGraph(3,3,'caf\xc3\xa9 caf\xc3\xa9'.decode('utf-8'),cache=cache)
+assert gu.size() != gc.size() and cache.getMisses() == 3
+
+# streamed builds give the graph of the whole text
+import io
+text = "GATTACATTAGATTACA" * 5
+for cls in (NGG.DocumentNGramGraph, NGG.DocumentNGramSymWinGraph):
+    gs1 = cls(3,4).buildGraphStream(io.BytesIO(text), chunkSize=7)
+    assert sorted(gs1.edges(data=True)) == sorted(cls(3,4,text).edges(data=True))
+
+# user supplied window kernels
+kernel = NGG.FunctionKernel(lambda d: 1.0/d, lambda Dwin: Dwin)
+gk = NGG.DocumentNGramGraph(1,2,"abc",kernel=kernel)
+gki = NGG.DocumentNGramGraph(1,2,kernel=kernel)
+gki.buildGraph(d="abc", batched=False)
+print sorted(gk.edges(data=True))
+assert sorted(gk.edges(data=True)) == sorted(gki.edges(data=True)) == [("b","a",1.0),("c","a",0.5),("c","b",1.0)]
+# (graphs of other kernels are cached apart)
+gkc = NGG.DocumentNGramGraph(1,2,"abc",cache=cache)
+gkc = NGG.DocumentNGramGraph(1,2,"abc",cache=cache,kernel=kernel)
+assert sorted(gkc.edges(data=True)) == sorted(gk.edges(data=True))
+
+# instrumentation reports builds, copies, operators and comparators
+with NGG.instrumented() as stats:
+    gb = NGG.DocumentNGramGraph(3,2,"abcdefabc")
+    gu = CMP.Union().apply(gb, ngg1)
+    CMP.SimilarityNVS().getSimilarityDouble(gb, ngg1)
+print stats.report()
+assert NGG.getSink() is None
+assert stats.getCounter("build.graphs") == 1 and stats.getCounter("build.ngrams") == 7
+assert stats.getCounter("build.edgesAdded") == gb.size()
+assert stats.getCounter("build.edgesAdded") + stats.getCounter("build.edgesUpdated") == 7*3 - 6
+assert stats.getCounter("graph.deepcopies") == 0 and stats.getCounter("graph.overlays") == 1
+assert stats.getCounter("operator.Union.calls") == stats.getCounter("comparator.SimilarityNVS.calls") == 1
+assert stats.getTotal("operator.Union.outputEdges") == gu.size()
+events = []
+with NGG.instrumented(NGG.CallbackSink(lambda kind, name, value: events.append(name))):
+    gb.buildGraph(d="abcd", batched=False)
+assert "build.seconds" in events and "build.ngrams.seconds" in events
+
+# operator results are copy-on-write overlays over their first argument
+go = CMP.Intersect().apply(ngg2, NGG.DocumentNGramGraph(3,2,"abcdeqqq"))
+assert go.isOverlay() and sorted(go.edges(data=True)) == [("bcd","abc",1.0),("cde","abc",1.0),("cde","bcd",1.0)]
+go.setEdge("abc","xyz",2)
+assert not ngg2.hasEdge("abc","xyz") and go.getEdgeWeight("abc","xyz") == 2
+assert CMP.SimilarityVS().getSimilarityDouble(go, ngg2) == CMP.SimilarityVS().getSimilarityDouble(copy.deepcopy(go).materialize(), ngg2)
+assert not go.materialize().isOverlay() and go.size() == 4
+
+# parallel n-ary operators reduce in the same (tree) order on any number of workers
+import warnings
+warnings.simplefilter("ignore")
+texts = ["abcdef", "abcxyz", "bcdxya", "xyzabc", "fedcba"] * 3
+gp = [NGG.DocumentNGramGraph(3,2,t) for t in texts]
+gp1 = CMP.ParallelNary(CMP.Union(), 1).apply(*gp)
+gp2 = CMP.ParallelNary(CMP.Union(), 2, minPoolEdges=0).apply(*gp)
+assert sorted(gp1.edges(data=True)) == sorted(gp2.edges(data=True))
+assert sorted(gp[0].edges(data=True)) == sorted(ngg1.edges(data=True))
+
+# update keeps the mean weight of common edges over any number of graphs
+gw = [NGG.DocumentNGramGraph(1,1) for i in range(3)]
+for (g, w) in zip(gw, [1.0, 2.0, 6.0]):
+    g.setEdge("a","b",w)
+gw[2].setEdge("a","c",5.0)
+gm = CMP.Update().apply(*gw)
+assert gm.getEdgeWeight("a","b") == 3.0 and gm.getEdgeWeight("a","c") == 5.0
+assert gw[0].getEdgeWeight("a","b") == 1.0 and not gw[0].hasEdge("a","c")
+gm = CMP.Update().applyAll(NGG.DocumentNGramGraph(3,2,"abcd" if i % 2 else "abce") for i in range(3000))
+assert gm.getEdgeWeight("bcd","abc") == 1.0 and gm.size() == 2
+
+# long n-grams are identified by rolling hashes
+import numpy as np
+codes = np.array([3, 1, 4, 1, 5, 3, 1, 4, 1, 5, 3])
+inverse, pos = NGG.gramIndex(codes, 5)
+assert len(pos) == 5 and inverse[0] == inverse[5] and inverse[1] == inverse[6]
+h = NGG.rollingHashes(codes, 5)
+assert h[0] == h[5] != h[1]
+text = u"".join(unichr(0x4e00 + i) for i in range(5)) * 4 + unichr(0x4e10)
+gl = NGG.DocumentNGramGraph(16,2,text)
+grams = [u"".join(g) for g in gl.getngram()]
+assert len(grams) == 6 and sorted(gl.edges()) == sorted(set((grams[i + d], grams[i]) for i in range(6) for d in (1, 2, 3) if i + d < 6))
+
+# budgeted collectors keep the representative graph within it's edge budget
+from source import NGramGraphCollector, EdgeBudget
+tb = ["abcdefgh", "abcdxyzw", "qrstuvab", "abcdefgh"]
+for sEvict in ("weight", "recency"):
+    cb = NGramGraphCollector(eBudget=EdgeBudget(10, sEvict=sEvict, fSlack=0.2))
+    for t in tb:
+        cb.addText(t)
+        assert cb.getRepresentativeGraph().size() <= 10
+    stats = cb.getBudgetStats()
+    assert stats["droppedEdges"] > 0 and 0 < stats["droppedFraction"] < 1
+cb = NGramGraphCollector(eBudget=EdgeBudget(fMinWeight=1.5))
+for t in tb + ["abcabcabc"]:
+    cb.addText(t)
+assert cb.getBudget().getDroppedEdges() > 0 and cb.getRepresentativeGraph().size() > 0
+assert min(w for (a, b, w) in cb.getRepresentativeGraph().edges(data=True)) >= 1.5
+
+# heavy hitter builds keep the top edges in fixed memory, overestimating them within the bound
+import random
+rnd = random.Random(0)
+text = "abcdefabcxyz" * 50 + "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for i in range(3000))
+gx = NGG.DocumentNGramGraph(3,2,text)
+sk = NGG.HeavyHitterSketch(30)
+gh = NGG.DocumentNGramGraph(3,2)
+gh.buildGraphStream(text, chunkSize=500, sketch=sk)
+keys, w = gh.edgeArrays()
+exact = gx.getEdgeWeightsByKeys(keys)
+assert gh.size() == 30 and np.all(w >= exact) and np.all(w - exact <= sk.getErrorBound())
+assert np.all(exact >= 49) and CMP.SimilarityNVS().getSimilarityDouble(gh, gx) > 0
+# (and only the n-grams of the kept edges are interned)
+vh = NGG.NGramVocabulary()
+gv = NGG.DocumentNGramGraph(3,2,vocabulary=vh)
+gv.buildGraphStream(text, chunkSize=500, sketch=NGG.HeavyHitterSketch(30))
+assert len(vh) == gv.number_of_nodes() <= 60
+assert sorted(gv.edges(data=True)) == sorted(gh.edges(data=True))
+
+# classifiers score a text against all classes at once, as their collectors do
+from source import NGramGraphClassifier
+clf = NGramGraphClassifier(3, 2)
+for (label, t) in [("x", "abcdefabc"), ("y", "xyzxyzabc"), ("x", "abcdefxyz"), ("z", "qrstuv")]:
+    clf.addText(label, t)
+scores = clf.getScores("abcdefxyz")
+assert scores == dict((l, clf.getCollector(l).getAppropriateness("abcdefxyz", 3, 2)) for l in "xyz")
+assert [l for (l, s) in clf.rank("abcdefxyz")] == ["x", "y", "z"] and scores["z"] == 0
+clf.addText("y", "abcdefxyz")
+assert clf.classify("abcdefxyz") == "x" and clf.getScores("abcdefxyz")["y"] > scores["y"]
+# (only the changed classes are re-indexed)
+clf.addText("z", "abcdefqrs")
+cx = NGramGraphCollector()
+cx.addText("mnopqr", n=3, Dwin=2)
+clf.addCollector("x", cx)
+scores = clf.getScores("abcdefxyz")
+assert scores == dict((l, clf.getCollector(l).getAppropriateness("abcdefxyz", 3, 2)) for l in "xyz")
+assert scores["x"] == 0 and scores["z"] > 0
+clf.addCollector("x", NGramGraphCollector())
+assert clf.getScores("abcdefxyz")["x"] == 0
+
+# frozen collectors score batches of texts as getAppropriateness does
+cacheF = NGG.GraphBuildCache(16)
+cf = NGramGraphCollector(cBuildCache=cacheF)
+for t in ["abcdefabc", "xyzxyzabc", "abcdefxyz"]:
+    cf.addText(t, n=3, Dwin=2)
+queries = ["abcdef", "xyzabc", "qrstuv", "abcxyzdef"]
+expected = [cf.getAppropriateness(q, 3, 2) for q in queries]
+cf.freeze()
+assert cf.isFrozen()
+assert cf.getAppropriatenessBatch(queries, 3, 2) == expected
+assert cf.getAppropriatenessBatch(queries, 3, 2, nWorkers=2, iMinPoolTexts=0) == expected
+# (the scored graph is the representative graph as it is now)
+cf.getRepresentativeGraph().setEdge("abc","bcd",1.0)
+assert cf.getAppropriatenessBatch(["abcd"], 3, 1) == [cf.getGraphAppropriateness(NGG.DocumentNGramGraph(3,1,"abcd"))]
+assert cf.getAppropriatenessBatch(["abcd"], 3, 1)[0] > 0
+# (batches scored in process use the build cache)
+hits = cacheF.getHits()
+cf.getAppropriatenessBatch(["mnopq", "rstuv"] * 2, 3, 2)
+assert cacheF.getHits() == hits + 2
+try:
+    cf.addText("abc")
+    assert False
+except ValueError:
+    pass
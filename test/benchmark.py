@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# Benchmark suite of graph building, operators, similarities,
+# n-ary operators, the collector and the classifier.
+#
+# Every benchmark is run over a sweep of text length, alphabet size,
+# n and Dwin: each parameter is varied over it's values while the
+# others keep their default (or over all their combinations with --grid).
+# Results are written as JSON, and compared against the results of
+# an earlier run with --compare (exiting with 1 on regressions).
+# A benchmark raising an error is recorded with it's error instead
+# of a time, and the rest of the suite still runs.
+#
+# usage: python benchmark.py [--quick] [--grid] [--repeat N] [--only GROUP,...]
+#                            [--out results.json] [--compare old.json] [--tolerance 1.25]
+import sys
+sys.path.append('..')
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import subprocess
+import time
+import timeit
+import warnings
+import numpy as np
+from source import representations as NGG
+from source import comparators as CMP
+from source import NGramGraphCollector, NGramGraphClassifier
+
+SYMBOLS = "abcdefghijklmnopqrstuvwxyz" + "abcdefghijklmnopqrstuvwxyz".upper() + "0123456789 .,;:!?-()[]{}"
+
+DEFAULTS = {"length" : 10000, "alphabet" : 26, "n" : 3, "Dwin" : 3}
+SWEEP = {"length" : [1000, 10000, 100000], "alphabet" : [4, 26, 64], "n" : [2, 3, 4], "Dwin" : [2, 4, 8]}
+QUICK_SWEEP = {"length" : [1000, 10000], "alphabet" : [4, 26], "n" : [3], "Dwin" : [2, 4]}
+
+CLASSES = [NGG.DocumentNGramGraph, NGG.DocumentNGramSymWinGraph, NGG.DocumentNGramGaussNormGraph]
+# the number of graphs of n-ary operator and collector benchmarks
+NGRAPHS = 8
+
+def randomText(length, alphabet, seed):
+    rnd = random.Random(seed)
+    symbols = SYMBOLS[:alphabet]
+    return "".join(rnd.choice(symbols) for i in range(length))
+
+# the parameter points of a sweep
+def sweepPoints(sweep, grid):
+    if grid:
+        names = sorted(sweep)
+        return [dict(zip(names, values)) for values in itertools.product(*[sweep[k] for k in names])]
+    points = []
+    for name in sorted(sweep):
+        for value in sweep[name]:
+            p = dict(DEFAULTS)
+            p[name] = value
+            if p not in points:
+                points.append(p)
+    return points
+
+# runs f repeat times (after setup, which is not timed)
+# and returns the best and mean time
+def measure(f, setup, repeat):
+    times = []
+    for i in range(repeat):
+        args = setup()
+        start = timeit.default_timer()
+        f(*args)
+        times.append(timeit.default_timer() - start)
+    return min(times), sum(times) / len(times)
+
+## benchmarks: each yields (case, params, setup, function, work items)
+
+def buildBenchmarks(p):
+    text = randomText(p["length"], p["alphabet"], 0)
+    for cls in CLASSES:
+        yield (cls.__name__ + ".build", {}, lambda: (),
+               lambda cls=cls: cls(p["n"], p["Dwin"], text), len(text))
+        if p["length"] <= 10000:
+            def incremental(cls=cls):
+                g = cls(p["n"], p["Dwin"])
+                g.buildGraph(d=text, batched=False)
+            yield (cls.__name__ + ".buildIncremental", {}, lambda: (), incremental, len(text))
+
+def operatorBenchmarks(p):
+    g1 = NGG.DocumentNGramGraph(p["n"], p["Dwin"], randomText(p["length"], p["alphabet"], 1))
+    g2 = NGG.DocumentNGramGraph(p["n"], p["Dwin"], randomText(p["length"], p["alphabet"], 2))
+    for op in (CMP.Union(), CMP.Intersect(), CMP.delta(), CMP.inverse_intersection()):
+        yield (op.__class__.__name__, {}, lambda: (), lambda op=op: op.apply(g1, g2), g1.size() + g2.size())
+
+def similarityBenchmarks(p):
+    g1 = NGG.DocumentNGramGraph(p["n"], p["Dwin"], randomText(p["length"], p["alphabet"], 1))
+    g2 = NGG.DocumentNGramGraph(p["n"], p["Dwin"], randomText(p["length"], p["alphabet"], 2))
+    for sim in (CMP.SimilaritySS(), CMP.SimilarityVS(), CMP.SimilarityNVS()):
+        yield (sim.__class__.__name__, {}, lambda: (),
+               lambda sim=sim: sim.getSimilarityDouble(g1, g2), g1.size() + g2.size())
+
+def naryBenchmarks(p):
+    graphs = [NGG.DocumentNGramGraph(p["n"], p["Dwin"], randomText(p["length"], p["alphabet"], i))
+              for i in range(NGRAPHS)]
+    edges = sum(g.size() for g in graphs)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ops = [("Update", lambda: CMP.Update()),
+               ("LtoRNary", lambda: CMP.LtoRNary(CMP.Union())),
+               ("ParallelNary", lambda: CMP.ParallelNary(CMP.Union()))]
+        for (name, make) in ops:
+            yield (name, {"graphs" : NGRAPHS}, lambda make=make: (make(),),
+                   lambda op: op.apply(*graphs), edges)
+
+def collectorBenchmarks(p):
+    texts = [randomText(p["length"], p["alphabet"], i) for i in range(NGRAPHS)]
+    def ingest():
+        c = NGramGraphCollector()
+        for t in texts:
+            c.addText(t, n=p["n"], Dwin=p["Dwin"])
+    yield ("addText", {"texts" : NGRAPHS}, lambda: (), ingest, NGRAPHS * p["length"])
+    def ingestParallel():
+        NGramGraphCollector().addTexts(texts, n=p["n"], Dwin=p["Dwin"])
+    yield ("addTexts", {"texts" : NGRAPHS, "workers" : multiprocessing.cpu_count()},
+           lambda: (), ingestParallel, NGRAPHS * p["length"])
+    c = NGramGraphCollector()
+    for t in texts:
+        c.addText(t, n=p["n"], Dwin=p["Dwin"])
+    query = randomText(p["length"], p["alphabet"], NGRAPHS)
+    yield ("getAppropriateness", {"texts" : NGRAPHS}, lambda: (),
+           lambda: c.getAppropriateness(query, n=p["n"], Dwin=p["Dwin"]), p["length"])
+    frozen = NGramGraphCollector()
+    for t in texts:
+        frozen.addText(t, n=p["n"], Dwin=p["Dwin"])
+    frozen.freeze()
+    queries = [randomText(p["length"] // NGRAPHS, p["alphabet"], NGRAPHS + i) for i in range(NGRAPHS)]
+    yield ("getAppropriatenessBatch", {"texts" : NGRAPHS}, lambda: (),
+           lambda: frozen.getAppropriatenessBatch(queries, n=p["n"], Dwin=p["Dwin"]), p["length"])
+
+def classifierBenchmarks(p):
+    clf = NGramGraphClassifier(p["n"], p["Dwin"])
+    for i in range(NGRAPHS):
+        clf.addText(i, randomText(p["length"], p["alphabet"], i))
+    query = randomText(p["length"], p["alphabet"], NGRAPHS)
+    clf.rank(query)
+    yield ("rank", {"classes" : NGRAPHS}, lambda: (), lambda: clf.rank(query), p["length"])
+
+GROUPS = [("build", buildBenchmarks), ("operators", operatorBenchmarks),
+          ("similarity", similarityBenchmarks), ("nary", naryBenchmarks),
+          ("collector", collectorBenchmarks), ("classifier", classifierBenchmarks)]
+
+def metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"time" : time.strftime("%Y-%m-%dT%H:%M:%S"), "commit" : commit,
+            "python" : platform.python_version(), "numpy" : np.__version__,
+            "platform" : platform.platform(), "cpus" : multiprocessing.cpu_count()}
+
+def run(points, groups, repeat, log):
+    results = []
+    for (group, benchmarks) in GROUPS:
+        if groups and group not in groups:
+            continue
+        for p in points:
+            for (case, extra, setup, f, items) in benchmarks(p):
+                params = dict(p)
+                params.update(extra)
+                r = {"group" : group, "case" : case, "params" : params, "repeat" : repeat, "items" : items}
+                try:
+                    best, mean = measure(f, setup, repeat)
+                except Exception as e:
+                    r.update({"best" : None, "mean" : None, "itemsPerSecond" : None,
+                              "error" : "%s: %s" % (e.__class__.__name__, e)})
+                    log.write("%-12s %-22s %-60s %s\n" % (group, case, json.dumps(p, sort_keys=True), r["error"]))
+                else:
+                    r.update({"best" : best, "mean" : mean, "itemsPerSecond" : items / best if best > 0 else None})
+                    log.write("%-12s %-22s %-60s %9.4fs\n" % (group, case, json.dumps(p, sort_keys=True), best))
+                results.append(r)
+    return results
+
+def resultKey(r):
+    return (r["group"], r["case"], json.dumps(r["params"], sort_keys=True))
+
+# returns the results slower than tolerance times their old best time
+def regressions(results, old, tolerance):
+    oldBest = dict((resultKey(r), r["best"]) for r in old["results"])
+    res = []
+    for r in results:
+        b = oldBest.get(resultKey(r))
+        if b is None or b <= 0:
+            continue
+        # a benchmark failing now is a regression too
+        if r["best"] is None or r["best"] > tolerance * b:
+            res.append((r, b))
+    return res
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of PyINSECT.")
+    parser.add_argument("--quick", action="store_true", help="a smaller sweep")
+    parser.add_argument("--grid", action="store_true", help="all combinations of the swept parameters")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="comma separated groups: " + ",".join(g for (g, b) in GROUPS))
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args()
+
+    points = sweepPoints(QUICK_SWEEP if args.quick else SWEEP, args.grid)
+    groups = [g for g in args.only.split(",") if g]
+    results = run(points, groups, args.repeat, sys.stderr)
+    with open(args.out, "w") as f:
+        json.dump({"meta" : metadata(), "results" : results}, f, indent=1, sort_keys=True)
+    sys.stderr.write("Results written to " + args.out + "\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        slow = regressions(results, old, args.tolerance)
+        for (r, b) in slow:
+            now = r.get("error") or "%.4fs" % r["best"]
+            sys.stderr.write("REGRESSION %s %s %s: %s (was %.4fs)\n" %
+                             (r["group"], r["case"], json.dumps(r["params"], sort_keys=True), now, b))
+        if slow:
+            sys.exit(1)
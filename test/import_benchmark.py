@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# Measures the time a fresh worker process takes to import the package,
+# against importing it along with the plotting modules it used to load
+# eagerly (networkx, matplotlib.pyplot and pygraphviz).
+#
+# usage: python import_benchmark.py [runs]
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+PLOTTING = ('networkx', 'matplotlib', 'pygraphviz')
+
+CORE = "import source"
+EAGER = ("import source\n"
+         "import networkx, matplotlib\n"
+         "matplotlib.use('Agg')\n"
+         "import matplotlib.pyplot\n"
+         "try:\n"
+         "    import pygraphviz\n"
+         "except ImportError:\n"
+         "    pass\n")
+
+# the best wall time of runs fresh interpreters running code
+def timeImport(code, runs):
+    best = None
+    for i in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
+        t = time.time() - start
+        if best is None or t < best:
+            best = t
+    return best
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    # the core package loads no plotting module
+    out = subprocess.check_output([sys.executable, '-c',
+        "import sys, source\n"
+        "print(','.join(m for m in %r if m in sys.modules))" % (PLOTTING,)], cwd=ROOT)
+    loaded = out.strip()
+    print "Plotting modules loaded by the package: " + (loaded or "none")
+    assert not loaded
+
+    base = timeImport("pass", runs)
+    core = timeImport(CORE, runs)
+    eager = timeImport(EAGER, runs)
+    print "interpreter start-up:          %.3fs" % base
+    print "import source:                 %.3fs" % core
+    print "import source with plotting:   %.3fs" % eager
+    print "saved per worker start:        %.3fs" % (eager - core)
@@ -0,0 +1,62 @@
+import sys
+import random
+sys.path.append('..')
+from source import representations as NGG
+from source import comparators as CMP
+
+random.seed(0)
+texts = ["".join(random.choice("abcd") for i in range(random.randint(20,200))) for j in range(11)]
+graphs = [NGG.DocumentNGramGraph(3,3,t) for t in texts]
+gs = CMP.SimilarityNVS()
+
+# all pairs, in process and on a pool of workers
+M1 = CMP.getSimilarityMatrix(graphs, measures=("SS","VS","NVS"), tile=4, nworkers=1)
+M2 = CMP.getSimilarityMatrix(graphs, measures=("SS","VS","NVS"), tile=4, nworkers=3)
+for i in range(len(graphs)):
+    for j in range(len(graphs)):
+        c = gs.getSimilarityComponents(graphs[i],graphs[j])
+        for m in ("SS","VS","NVS"):
+            assert abs(M1[m][i,j] - c[m]) < 1e-12
+            assert abs(M2[m][i,j] - c[m]) < 1e-12
+print M1["NVS"][:3,:3]
+
+# one against many
+v = CMP.getSimilarityToMany(graphs[0], graphs[1:], tile=3, nworkers=2)
+assert len(v) == len(graphs) - 1
+for j in range(1,len(graphs)):
+    assert abs(v[j-1] - gs.getSimilarityDouble(graphs[0],graphs[j])) < 1e-12
+print v
+
+# top-k through the inverted edge index
+index = CMP.EdgeIndex()
+index.addAll(enumerate(graphs[1:], 1))
+top = index.search(graphs[0], k=3)
+assert len(top) == 3
+for (j, s) in top:
+    assert abs(s - v[j-1]) < 1e-12
+assert max(abs(a - b) for (a, b) in zip([s for (j, s) in top], sorted(v, reverse=True))) < 1e-12
+print top
+# (replaced documents keep their place)
+index.replace(top[0][0], graphs[0])
+assert index.search(graphs[0], k=1) == [(top[0][0], 1.0)]
+index.replace(top[0][0], None)
+assert top[0][0] not in [j for (j, s) in index.search(graphs[0], k=len(graphs))]
+assert index.ids() == range(1, len(graphs))
+
+# sketches of the same edges are equal, LSH pairs get their exact NVS
+sketcher = CMP.MinHashSketcher(64)
+s1 = sketcher.sketch(graphs[0])
+s2 = sketcher.sketch(NGG.DocumentNGramGraph(3,3,texts[0],vocabulary=NGG.NGramVocabulary()))
+assert CMP.estimateSimilarity(s1, s2) == 1.0
+for (i, j, s) in CMP.findSimilarPairs(graphs + [graphs[0]], threshold=0.8, numHashes=64):
+    assert i < j and abs(s - gs.getSimilarityDouble(graphs[i], (graphs + [graphs[0]])[j])) < 1e-12
+lsh = CMP.LSHIndex(16, 4)
+print lsh.getThreshold(), lsh.getRecall(0.8)
+
+# cached similarities
+cached = CMP.CachedSimilarity(gs, maxSize=8)
+for i in range(2):
+    assert cached.getSimilarityDouble(graphs[0], graphs[1]) == gs.getSimilarityDouble(graphs[0], graphs[1])
+assert cached.getSimilarityDouble(graphs[1], graphs[0]) == gs.getSimilarityDouble(graphs[0], graphs[1])
+print cached.getCache().getStats()
+assert cached.getCache().getHits() == 2 and cached.getCache().getMisses() == 1
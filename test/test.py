@@ -15,3 +15,26 @@ print ngc.getAppropriateness("A test...")
 print ngc.getAppropriateness("Another, bigger test...")
 print ngc.getAppropriateness("Something irrelevant!")
 print "Getting appropriateness... Done!"
+
+# the added graphs are not aliased or modified
+from source import DocumentNGramGraph
+ngg = DocumentNGramGraph(3,3,"A test...")
+edges = sorted(ngg.edges(data=True))
+ngc = NGramGraphCollector()
+ngc.addGraph(ngg)
+ngc.addText("Another, bigger test. But a test, anyway...")
+assert ngc.getRepresentativeGraph() is not ngg
+assert sorted(ngg.edges(data=True)) == edges
+
+# building in parallel gives the same representative graph
+lTexts = ["A test...", "Another, bigger test. But a test, anyway...", "Something irrelevant!", "A last test."]
+ngc1 = NGramGraphCollector()
+for sText in lTexts:
+    ngc1.addText(sText)
+ngc2 = NGramGraphCollector()
+ngc2.addTexts(lTexts, nWorkers=2)
+g1 = dict(ngc1.getRepresentativeGraph().edgeItems())
+g2 = dict(ngc2.getRepresentativeGraph().edgeItems())
+assert sorted(g1) == sorted(g2)
+assert max(abs(g1[k] - g2[k]) for k in g1) < 1e-12
+print ngc2.getAppropriateness("A test...")